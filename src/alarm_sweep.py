@@ -0,0 +1,215 @@
+"""
+アラームの監視
+
+状態のポーリング（ライブステータス・運転完了待ち・lrd_manual.py の status()）で読んだ
+状態1を observe() に渡すと、ALM ビットの立ち上がりを検出した軸だけ現在のアラームと
+アラーム履歴を1回の読み出しで取得し、軸ごとの履歴に残して購読者に通知する。
+ALM が立っていない間は追加の通信は発生しない。
+
+使用例:
+    alarms = AlarmMonitor(client, lock=bus_lock)
+    alarms.subscribe(lambda event: print(event))
+    watcher = CompletionWatcher(client, lock=bus_lock, alarms=alarms)
+    ...
+    alarms.observe(device_id, status1)     # 独自のポーリングから
+
+単体での監視（ヘッドレス）:
+    python3 src/alarm_sweep.py --ids 1-28 --interval 1.0
+"""
+
+import argparse
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+from bus import create_client, read_status, ALM_BIT
+from register_map import AZ
+from setting import *
+from util import parse_ids
+
+# 現在のアラーム（0080h〜0081h）とアラーム履歴1〜10（0082h〜0095h、各2レジスタ）を1回で読む
+ALARM_BLOCK, = AZ.group('alarms')
+ALARM_ADDRESS = ALARM_BLOCK.address
+ALARM_HISTORY_COUNT = 10
+ALARM_READ_COUNT = ALARM_BLOCK.count
+
+HISTORY_LENGTH = 50     # 軸ごとに保持するイベント数
+
+# 主なアラームコード（AZ シリーズ）
+ALARM_NAMES = {
+    0x10: "Excessive position deviation",
+    0x20: "Overcurrent",
+    0x21: "Main circuit overheat",
+    0x22: "Overvoltage",
+    0x25: "Undervoltage",
+    0x30: "Overload",
+    0x31: "Overspeed",
+    0x41: "EEPROM error",
+    0x60: "+LS and -LS both active",
+    0x66: "Hardware overtravel",
+    0x67: "Software overtravel",
+    0x70: "Abnormal operation data",
+}
+
+
+def alarm_name(code):
+    if code is None:
+        return "alarm code unavailable"
+    return ALARM_NAMES.get(code, "Unknown alarm")
+
+
+def read_alarms(client, device_id):
+    """
+    現在のアラームとアラーム履歴を1回の読み出しで取得する
+
+    Returns:
+        tuple: (現在のアラームコード, [履歴1, 履歴2, ...]（新しい順、0 は除く）)
+    """
+    res = client.read_holding_registers(address=ALARM_ADDRESS, count=ALARM_READ_COUNT, device_id=device_id)
+    if res.isError():
+        raise Exception(f"ID {device_id}: alarm read failed: {res}")
+    codes = ALARM_BLOCK.decode(res.registers)
+    return codes[0], [code for code in codes[1:] if code]
+
+
+class AlarmEvent:
+    """ALM ビットの変化（raised=True: 発生、False: 解除）"""
+
+    __slots__ = ('device_id', 'raised', 'code', 'history', 'time', 'error')
+
+    def __init__(self, device_id, raised, code=None, history=(), error=None):
+        self.device_id = device_id
+        self.raised = raised
+        self.code = code              # 現在のアラームコード（解除・読み出し失敗時は None）
+        self.history = list(history)  # ドライバのアラーム履歴（新しい順）
+        self.time = time.time()
+        self.error = error            # アラームの読み出しに失敗した場合の例外
+
+    def __str__(self):
+        if not self.raised:
+            return f"ID {self.device_id}: alarm cleared"
+        if self.code is None:
+            return f"ID {self.device_id}: ALARM ({self.error})"
+        return f"ID {self.device_id}: ALARM 0x{self.code:02X} {alarm_name(self.code)}"
+
+
+class AlarmMonitor:
+    """
+    状態1の ALM ビットの変化を監視する
+
+    Args:
+        client: Modbus クライアント（アラームコードの読み出しに使う）
+        lock: クライアントを共有している場合のロック（BusLock など）
+        history (int): 軸ごとに保持するイベント数
+    """
+
+    def __init__(self, client, lock=None, history=HISTORY_LENGTH):
+        self.client = client
+        self.lock = lock
+        self.history_length = history
+        self.alarmed = {}       # デバイスID -> 最後に観測した ALM ビット
+        self.history = {}       # デバイスID -> deque(AlarmEvent)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """変化のたびに callback(event) をポーリングしたスレッドから呼ぶ"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._listeners.remove(callback)
+
+    def observe(self, device_id, status1):
+        """
+        ポーリングで読んだ状態1を渡す（ALM が立ち上がった場合だけアラームを読み出す）
+
+        Returns:
+            AlarmEvent: 変化があった場合のイベント。なければ None
+        """
+        alarmed = bool(status1 & ALM_BIT)
+        with self._lock:
+            if self.alarmed.get(device_id, False) == alarmed:
+                return None
+            self.alarmed[device_id] = alarmed
+        if alarmed:
+            try:
+                with self.lock or nullcontext():
+                    code, history = read_alarms(self.client, device_id)
+                event = AlarmEvent(device_id, True, code, history)
+            except Exception as e:
+                event = AlarmEvent(device_id, True, error=e)
+        else:
+            event = AlarmEvent(device_id, False)
+        self._publish(event)
+        return event
+
+    def _publish(self, event):
+        with self._lock:
+            events = self.history.get(event.device_id)
+            if events is None:
+                events = self.history[event.device_id] = deque(maxlen=self.history_length)
+            events.append(event)
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Alarm listener error: {e}")
+
+    def active(self):
+        """アラーム中の軸のデバイスID"""
+        with self._lock:
+            return sorted(device_id for device_id, alarmed in self.alarmed.items() if alarmed)
+
+    def events(self, device_id):
+        """軸のイベント履歴（古い順）"""
+        with self._lock:
+            return list(self.history.get(device_id, ()))
+
+
+def sweep(client, ids, monitor, interval=1.0, stop=None):
+    """
+    状態をゆっくり巡回して monitor に渡す（他にポーリングがない場合の単体の監視）
+
+    Args:
+        stop (threading.Event): セットされたら終了する
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        for device_id in ids:
+            try:
+                with monitor.lock or nullcontext():
+                    status1, _ = read_status(client, device_id)
+            except Exception:
+                continue
+            monitor.observe(device_id, status1)
+        stop.wait(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch the fleet for alarms")
+    parser.add_argument("--ids", default=f"1-{AXIS_COUNT}", help="axes, e.g. 1-28")
+    parser.add_argument("--interval", type=float, default=1.0, help="pause between sweeps [s]")
+    args = parser.parse_args()
+
+    client = create_client()
+    if not client.connect():
+        print(f"ERROR: Cannot open port {MODBUS_PORT}")
+        raise SystemExit(1)
+    monitor = AlarmMonitor(client)
+
+    def report(event):
+        print(time.strftime('%H:%M:%S', time.localtime(event.time)), event)
+        if event.history:
+            print("  history: " + ", ".join(f"0x{code:02X}" for code in event.history))
+
+    monitor.subscribe(report)
+    try:
+        sweep(client, parse_ids(args.ids), monitor, args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
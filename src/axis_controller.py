@@ -0,0 +1,716 @@
+"""
+N軸モーターコントローラ
+
+軸数とグリッドのレイアウトを設定（setting.py またはコマンドライン引数）から受け取る。
+グリッドは仮想スクロールで、表示中の行の分だけタイルを生成して使い回すため、
+軸数が100を超えても起動時間とメモリはほぼ一定になる。
+quad_controller.py / octa_controller.py / all_controller.py はこのモジュールのラッパー。
+
+使用法: python3 src/axis_controller.py --axes 120 --columns 8 [--profile [REPORT]]
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+import tkinter as tk
+from setting import *
+from util import *
+from motor_model import *
+from bus import create_client
+from bus_lock import BusLock, BusAborted
+from completion import CompletionWatcher
+from estop import emergency_stop, release_stop
+from motion_time import MotionEstimator
+from coordinated_move import plan_arrival, start_step, MIN_SPEED
+from profiler import Profiler, add_profile_arguments
+from port_workers import StatusTable, StatusRecord
+from bus_capture import Capture, attach
+from discovery_cache import load_discovery, DiscoveryValidator
+from alarm_sweep import AlarmMonitor
+from register_map import CVD
+from direct_data import TRIGGER_POSITION
+
+LIVE_STATUS_INTERVAL = 0.2  # ライブステータスの1周期あたりの待ち時間 [s]
+MOVE_TIMEOUT = 60.0         # 運転完了待ちのタイムアウト [s]
+USAGE_INTERVAL_MS = 1000    # バス利用率の表示の更新間隔 [ms]
+FIELDS = (("ID:", 'ids'), ("Speed:", 'speeds'), ("Step:", 'steps'))
+
+
+class Tile:
+    """1軸分の表示タイル（スクロールに合わせて別の軸に付け替える）"""
+
+    def __init__(self, parent, model):
+        self.model = model
+        self.index = None
+        self.frame = tk.LabelFrame(parent, padx=5, pady=5)
+
+        self.enabled_var = tk.BooleanVar()
+        tk.Checkbutton(self.frame, text="Enable", variable=self.enabled_var,
+                       command=self._on_enable).grid(row=0, column=0, columnspan=2, sticky="w")
+
+        self.entries = {}
+        for row, (text, field) in enumerate(FIELDS, start=1):
+            tk.Label(self.frame, text=text).grid(row=row, column=0, sticky="w")
+            entry = tk.Entry(self.frame, width=6)
+            entry.grid(row=row, column=1, sticky="w")
+            bind_entry(entry, model, field, lambda: self.index)
+            self.entries[field] = entry
+
+        self.status_label = tk.Label(self.frame, text="--", fg="gray")
+        self.status_label.grid(row=len(FIELDS) + 1, column=0, columnspan=2, sticky="w")
+
+    def _on_enable(self):
+        self.model.set_enabled(self.index, self.enabled_var.get())
+
+    def bind(self, index, name):
+        """タイルを index 番目の軸に割り当てる"""
+        self.index = index
+        self.frame.config(text=name)
+        self.enabled_var.set(bool(self.model.enabled[index]))
+        for field, entry in self.entries.items():
+            load_entry(entry, self.model, field, index)
+        self.refresh()
+
+    def refresh(self):
+        text, fg = self.model.describe(self.index)
+        self.status_label.config(text=text, fg=fg)
+
+
+class VirtualGrid:
+    """
+    表示中の行だけタイルを生成する仮想スクロールグリッド
+
+    行フレームをプールしておき、スクロール位置に応じて Canvas 上の位置と
+    割り当てる軸を差し替える。
+    """
+
+    def __init__(self, parent, model, columns, names, visible_rows):
+        self.model = model
+        self.columns = columns
+        self.names = names
+        self.rows = -(-model.count // columns)
+        self.visible_rows = min(visible_rows, self.rows)
+        self.pool = []        # [(行フレーム, Canvas アイテム, タイル一覧, 割り当て中の行)]
+        self.visible = {}     # 軸番号 -> タイル
+
+        self.frame = tk.Frame(parent)
+        self.canvas = tk.Canvas(self.frame, highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        # 1行目を作って行の大きさを測り、スクロール領域を決める
+        self._add_row()
+        first_row = self.pool[0][0]
+        first_row.update_idletasks()
+        self.row_height = first_row.winfo_reqheight()
+        self.row_width = first_row.winfo_reqwidth()
+        self.canvas.configure(
+            width=self.row_width,
+            height=self.visible_rows * self.row_height,
+            scrollregion=(0, 0, self.row_width, self.rows * self.row_height),
+            yscrollincrement=self.row_height,
+        )
+
+        self.canvas.bind("<Configure>", lambda e: self.layout())
+        self.canvas.bind_all("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind_all("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind_all("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+        self.layout()
+
+    def _add_row(self):
+        row_frame = tk.Frame(self.canvas)
+        tiles = []
+        for col in range(self.columns):
+            tile = Tile(row_frame, self.model)
+            tile.frame.grid(row=0, column=col, padx=5, pady=5, sticky="nsew")
+            tiles.append(tile)
+        item = self.canvas.create_window((0, 0), window=row_frame, anchor="nw", state="hidden")
+        self.pool.append([row_frame, item, tiles, None])
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.layout()
+
+    def layout(self):
+        """スクロール位置に合わせて行フレームを配置し直す"""
+        first = int(self.canvas.canvasy(0) // self.row_height)
+        height = max(self.canvas.winfo_height(), self.visible_rows * self.row_height)
+        needed = min(self.rows, height // self.row_height + 2)
+        while len(self.pool) < needed:
+            self._add_row()
+
+        self.visible = {}
+        for slot, entry in enumerate(self.pool):
+            row_frame, item, tiles, bound_row = entry
+            row = first + slot
+            if row >= self.rows:
+                self.canvas.itemconfigure(item, state="hidden")
+                entry[3] = None
+                continue
+            self.canvas.coords(item, 0, row * self.row_height)
+            self.canvas.itemconfigure(item, state="normal")
+            for col, tile in enumerate(tiles):
+                index = row * self.columns + col
+                if index >= self.model.count:
+                    tile.frame.grid_remove()
+                    continue
+                tile.frame.grid()
+                if bound_row != row:
+                    tile.bind(index, self.names[index])
+                self.visible[index] = tile
+            entry[3] = row
+
+    def refresh(self, indices):
+        """変更のあった軸のうち表示中のタイルだけを再描画する"""
+        for i in indices:
+            tile = self.visible.get(i)
+            if tile is not None:
+                tile.refresh()
+
+    def reload(self):
+        """モデル全体が変わったときに表示中のタイルを読み直す"""
+        for entry in self.pool:
+            entry[3] = None
+        self.layout()
+
+
+class AxisController:
+    """N軸分のモーターをまとめて操作するGUI"""
+
+    def __init__(self, root, client, count, columns, names=None, visible_rows=AXIS_VISIBLE_ROWS,
+                 default_speed=100, default_step=100, status_table=None):
+        self.root = root
+        self.client = client
+        self.status_table = status_table      # port_workers.py の共有メモリ（ライブステータスの読み出し元）
+        self.count = count
+        self.model = MotorModel(count, default_speed=default_speed, default_step=default_step)
+        self.status_ports = [0] * count       # 軸ごとの状態テーブルのポート番号
+        if status_table is not None:
+            self.apply_status_table(status_table)
+        self.bus_lock = BusLock()
+        self.live_status_running = threading.Event()
+        self.batch_running = threading.Event()
+        self.messages = queue.SimpleQueue()   # ワーカースレッドからのステータス表示
+        self.estimator = MotionEstimator()
+        # ライブステータスと完了待ちで読んだ状態から、ALM の立ち上がりだけアラームを読み出す
+        self.alarms = AlarmMonitor(client, lock=self.bus_lock)
+        self.alarms.subscribe(self._on_alarm)
+        self.watcher = CompletionWatcher(client, lock=self.bus_lock, estimator=self.estimator, alarms=self.alarms)
+        self.pending_moves = None
+        self.move_generation = [0] * count    # 軸ごとの監視の世代（差し替えられた監視の完了通知を無視する）
+        self.failed_moves = []
+        self.moves_started = 0.0
+        self.planned_speeds = set()           # 同時到着の計画速度が速度レジスタに残っている軸（送信ワーカーのみが触る）
+        self.validator = None
+        self.discovered = None                # バックグラウンドの再スキャンで見つかったID（画面への反映待ち）
+        names = list(names or [])
+        names += [f"Motor {i+1}" for i in range(len(names), count)]
+
+        self.grid = VirtualGrid(root, self.model, columns, names, visible_rows)
+        self.grid.frame.grid(row=0, column=0, sticky="nsew")
+        self.refresher = RefreshScheduler(root, self.model, self.refresh)
+        self._build_control_panel()
+
+        # Escキーで全軸停止
+        root.bind("<Escape>", lambda e: self.emergency_stop())
+
+        root.columnconfigure(0, weight=1)
+        root.rowconfigure(0, weight=6)  # モーターグリッドには多くのスペースを割り当て
+        root.rowconfigure(1, weight=1)  # コントロールパネルには少なめのスペース
+
+    def _build_control_panel(self):
+        control_panel = tk.Frame(self.root)
+        control_panel.grid(row=1, column=0, sticky="ew", padx=10, pady=10)
+
+        # 全モーター選択/解除チェックボックス
+        self.toggle_all_var = tk.BooleanVar()
+        tk.Checkbutton(control_panel, text="Select/Deselect All Motors", variable=self.toggle_all_var,
+                       command=self.toggle_all_motors).grid(row=0, column=0, columnspan=3, sticky="w", pady=5)
+
+        # ライブステータス監視チェックボックス
+        self.live_status_var = tk.BooleanVar()
+        tk.Checkbutton(control_panel, text="Live Status", variable=self.live_status_var,
+                       command=self.toggle_live_status).grid(row=0, column=3, sticky="w", pady=5)
+
+        # 運転完了待ちチェックボックス
+        self.track_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(control_panel, text="Wait for Completion", variable=self.track_var).grid(row=0, column=4, sticky="w", pady=5)
+
+        # コマンド選択部分
+        command_frame = tk.LabelFrame(control_panel, text="Commands", padx=10, pady=5)
+        command_frame.grid(row=1, column=0, columnspan=4, sticky="ew", pady=5)
+
+        self.initialize_var = tk.BooleanVar()
+        self.speed_var = tk.BooleanVar()
+        self.step_var = tk.BooleanVar()
+
+        tk.Checkbutton(command_frame, text="Initialize Motors", variable=self.initialize_var).grid(row=0, column=0, padx=5, sticky="w")
+        tk.Checkbutton(command_frame, text="Send Speed", variable=self.speed_var).grid(row=0, column=1, padx=5, sticky="w")
+        tk.Checkbutton(command_frame, text="Send Step", variable=self.step_var).grid(row=0, column=2, padx=5, sticky="w")
+
+        # 同時到着（入力された速度を上限として、全軸が同時に止まる速度で送る）
+        self.sync_var = tk.BooleanVar()
+        tk.Checkbutton(command_frame, text="Synchronize Arrival", variable=self.sync_var).grid(row=0, column=3, padx=5, sticky="w")
+
+        # 送信ボタン
+        tk.Button(control_panel, text="Send Commands", command=self.send_commands, width=20, height=2,
+                  bg="#4CAF50", fg="white").grid(row=2, column=0, columnspan=2, pady=5)
+
+        # 非常停止ボタン
+        tk.Button(control_panel, text="STOP ALL (Esc)", command=self.emergency_stop, width=20, height=2,
+                  bg="#F44336", fg="white").grid(row=2, column=2, columnspan=2, pady=5)
+
+        # STOP の解除（STOP は指令1に残るため、解除するまで次の運転は始まらない）
+        tk.Button(control_panel, text="Release STOP", command=self.release_stop, width=12,
+                  height=2).grid(row=3, column=4, sticky="w", padx=5)
+
+        # ステータス表示
+        self.status_label = tk.Label(control_panel, text="Ready", fg="blue")
+        self.status_label.grid(row=3, column=0, columnspan=4, pady=5)
+
+        # バスの利用率（create_client() のクライアントのみ）
+        self.usage = getattr(self.client, 'usage', None)
+        if self.usage is not None:
+            self.usage_label = tk.Label(control_panel, text="", fg="gray")
+            self.usage_label.grid(row=2, column=4, sticky="w", padx=5)
+            self._update_usage()
+
+    def _on_alarm(self, event):
+        # ポーリングしたスレッドから呼ばれる
+        if event.raised:
+            self.post_status(str(event), "red")
+        else:
+            self.post_status(str(event), "orange")
+
+    def _update_usage(self):
+        utilization = self.usage.utilization()
+        self.usage_label.config(text=f"Bus load: {utilization:.0%} of {self.usage.baudrate} bps",
+                                fg="red" if utilization > 0.8 else "gray")
+        self.root.after(USAGE_INTERVAL_MS, self._update_usage)
+
+    def modbus_write(self, register, value, slave):
+        return self.client.write_registers(register.address, register.encode(value), device_id=slave)
+
+    def post_status(self, text, fg):
+        """ワーカースレッドからステータス表示を依頼する（次の画面更新で反映）"""
+        self.messages.put((text, fg))
+
+    def run_batch(self, token, write, label, empty_message, indices=None):
+        """
+        有効なモーターに対して write(i) を実行し、結果をモデルに記録する
+
+        送信ワーカースレッドから呼ばれる。停止要求があれば BusAborted で打ち切る。
+
+        Args:
+            token: バッチ開始時の BusLock のトークン
+            write (callable): モーター番号を受け取り応答を返す関数
+            label (str): ステータス表示用のコマンド名
+            empty_message (str): 対象モーターがない場合のメッセージ
+            indices (list): 送信するモーター番号と順番（None の場合は選択中のモーター）
+
+        Returns:
+            list: 送信に成功したモーター番号
+        """
+        model = self.model
+        selected = model.selected() if indices is None else indices
+        if not selected:
+            self.post_status(empty_message, "orange")
+            return []
+        invalid = [model.ids[i] for i in selected if model.invalid[i]]
+        if invalid:
+            self.post_status(f"Invalid input for motors {', '.join(map(str, invalid))}", "red")
+            return []
+
+        succeeded = []
+        processed_motors = []
+        failed_motors = []
+        last_error = None
+        for i in selected:
+            try:
+                with self.bus_lock.hold(token):
+                    response = write(i)
+                if response.isError():
+                    raise Exception(response)
+                model.set_result(i, RESULT_OK)
+                succeeded.append(i)
+                processed_motors.append(model.ids[i])
+            except BusAborted:
+                raise
+            except Exception as e:
+                model.set_result(i, RESULT_ERROR)
+                failed_motors.append(model.ids[i])
+                last_error = e
+
+        if failed_motors:
+            self.post_status(f"{label} failed for motors {', '.join(map(str, failed_motors))}: {last_error}", "red")
+        else:
+            self.post_status(f"{label} sent successfully to motors {', '.join(map(str, processed_motors))}", "green")
+        return succeeded
+
+    def initialize_motors(self, token):
+        """チェックされたモーターを初期化する"""
+        self.run_batch(
+            token, lambda i: self.modbus_write(CVD.direct_trigger, TRIGGER_POSITION, self.model.ids[i]),
+            "Initialize", "No motors selected for initialization")
+
+    def send_speed(self, token, indices=None):
+        """チェックされたモーターにスピードを送信する"""
+        succeeded = self.run_batch(
+            token, lambda i: self.modbus_write(CVD.direct_speed, self.model.speeds[i], self.model.ids[i]),
+            "Speed", "No motors selected for speed command", indices=indices)
+        self.planned_speeds.difference_update(succeeded)
+        return succeeded
+
+    def send_step(self, token, synchronize=False, track=False):
+        """
+        チェックされたモーターにステップを送信する
+
+        synchronize / track は送信ボタンを押したときのチェックボックスの値（Tk のスレッドで読んでおく）
+        """
+        if synchronize:
+            self.send_synchronized(token, track)
+            return
+        # 前回の同時到着で書き込んだ計画速度が残っている軸は、入力された速度に戻してから送る
+        restore = [i for i in self.model.selected() if i in self.planned_speeds]
+        if restore:
+            self.send_speed(token, restore)
+        succeeded = self.run_batch(
+            token, lambda i: self.modbus_write(CVD.direct_position, self.model.steps[i], self.model.ids[i]),
+            "Step", "No motors selected for step command")
+        if succeeded and track:
+            self.track_completion(token, succeeded)
+
+    def send_synchronized(self, token, track=False):
+        """
+        チェックされたモーターが同時に止まるよう、軸ごとの速度を計算して送信する
+
+        入力された速度を上限とし、移動時間の長い軸から速度と位置を続けて送る。
+        """
+        model = self.model
+        selected = model.selected()
+        if not selected or any(model.invalid[i] for i in selected):
+            # 対象なし・入力エラーの表示は run_batch に任せる（何も送信しない）
+            self.run_batch(token, None, "Step", "No motors selected for step command")
+            return
+        stalled = [model.ids[i] for i in selected if model.steps[i] != 0 and model.speeds[i] < MIN_SPEED]
+        if stalled:
+            # 速度 0 で移動量のある軸は到着時刻を計算できないので、何も送信しない
+            self.post_status(f"Speed must be at least {MIN_SPEED} Hz for motors {', '.join(map(str, stalled))}", "red")
+            return
+        for i in selected:
+            self.load_profile(token, model.ids[i])
+        accels, decels = zip(*(self.estimator.profiles[model.ids[i]] for i in selected))
+        plan = plan_arrival([model.steps[i] for i in selected], [model.speeds[i] for i in selected],
+                            accels, decels, start_step())
+        speeds = {selected[j]: int(plan.speeds[j]) for j in range(len(selected))}
+        ordered = [selected[j] for j in plan.order]
+        loaded = self.run_batch(
+            token, lambda i: self.modbus_write(CVD.direct_speed, speeds[i], model.ids[i]),
+            "Speed", "No motors selected for speed command", indices=ordered)
+        self.planned_speeds.update(i for i in loaded if speeds[i] != model.speeds[i])
+        # 速度を書き込めた軸だけ起動する（起動のずれを小さくするため続けて送る）
+        succeeded = self.run_batch(
+            token, lambda i: self.modbus_write(CVD.direct_position, model.steps[i], model.ids[i]),
+            "Synchronized step", "No motors selected for step command", indices=loaded)
+        if succeeded:
+            self.post_status(f"Synchronized step sent to motors {', '.join(str(model.ids[i]) for i in succeeded)}: "
+                             f"arrival in {plan.duration:.2f} s ({plan.unsynchronized:.2f} s at the typed speeds)", "green")
+            early = [str(model.ids[selected[j]]) for j in plan.early_axes if selected[j] in succeeded]
+            if early:
+                self.post_status(f"Motors {', '.join(early)} cannot go below the minimum speed and stop early; "
+                                 f"the others arrive together in {plan.duration:.2f} s", "orange")
+            if track:
+                self.track_completion(token, succeeded, speeds)
+
+    def load_profile(self, token, device_id):
+        """軸の加減速レートを初回だけ読み出す（読めない場合は既定値）"""
+        if self.estimator.has_profile(device_id):
+            return
+        try:
+            with self.bus_lock.hold(token):
+                self.estimator.load_profile(self.client, device_id)
+        except BusAborted:
+            raise
+        except Exception as e:
+            self.post_status(f"ID {device_id}: using default accel/decel ({e})", "orange")
+            self.estimator.set_profile(device_id, self.estimator.accel, self.estimator.decel)
+
+    def track_completion(self, token, indices, speeds=None):
+        """送信したモーターの運転完了を監視し、完了したタイルから更新する"""
+        self.pending_moves = set(indices)
+        self.failed_moves = []
+        self.moves_started = time.monotonic()
+        model = self.model
+        for i in indices:
+            device_id = model.ids[i]
+            # 加減速レートは軸ごとに初回だけ読み出し、予測完了時刻までポーリングを止める
+            self.load_profile(token, device_id)
+            speed = speeds[i] if speeds else model.speeds[i]
+            predicted = self.estimator.predict(device_id, model.steps[i], speed)
+            # 世代を先に進める（watch() は同じ軸の前の監視をその場でキャンセルし、前の通知が呼ばれる）
+            self.move_generation[i] += 1
+            generation = self.move_generation[i]
+            self.watcher.watch(device_id, MOVE_TIMEOUT + predicted, predicted=predicted,
+                               callback=lambda _, future, i=i, g=generation: self._on_move_done(i, g, future))
+
+    def _on_move_done(self, index, generation, future):
+        # 監視スレッドから呼ばれるため、モデルの更新のみ行う
+        # 差し替えられた監視・キャンセルされた監視の通知は、新しい監視中の軸を完了扱いにしない
+        if future.cancelled() or generation != self.move_generation[index]:
+            return
+        if future.exception() is not None:
+            result = RESULT_ERROR
+            self.failed_moves.append(self.model.ids[index])
+        else:
+            result = RESULT_DONE
+        self.model.set_result(index, result)
+        if self.pending_moves is not None:
+            self.pending_moves.discard(index)
+
+    def apply_status_table(self, table):
+        """状態テーブルのスロットの並び（ポート順・ID順）を先頭のタイルから割り当てる"""
+        for i, (port, device_id) in enumerate(table.layout[:self.count]):
+            self.status_ports[i] = port
+            self.model.ids[i] = device_id
+
+    def apply_discovery(self, discovery):
+        """検出したIDを先頭のタイルから順に設定する"""
+        for i, device_id in enumerate(discovery.ids[:self.count]):
+            self.model.ids[i] = device_id
+            self.model.invalid[i] &= ~1
+        self.grid.reload()
+
+    def start_discovery(self, discovery):
+        """前回の検出結果をバックグラウンドで確認する（失敗した場合は再スキャンして画面に反映する）"""
+        self.validator = DiscoveryValidator(self.client, discovery, lock=self.bus_lock,
+                                            callback=self._on_discovery).start()
+        self.refresher.start_periodic(100)
+
+    def _on_discovery(self, discovery, rescanned):
+        # 検出スレッドから呼ばれるため、画面への反映は refresh で行う
+        if not rescanned:
+            self.post_status(f"Cached IDs validated ({len(discovery.ids)} drivers)", "green")
+        elif discovery.ids:
+            self.discovered = discovery
+            self.post_status(f"Bus rescanned: {len(discovery.ids)} drivers found "
+                             f"(IDs {', '.join(map(str, discovery.ids))})", "orange")
+        else:
+            self.post_status("Bus rescan found no drivers", "red")
+
+    def refresh(self, indices):
+        """タイルとステータス表示を更新し、すべての運転が終わったら結果を表示する"""
+        if self.discovered is not None:
+            discovery, self.discovered = self.discovered, None
+            self.apply_discovery(discovery)
+        self.grid.refresh(indices)
+        while not self.messages.empty():
+            text, fg = self.messages.get()
+            self.status_label.config(text=text, fg=fg)
+        if self.pending_moves is not None and not self.pending_moves and not self.batch_running.is_set():
+            self.pending_moves = None
+            elapsed = time.monotonic() - self.moves_started
+            if self.failed_moves:
+                self.status_label.config(text=f"Moves failed for motors {', '.join(map(str, sorted(self.failed_moves)))}", fg="red")
+            else:
+                self.status_label.config(text=f"All moves completed in {elapsed:.2f} s", fg="green")
+        discovering = self.validator is not None and not self.validator.done.is_set()
+        if not (self.batch_running.is_set() or self.pending_moves is not None or self.live_status_var.get()
+                or discovering or self.discovered is not None):
+            self.refresher.stop_periodic()
+
+    def send_commands(self):
+        """選択されたコマンドを送信ワーカースレッドで送信する"""
+        commands = []
+        if self.initialize_var.get():
+            commands.append(self.initialize_motors)
+        if self.speed_var.get():
+            commands.append(self.send_speed)
+        if self.step_var.get():
+            # チェックボックスは送信ワーカーから読まない（押した時点の値を渡す）
+            synchronize, track = self.sync_var.get(), self.track_var.get()
+            commands.append(lambda token: self.send_step(token, synchronize, track))
+        if not commands:
+            self.status_label.config(text="No command selected for sending", fg="orange")
+            return
+        if self.batch_running.is_set():
+            self.status_label.config(text="Previous commands are still being sent", fg="orange")
+            return
+        self.batch_running.set()
+        threading.Thread(target=self._send_worker, args=(commands, self.bus_lock.token()), daemon=True).start()
+        self.refresher.start_periodic(100)
+
+    def _send_worker(self, commands, token):
+        try:
+            for command in commands:
+                command(token)
+        except BusAborted:
+            self.post_status("Commands aborted by STOP", "red")
+        except Exception as e:
+            # ワーカースレッドの例外は端末にしか出ないので、ステータスに表示する
+            self.post_status(f"Commands failed: {e}", "red")
+        finally:
+            self.batch_running.clear()
+
+    def emergency_stop(self):
+        """送信待ちの要求を打ち切り、全軸に STOP を送る"""
+        try:
+            report = emergency_stop(self.client, self.bus_lock)
+            self.status_label.config(text=str(report), fg="red")
+        except Exception as e:
+            self.status_label.config(text=f"STOP error: {e}", fg="red")
+
+    def release_stop(self):
+        """全軸の STOP を解除する（送信中のバッチがあれば終わるのを待ってからバスを使う）"""
+        def worker():
+            try:
+                release_stop(self.client, self.bus_lock)
+                self.post_status("STOP released; motors accept moves again", "green")
+            except Exception as e:
+                self.post_status(f"STOP release error: {e}", "red")
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.refresher.start_periodic(100)
+
+    def toggle_all_motors(self):
+        """すべてのモーターの有効/無効を切り替える"""
+        self.model.set_all_enabled(self.toggle_all_var.get())
+        self.grid.reload()
+
+    def poll_status(self):
+        """ライブステータスをバックグラウンドで読み取り、モデルを更新する"""
+        model = self.model
+        if self.status_table is not None:
+            self.poll_status_table()
+            return
+        while self.live_status_running.is_set():
+            for i in range(self.count):
+                if not self.live_status_running.is_set():
+                    break
+                try:
+                    with self.bus_lock:
+                        response = self.client.read_holding_registers(address=CVD.status1.address, count=1, device_id=model.ids[i])
+                    if response.isError():
+                        model.set_status(i, STATUS_UNKNOWN)
+                    else:
+                        model.set_status(i, response.registers[0])
+                        self.alarms.observe(model.ids[i], response.registers[0])
+                except Exception:
+                    model.set_status(i, STATUS_UNKNOWN)
+            time.sleep(LIVE_STATUS_INTERVAL)
+
+    def poll_status_table(self):
+        """ワーカープロセスが更新する共有メモリからライブステータスを読む（バスは使わない）"""
+        model = self.model
+        table = self.status_table
+        scratch = StatusRecord()      # 読み出しごとに上書きする（状態はすぐモデルに写す）
+        while self.live_status_running.is_set():
+            for i in range(self.count):
+                slot = table.lookup(self.status_ports[i], model.ids[i])
+                record = table.read(slot, scratch) if slot is not None else None
+                if record is not None and record.ok:
+                    model.set_status(i, record.status1)
+                    self.alarms.observe(model.ids[i], record.status1)
+                else:
+                    model.set_status(i, STATUS_UNKNOWN)
+            time.sleep(LIVE_STATUS_INTERVAL)
+
+    def toggle_live_status(self):
+        """ライブステータスの監視を開始/停止する"""
+        if self.live_status_var.get():
+            self.live_status_running.set()
+            threading.Thread(target=self.poll_status, daemon=True).start()
+            self.refresher.start_periodic(100)
+        else:
+            self.live_status_running.clear()
+
+    def close(self):
+        # ポーリングを止めてから接続を閉じる
+        self.live_status_running.clear()
+        self.watcher.close()
+        with self.bus_lock:
+            self.client.close()
+        if self.status_table is not None:
+            self.status_table.close()
+
+
+def main(count=AXIS_COUNT, columns=AXIS_COLUMNS, names=None, title=None, default_speed=100, default_step=100, argv=None):
+    """
+    N軸コントローラを起動する
+
+    呼び出し側の既定値はコマンドライン引数で上書きできる。
+    """
+    parser = argparse.ArgumentParser(description="N-axis motor control GUI")
+    parser.add_argument("--axes", type=int, default=count, help="number of axes")
+    parser.add_argument("--columns", type=int, default=columns, help="tiles per grid row")
+    parser.add_argument("--visible-rows", type=int, default=AXIS_VISIBLE_ROWS, help="grid rows shown without scrolling")
+    parser.add_argument("--status-table", metavar="NAME",
+                        help="read Live Status from a port_workers.py shared-memory table instead of the bus")
+    parser.add_argument("--capture", metavar="FILE", help="record every bus frame to FILE (see bus_replay.py)")
+    parser.add_argument("--no-discovery", action="store_true",
+                        help="do not pre-fill IDs from the discovery cache or validate it on the bus")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # ワーカーがポーリングしているポートを GUI も開くと、1本の RS-485 にマスターが2つになる
+    status_table = None
+    if args.status_table:
+        status_table = StatusTable(args.status_table)
+        if status_table.owns_port(MODBUS_PORT):
+            status_table.close()
+            parser.error(f"{MODBUS_PORT} is polled by the port_workers.py table '{args.status_table}'; "
+                         "set MODBUS_PORT to a port the workers do not own")
+
+    # Modbus接続の設定
+    client = create_client(fast=False)
+
+    capture = None
+    if args.capture:
+        capture = Capture(args.capture)
+        attach(client, capture)
+
+    # プロファイリング（Tk のフックはウィジェットの生成前に入れる）
+    profiler = Profiler.from_args(args)
+    if profiler:
+        profiler.install_tk()
+        profiler.instrument_client(client)
+        profiler.instrument_module(sys.modules[__name__])
+        profiler.start()
+
+    # Tkinter GUIの設定
+    root = tk.Tk()
+    root.title(title or f"{args.axes}-Motor Control GUI")
+    controller = AxisController(root, client, args.axes, args.columns, names=names, visible_rows=args.visible_rows,
+                                default_speed=default_speed, default_step=default_step,
+                                status_table=status_table)
+    # 前回の検出結果のIDをすぐに表示し、接続後にバックグラウンドで確認する
+    # （状態テーブルを使う場合はテーブルのポートとIDの並びをそのまま使う）
+    if args.status_table:
+        args.no_discovery = True
+    discovery = None if args.no_discovery else load_discovery()
+    if discovery is not None and discovery.matches_settings():
+        controller.apply_discovery(discovery)
+    try:
+        # Modbusクライアントを接続
+        if client.connect():
+            controller.status_label.config(text="Connected to Modbus successfully", fg="green")
+            if not args.no_discovery:
+                controller.start_discovery(discovery)
+        else:
+            controller.status_label.config(text="Failed to connect to Modbus", fg="red")
+
+        root.mainloop()
+    finally:
+        controller.close()
+        if capture:
+            capture.close()
+        if profiler:
+            profiler.finish()
+
+
+# GUIを起動
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Transport benchmark
+
+Polls STATUS_1/2 round-robin over the axes through each transport and reports
+requests/s, host CPU per request, and allocations per request:
+
+    pymodbus     ModbusSerialClient (default path)
+    fast         FastRtuClient.read_holding_registers (same API)
+    fast-into    FastRtuClient.read_registers_into (writes into a preallocated array)
+
+Without --port, the bus is simulated: responses from sim_bus.py are computed
+once and replayed instantly, with no inter-frame silence, so the numbers show
+host cost only. The "serial" row is the cost of the simulated port itself;
+subtract it from the others. With --port, the real chain is polled.
+
+Allocation columns:
+    alloc B/req   peak bytes allocated during one request (tracemalloc), freed or not
+    net blk/req   memory blocks still allocated after the run, per request (leaks / growth)
+
+A second table measures how the polled values are stored, per update and
+without the bus:
+
+    dict          a new status dict per read (the former lrd_manual.status())
+    AxisStatus    the per-axis __slots__ record updated in place (motor_model.py)
+    MotorModel    the GUI's array-backed live status (MotorModel.set_status)
+
+"kept B/axis" is the memory held per axis once every axis has been read.
+
+Usage: python3 src/bench_transport.py [--requests 5000] [--axes 28] [--port /dev/ttyUSB1]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from array import array
+
+from bus import *
+from fast_rtu import FastRtuClient
+from motor_model import AxisStatus, MotorModel, StatusStore
+from sim_bus import SimulatedBus, SimSerial
+
+ALLOC_SAMPLES = 500
+
+
+class CannedSerial(SimSerial):
+    """要求ごとの応答をキャッシュして返す SimSerial（シミュレーション側のコストを計測から外す）"""
+
+    def __init__(self, bus):
+        super().__init__(bus)
+        self._responses = {}
+
+    def write(self, data):
+        key = bytes(data)
+        response = self._responses.get(key)
+        if response is None:
+            response = self._responses[key] = self.bus.handle(key) or b''
+        self._rx += response
+        return len(data)
+
+
+def make_clients(args, bus):
+    clients = {
+        'pymodbus': create_client(port=args.port or MODBUS_PORT, fast=False),
+        'fast': FastRtuClient(port=args.port or MODBUS_PORT, silent=None if args.port else 0.0),
+    }
+    for client in clients.values():
+        if bus is not None:
+            client.socket = CannedSerial(bus)
+        if not client.connect():
+            print(f"ERROR: Cannot open port {args.port}")
+            raise SystemExit(1)
+    return clients
+
+
+def request_functions(clients, axes):
+    """トランスポートごとに、n 回目の要求を実行する関数"""
+    pymodbus_client = clients['pymodbus']
+    fast_client = clients['fast']
+    out = array('H', bytes(2 * 2 * (max(axes) + 1)))
+    count = len(axes)
+
+    def pymodbus_read(n):
+        device_id = axes[n % count]
+        pymodbus_client.read_holding_registers(address=STATUS_1_ADDR, count=2, device_id=device_id)
+
+    def fast_read(n):
+        device_id = axes[n % count]
+        fast_client.read_holding_registers(address=STATUS_1_ADDR, count=2, device_id=device_id)
+
+    def fast_into(n):
+        device_id = axes[n % count]
+        fast_client.read_registers_into(STATUS_1_ADDR, 2, device_id, out, 2 * device_id)
+
+    functions = [('pymodbus', pymodbus_read), ('fast', fast_read), ('fast-into', fast_into)]
+    if isinstance(fast_client.socket, CannedSerial):
+        # 同じ要求フレームを送って応答を読むだけのコスト
+        port = fast_client.socket
+        frames = []
+        for device_id in axes:
+            fast_client.read_holding_registers(address=STATUS_1_ADDR, count=2, device_id=device_id)
+            frames.append(bytes(fast_client._tx[:8]))
+        buffer = bytearray(9)
+
+        def serial_only(n):
+            port.write(frames[n % count])
+            port.readinto(buffer)
+
+        functions.insert(0, ('serial', serial_only))
+    return functions
+
+
+def measure(func, requests):
+    """
+    Returns:
+        tuple: (requests/s, CPU us/request, alloc B/request, net blocks/request)
+    """
+    for n in range(min(requests, 100)):    # ウォームアップ（コーデックのキャッシュなど）
+        func(n)
+
+    blocks = sys.getallocatedblocks()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for n in range(requests):
+        func(n)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    net_blocks = (sys.getallocatedblocks() - blocks) / requests
+
+    samples = min(requests, ALLOC_SAMPLES)
+    tracemalloc.start()
+    transient = 0
+    for n in range(samples):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func(n)
+        transient += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return requests / wall, cpu / requests * 1e6, transient / samples, net_blocks
+
+
+def _status_dict(status1, status2):
+    return {
+        'ready': bool(status1 & READY_BIT),
+        'move': bool(status1 & MOVE_BIT),
+        'start_status': bool(status1 & START_STATUS_BIT),
+        'alarm': bool(status1 & ALM_BIT),
+        'enable': bool(status2 & ENABLE_BIT),
+        'status1_raw': status1,
+        'status2_raw': status2,
+    }
+
+
+def state_functions(axes):
+    """
+    状態の保持方法ごとに、n 回目の更新を実行する関数と全軸分を作る関数
+
+    Returns:
+        list: (名前, 更新する関数, 全軸分の状態を作る関数)
+    """
+    count = len(axes)
+    # 運転中・停止を交互に繰り返す状態1（小さい整数のキャッシュに乗らない値）
+    values = [(0x1000 | READY_BIT | (MOVE_BIT if n % 2 else 0), ENABLE_BIT) for n in range(2 * count)]
+    latest = {}
+    store = StatusStore()
+    model = MotorModel(count)
+
+    def dict_update(n):
+        status1, status2 = values[n % len(values)]
+        latest[axes[n % count]] = _status_dict(status1, status2)
+
+    def record_update(n):
+        status1, status2 = values[n % len(values)]
+        store.update(axes[n % count], status1, status2)
+
+    def model_update(n):
+        # ポーリングスレッド側の更新だけ（画面側の take_dirty() は描画の周期で別に動く）
+        model.set_status(n % count, values[n % len(values)][0])
+
+    def dict_build():
+        return {device_id: _status_dict(*values[0]) for device_id in axes}
+
+    def record_build():
+        return {device_id: AxisStatus(device_id, *values[0]) for device_id in axes}
+
+    def model_build():
+        return MotorModel(count)
+
+    return [('dict', dict_update, dict_build), ('AxisStatus', record_update, record_build),
+            ('MotorModel', model_update, model_build)]
+
+
+def kept_bytes(build, count):
+    """build() で作った全軸分の状態が保持するメモリ [B/軸]"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    state = build()
+    kept = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del state
+    return kept / count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the pymodbus and fast RTU transports")
+    parser.add_argument("--requests", type=int, default=5000, help="requests per transport")
+    parser.add_argument("--axes", type=int, default=AXIS_COUNT, help="axes polled round-robin (IDs 1..N)")
+    parser.add_argument("--port", help="poll a real chain on this port instead of the simulated bus")
+    args = parser.parse_args()
+
+    axes = list(range(1, args.axes + 1))
+    bus = None if args.port else SimulatedBus({i: {STATUS_1_ADDR: READY_BIT} for i in axes})
+    clients = make_clients(args, bus)
+    try:
+        print(f"{args.requests} status reads over {len(axes)} axes "
+              f"({'port ' + args.port if args.port else 'simulated bus'})")
+        print(f"{'transport':<12}{'req/s':>10}{'CPU us/req':>12}{'alloc B/req':>13}{'net blk/req':>13}")
+        for name, func in request_functions(clients, axes):
+            rate, cpu, transient, net_blocks = measure(func, args.requests)
+            print(f"{name:<12}{rate:>10.0f}{cpu:>12.1f}{transient:>13.0f}{net_blocks:>13.3f}")
+    finally:
+        for client in clients.values():
+            client.close()
+
+    print(f"{args.requests} status updates over {len(axes)} axes (host only)")
+    print(f"{'state':<12}{'upd/s':>10}{'CPU us/upd':>12}{'alloc B/upd':>13}{'net blk/upd':>13}{'kept B/axis':>13}")
+    for name, func, build in state_functions(axes):
+        rate, cpu, transient, net_blocks = measure(func, args.requests)
+        print(f"{name:<12}{rate:>10.0f}{cpu:>12.2f}{transient:>13.0f}{net_blocks:>13.3f}"
+              f"{kept_bytes(build, len(axes)):>13.0f}")
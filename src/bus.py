@@ -0,0 +1,193 @@
+"""
+Modbus バス共通処理
+
+各スクリプトで重複していたクライアント生成と、IDスキャンなどの
+複数ドライバにまたがるバス操作をまとめる。
+"""
+
+import time
+from pymodbus.client import ModbusSerialClient as ModbusClient, ModbusTcpClient
+from register_map import AZ, plan_blocks, MAX_READ_COUNT, MAX_WRITE_COUNT
+from setting import *
+
+# オリエンタルモーター パラメータアドレス (AZシリーズ等、register_map.py)
+SLAVE_ID_ADDRESS = AZ.slave_id.address                      # スレーブID設定レジスタ
+NV_MEMORY_WRITE_ADDRESS = AZ.nv_write.address               # 不揮発メモリ一括書き込み
+CONFIGURATION_EXECUTE_ADDRESS = AZ.configuration.address    # 構成設定（Configuration）
+
+# 指令・状態レジスタ (AZ/LRDシリーズ)
+COMMAND_1_ADDR = AZ.command1.address   # 指令1
+STATUS_1_ADDR = AZ.status1.address     # 状態1（続く0021hが状態2）
+
+# 状態1のビット
+READY_BIT = 0x20      # Bit5
+MOVE_BIT = 0x04       # Bit2
+START_STATUS_BIT = 0x01  # Bit0
+ALM_BIT = 0x80        # Bit7
+
+# 状態2のビット
+ENABLE_BIT = 0x02     # Bit1
+
+BROADCAST_ID = 0
+ILLEGAL_FUNCTION = 0x01
+
+
+def _fc23_unsupported(client):
+    """
+    FC 0x17 に対応していないことが分かったドライバのID（以降は2往復で処理する）
+
+    同じIDでもポート（クライアント）ごとに別のドライバなので、クライアントごとに持つ。
+    """
+    unsupported = getattr(client, 'fc23_unsupported', None)
+    if unsupported is None:
+        unsupported = client.fc23_unsupported = set()
+    return unsupported
+
+
+def create_client(port=MODBUS_PORT, baudrate=MODBUS_BAUDRATE, timeout=MODBUS_TIMEOUT, retries=3,
+                  fast=MODBUS_FAST_TRANSPORT, capture=None, server=MODBUS_SERVER):
+    """
+    setting.py の通信設定で Modbus RTU クライアントを生成する
+
+    fast=True の場合は同じ API の軽量トランスポート（fast_rtu.py）を使う。
+    server（'host:port'）を指定すると、シリアルポートの代わりに bus_server.py に接続する。
+    capture（bus_capture.Capture）を渡すと送受信フレームを記録する。
+    シリアルポートのクライアントは送受信をポートごとの利用率に集計する（client.usage、bus_usage.py）。
+    """
+    if server:
+        host, _, server_port = server.rpartition(':')
+        client = ModbusTcpClient(host or 'localhost', port=int(server_port), timeout=timeout, retries=retries)
+    elif fast:
+        from fast_rtu import FastRtuClient
+        client = FastRtuClient(port=port, baudrate=baudrate, timeout=timeout, retries=retries,
+                               parity=MODBUS_PARITY, stopbits=MODBUS_STOPBITS)
+    else:
+        client = ModbusClient(
+            port=port,
+            baudrate=baudrate,
+            timeout=timeout,
+            retries=retries,
+            parity=MODBUS_PARITY,
+            stopbits=MODBUS_STOPBITS
+        )
+    if not server:
+        from bus_usage import attach_usage, usage_for
+        attach_usage(client, usage_for(port, baudrate))
+    if capture is not None:
+        from bus_capture import attach
+        attach(client, capture)
+    return client
+
+
+def scan_ids(client, ids, address=SLAVE_ID_ADDRESS, count=2):
+    """
+    指定したIDを1回ずつ読み取り、応答したドライバを返す
+
+    待ち時間は入れず、応答のないIDはクライアントのタイムアウトだけで次へ進む。
+
+    Args:
+        client: Modbus クライアント（短いタイムアウト・リトライなしを推奨）
+        ids (iterable): スキャンするID
+        address (int): 読み取るレジスタ
+        count (int): 読み取るレジスタ数
+
+    Returns:
+        dict: ID -> (読み取ったレジスタ, 応答時間[s])
+    """
+    found = {}
+    for device_id in ids:
+        started = time.perf_counter()
+        try:
+            res = client.read_holding_registers(address=address, count=count, device_id=device_id)
+        except Exception:
+            continue
+        if not res.isError():
+            found[device_id] = (res.registers, time.perf_counter() - started)
+    return found
+
+
+def configure_all(client):
+    """構成設定をブロードキャストで全ドライバに一度だけ送る（応答なし）"""
+    client.write_registers(address=CONFIGURATION_EXECUTE_ADDRESS, values=[0, 1],
+                           device_id=BROADCAST_ID, no_response_expected=True)
+
+
+def check(response, what):
+    """エラー応答なら例外にする"""
+    if response.isError():
+        raise Exception(f"{what} failed: {response}")
+    return response
+
+
+def read_fields(client, device_id, regmap, names, max_gap=0):
+    """
+    パラメータを名前で読む（隣接するパラメータは1回の読み出しにまとめる）
+
+    Args:
+        regmap (RegisterMap): ドライバのレジスタマップ（register_map.py）
+        names (iterable): パラメータ名
+        max_gap (int): まとめるために読み飛ばしてもよい未使用レジスタ数
+
+    Returns:
+        dict: パラメータ名 -> 値
+    """
+    values = {}
+    for block in regmap.plan(names, MAX_READ_COUNT, max_gap):
+        res = check(client.read_holding_registers(address=block.address, count=block.count, device_id=device_id),
+                    f"ID {device_id}: read of 0x{block.address:04X}+{block.count}")
+        for register, value in zip(block.registers, block.decode(res.registers)):
+            values[register.name] = value
+    return values
+
+
+def write_fields(client, device_id, regmap, values):
+    """
+    パラメータを名前で書き込む（連続したパラメータは1回の FC10 にまとめる）
+
+    Args:
+        regmap (RegisterMap): ドライバのレジスタマップ（register_map.py）
+        values (dict): パラメータ名 -> 値（ID 0 はブロードキャスト、応答なし）
+    """
+    broadcast = device_id == BROADCAST_ID
+    for block in regmap.plan(values, MAX_WRITE_COUNT):
+        registers = block.encode([values[register.name] for register in block.registers])
+        res = client.write_registers(address=block.address, values=registers, device_id=device_id,
+                                     no_response_expected=broadcast)
+        if not broadcast:
+            check(res, f"ID {device_id}: write of 0x{block.address:04X}+{block.count}")
+
+
+def read_status(client, device_id):
+    """
+    状態1・状態2を1回の読み出しで取得する
+
+    Returns:
+        tuple: (状態1, 状態2)
+    """
+    res = check(client.read_holding_registers(address=STATUS_1_ADDR, count=2, device_id=device_id),
+                f"ID {device_id}: status read")
+    return res.registers[0], res.registers[1]
+
+
+def command_status(client, device_id, command):
+    """
+    指令1を書き込み、その結果の状態1・状態2を返す
+
+    Read/Write Multiple Registers (FC 0x17) で書き込みと読み出しを1往復で行う。
+    FC 0x17 に対応していないドライバでは書き込みと読み出しの2往復に切り替える。
+
+    Returns:
+        tuple: (状態1, 状態2)
+    """
+    unsupported = _fc23_unsupported(client)
+    if device_id not in unsupported:
+        res = client.readwrite_registers(read_address=STATUS_1_ADDR, read_count=2,
+                                         write_address=COMMAND_1_ADDR, values=[command], device_id=device_id)
+        if not res.isError():
+            return res.registers[0], res.registers[1]
+        if getattr(res, 'exception_code', None) != ILLEGAL_FUNCTION:
+            raise Exception(f"ID {device_id}: command 0x{command:04X} failed: {res}")
+        unsupported.add(device_id)
+    check(client.write_registers(address=COMMAND_1_ADDR, values=[command], device_id=device_id),
+          f"ID {device_id}: command 0x{command:04X}")
+    return read_status(client, device_id)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Bus traffic capture
+
+Records every frame sent and received by a Modbus client, with monotonic
+timestamps, into a compact binary file:
+
+    header   "MBCAP001", baud rate (u32), wall-clock start (f64), monotonic start [ns] (u64)
+    record   offset from start [ns] (u64), direction (u8: 0 = sent, 1 = received), length (u16), bytes
+
+Enable it with create_client(capture=Capture(path)) or --capture FILE on
+axis_controller.py (and its wrappers). Replay a capture with bus_replay.py.
+
+    python3 src/bus_capture.py info batch.mbcap      # frames, duration, per-ID latency
+"""
+
+import argparse
+import struct
+import threading
+import time
+
+from setting import *
+
+CAPTURE_MAGIC = b"MBCAP001"
+_HEADER = struct.Struct('<8sIdQ')
+_RECORD = struct.Struct('<QBH')
+SENT = 0
+RECEIVED = 1
+
+
+class Capture:
+    """
+    送受信フレームをファイルに記録する
+
+    Args:
+        path (str): 出力ファイル
+        baudrate (int): 記録するボーレート（再生時の時間計算に使う）
+    """
+
+    def __init__(self, path, baudrate=MODBUS_BAUDRATE):
+        self.path = path
+        self._file = open(path, "wb")
+        self._lock = threading.Lock()
+        self._start = time.monotonic_ns()
+        self._file.write(_HEADER.pack(CAPTURE_MAGIC, baudrate, time.time(), self._start))
+        self.frames = 0
+
+    def record(self, direction, data):
+        offset = time.monotonic_ns() - self._start
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(_RECORD.pack(offset, direction, len(data)))
+            self._file.write(data)
+            self.frames += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def tap(client, on_sent, on_received):
+    """
+    クライアントの送受信のたびに on_sent(data) / on_received(data) を呼ぶ
+
+    pymodbus のクライアントと fast_rtu.FastRtuClient のどちらにも使える
+    （どちらもシリアルの入出力を send / recv に集めている）。
+    """
+    send = client.send
+    recv = client.recv
+
+    def tapped_send(data, *args, **kwargs):
+        on_sent(data)
+        return send(data, *args, **kwargs)
+
+    if hasattr(client, 'read_registers_into'):
+        # FastRtuClient: recv(view) は読み込んだバイト数を返す
+        def tapped_recv(view):
+            n = recv(view)
+            if n:
+                on_received(view[:n])
+            return n
+    else:
+        def tapped_recv(size):
+            data = recv(size)
+            if data:
+                on_received(data)
+            return data
+
+    client.send = tapped_send
+    client.recv = tapped_recv
+    # 同期クライアントのトランザクション管理は生成時に send を保持している
+    transaction = getattr(client, 'transaction', None)
+    if transaction is not None and hasattr(transaction, 'low_level_send'):
+        transaction.low_level_send = client.send
+    return client
+
+
+def attach(client, capture):
+    """クライアントの送受信を capture に記録する"""
+    return tap(client, lambda data: capture.record(SENT, bytes(data)),
+               lambda data: capture.record(RECEIVED, bytes(data)))
+
+
+def read_capture(path):
+    """
+    キャプチャファイルを読む
+
+    Returns:
+        tuple: (ボーレート, 開始時刻（time.time()）, [(経過時間 [s], 方向, bytes), ...])
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{path}: not a capture file")
+    magic, baudrate, wall_start, _ = _HEADER.unpack_from(data, 0)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"{path}: not a capture file")
+    records = []
+    offset = _HEADER.size
+    view = memoryview(data)
+    while offset + _RECORD.size <= len(data):
+        t, direction, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if offset + length > len(data):
+            break    # 記録中に終了した場合の途中のレコード
+        records.append((t / 1e9, direction, bytes(view[offset:offset + length])))
+        offset += length
+    return baudrate, wall_start, records
+
+
+class Transaction:
+    """要求と、それに続く応答（次の要求までに受信したバイト列）"""
+
+    __slots__ = ('sent', 'received', 'request', 'response')
+
+    def __init__(self, sent, request):
+        self.sent = sent              # 要求の送信時刻 [s]
+        self.received = None          # 応答の最後のバイト列の受信時刻 [s]
+        self.request = request
+        self.response = b""
+
+    @property
+    def device_id(self):
+        return self.request[0]
+
+    @property
+    def function_code(self):
+        return self.request[1]
+
+    @property
+    def latency(self):
+        return None if self.received is None else self.received - self.sent
+
+
+def transactions(records):
+    """記録を要求ごとのトランザクションにまとめる"""
+    result = []
+    for t, direction, data in records:
+        if direction == SENT:
+            result.append(Transaction(t, data))
+        elif result:
+            current = result[-1]
+            current.response += data
+            current.received = t
+    return result
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def print_info(path):
+    baudrate, wall_start, records = read_capture(path)
+    txns = transactions(records)
+    duration = records[-1][0] if records else 0.0
+    print(f"{path}: {len(records)} frames, {len(txns)} requests, {duration:.3f} s at {baudrate} bps, "
+          f"started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall_start))}")
+    by_id = {}
+    for txn in txns:
+        by_id.setdefault(txn.device_id, []).append(txn)
+    for device_id, items in sorted(by_id.items()):
+        latencies = [t.latency for t in items if t.latency is not None]
+        missing = len(items) - len(latencies)
+        print(f"  ID {device_id:>3}: {len(items):>6} requests, {missing:>4} unanswered, "
+              f"latency p50 {percentile(latencies, 0.5) * 1000:.2f} ms p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect a bus capture file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("info", help="summarize a capture")
+    p.add_argument("capture")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print_info(args.capture)
@@ -0,0 +1,103 @@
+"""
+バスの排他制御
+
+複数スレッドで1つの Modbus クライアントを共有するためのロック。
+通常の要求は到着順に1トランザクションずつ処理し、停止要求（preempt）は
+待っている通常の要求をすべて追い越す。停止要求があった時点で待っていた
+通常の要求と、それ以前に始まったバッチは BusAborted で打ち切られる。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class BusAborted(Exception):
+    """停止要求によって打ち切られた"""
+
+
+class BusLock:
+    """
+    停止要求が割り込める Modbus クライアント用のロック
+
+    使用例:
+        with lock:                    # 1トランザクション
+            client.read_holding_registers(...)
+
+        token = lock.token()          # バッチの開始
+        for i in axes:
+            with lock.hold(token):    # 途中で停止要求があれば BusAborted
+                client.write_registers(...)
+
+        with lock.preempt():          # 停止要求（待ち行列の先頭に割り込む）
+            client.write_registers(...)
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._busy = False
+        self._stops_waiting = 0
+        self.generation = 0
+        self.max_hold = 0.0     # 1回の保持時間の最大値 [s]（停止遅延の見積もりに使う）
+        self._acquired_at = 0.0
+
+    def token(self):
+        """バッチの開始時に取得し、hold() に渡す"""
+        return self.generation
+
+    def __enter__(self):
+        self._acquire(self.generation)
+        return self
+
+    def __exit__(self, *exc):
+        self._release()
+        return False
+
+    @contextmanager
+    def hold(self, token):
+        """token 取得後に停止要求があれば BusAborted を送出する"""
+        self._acquire(token)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    @contextmanager
+    def preempt(self):
+        """
+        停止要求としてロックを取得する
+
+        実行中のトランザクションの完了だけを待ち、待機中の通常の要求より先に取得する。
+        """
+        with self._cond:
+            self._stops_waiting += 1
+            self.generation += 1
+            self._cond.notify_all()
+            while self._busy:
+                self._cond.wait()
+            self._stops_waiting -= 1
+            self._busy = True
+            self._acquired_at = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self._release()
+
+    def _acquire(self, token):
+        with self._cond:
+            while self._busy or self._stops_waiting:
+                if self.generation != token:
+                    raise BusAborted("aborted by stop request")
+                self._cond.wait()
+            if self.generation != token:
+                raise BusAborted("aborted by stop request")
+            self._busy = True
+            self._acquired_at = time.perf_counter()
+
+    def _release(self):
+        with self._cond:
+            held = time.perf_counter() - self._acquired_at
+            if held > self.max_hold:
+                self.max_hold = held
+            self._busy = False
+            self._cond.notify_all()
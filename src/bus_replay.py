@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Deterministic replay of a bus capture
+
+Feeds the requests of a capture (bus_capture.py) back through a Modbus client
+against a simulated bus. The bus answers each request with the response
+recorded for it, after the recorded latency, so a problem seen on the line
+can be reproduced without hardware. At --speed 2 the capture plays twice as
+fast, and --speed 0 sends requests back-to-back with instant responses, which
+shows host cost only.
+
+The report compares the original and replayed durations and latencies, and
+counts replayed responses whose registers differ from the capture.
+
+Usage:
+    python3 src/bus_replay.py batch.mbcap [--speed 1.0] [--fast] [--timeout SECONDS]
+"""
+
+import argparse
+import struct
+import time
+from collections import deque
+
+from bus import create_client
+from bus_capture import read_capture, transactions, percentile
+from fast_rtu import FastRtuClient
+from sim_bus import SimulatedBus, SimSerial
+
+
+class ReplayBus(SimulatedBus):
+    """
+    記録した応答を返すシミュレーションバス
+
+    同じ要求フレームには記録の順に応答を返す。記録にない要求はレジスタメモリで処理する。
+
+    Args:
+        txns (list): bus_capture.transactions() の結果
+        speed (float): 再生速度（応答までの時間を 1/speed にする。0 の場合は待たない）
+    """
+
+    def __init__(self, txns, speed=1.0):
+        super().__init__()
+        self.speed = speed
+        self.responses = {}
+        for txn in txns:
+            self.responses.setdefault(txn.request, deque()).append((txn.response, txn.latency))
+            if txn.device_id and txn.device_id not in self.devices:
+                self.add_device(txn.device_id)
+        self.replayed = 0
+        self._latency = 0.0
+
+    def handle(self, frame):
+        recorded = self.responses.get(bytes(frame))
+        if recorded:
+            response, latency = recorded.popleft()
+            self.replayed += 1
+            self._latency = latency or 0.0
+            return response or None
+        self._latency = 0.0
+        return super().handle(frame)
+
+    def response_delay(self, frame, response):
+        if not self.speed:
+            return 0.0
+        return self._latency / self.speed
+
+
+def issue(client, request):
+    """
+    要求フレームをクライアントの呼び出しに戻して実行する
+
+    Returns:
+        list: 読み出したレジスタ（読み出しのない要求は []）。対応していないファンクションは None
+    """
+    device_id, function_code = request[0], request[1]
+    broadcast = device_id == 0
+    if function_code == 0x03:
+        address, count = struct.unpack_from('>HH', request, 2)
+        res = client.read_holding_registers(address=address, count=count, device_id=device_id)
+    elif function_code == 0x06:
+        address, value = struct.unpack_from('>HH', request, 2)
+        res = client.write_register(address=address, value=value, device_id=device_id,
+                                    no_response_expected=broadcast)
+    elif function_code == 0x10:
+        address, count = struct.unpack_from('>HH', request, 2)
+        values = list(struct.unpack_from(f'>{count}H', request, 7))
+        res = client.write_registers(address=address, values=values, device_id=device_id,
+                                     no_response_expected=broadcast)
+    elif function_code == 0x17:
+        read_address, read_count, write_address, write_count = struct.unpack_from('>HHHH', request, 2)
+        values = list(struct.unpack_from(f'>{write_count}H', request, 11))
+        res = client.readwrite_registers(read_address=read_address, read_count=read_count,
+                                         write_address=write_address, values=values, device_id=device_id)
+    else:
+        return None
+    if res is None:       # pymodbus のブロードキャスト
+        return []
+    if res.isError():
+        raise Exception(f"ID {device_id}: {res}")
+    return list(getattr(res, 'registers', None) or [])
+
+
+def recorded_registers(txn):
+    """記録した応答のレジスタ（FC03 / FC17 の正常応答のみ）"""
+    response = txn.response
+    if len(response) >= 5 and response[1] in (0x03, 0x17):
+        count = response[2] // 2
+        if len(response) >= 5 + 2 * count:
+            return list(struct.unpack_from(f'>{count}H', response, 3))
+    return []
+
+
+def original_timeout(txns, default=0.1):
+    """
+    記録時のタイムアウトの見積もり（応答のなかった要求から次の要求までの最短の間隔）
+
+    再生側のタイムアウトをこれ以下にしておけば、応答のない要求で再生が遅れていかない。
+    """
+    gaps = [following.sent - txn.sent for txn, following in zip(txns, txns[1:])
+            if txn.latency is None and txn.device_id != 0]
+    return min(gaps) * 0.9 if gaps else default
+
+
+def replay(path, speed=1.0, fast=False, timeout=None):
+    baudrate, _, records = read_capture(path)
+    txns = transactions(records)
+    if not txns:
+        print(f"{path}: no requests")
+        return
+    if timeout is None:
+        timeout = original_timeout(txns) / (speed or 1.0)
+    bus = ReplayBus(txns, speed)
+    if fast:
+        # 最高速の再生では無通信区間も待たない（ホスト側のコストだけを見る）
+        client = FastRtuClient(baudrate=baudrate, timeout=timeout, retries=0, silent=None if speed else 0.0)
+    else:
+        client = create_client(baudrate=baudrate, timeout=timeout, retries=0, fast=False)
+    client.socket = SimSerial(bus, timeout=timeout)
+    client.connect()
+
+    latencies = []
+    errors = skipped = mismatches = 0
+    origin = txns[0].sent
+    started = time.perf_counter()
+    try:
+        for txn in txns:
+            if speed:
+                delay = started + (txn.sent - origin) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                registers = issue(client, txn.request)
+            except Exception:
+                errors += 1
+                continue
+            if registers is None:
+                skipped += 1
+                continue
+            latencies.append(time.perf_counter() - sent)
+            if registers != recorded_registers(txn):
+                mismatches += 1
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - started
+
+    original = [t.latency for t in txns if t.latency is not None]
+    unanswered = sum(1 for t in txns if t.latency is None and t.device_id != 0)
+    duration = txns[-1].sent - origin
+    print(f"{path}: {len(txns)} requests at speed {speed or 'max'} "
+          f"({'fast' if fast else 'pymodbus'} transport)")
+    print(f"  original: {duration:.3f} s, latency p50 {percentile(original, 0.5) * 1000:.2f} ms "
+          f"p99 {percentile(original, 0.99) * 1000:.2f} ms, {unanswered} unanswered")
+    print(f"  replay:   {elapsed:.3f} s ({len(txns) / elapsed:.0f} req/s), latency p50 "
+          f"{percentile(latencies, 0.5) * 1000:.2f} ms p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"{errors} error(s), {skipped} skipped, {mismatches} register mismatch(es)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a bus capture against a simulated bus")
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed (0: as fast as possible)")
+    parser.add_argument("--fast", action="store_true", help="replay through the fast RTU transport")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="client timeout for unanswered requests [s] (default: estimated from the capture)")
+    args = parser.parse_args()
+    replay(args.capture, args.speed, args.fast, args.timeout)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Local bus server
+
+Owns the serial port and lets several tools share it: the GUI, a monitoring
+dashboard and test scripts connect as Modbus TCP clients (pymodbus
+ModbusTcpClient, or any tool using create_client() with MODBUS_SERVER set in
+setting.py) and the server forwards their requests to the RTU bus one
+transaction at a time.
+
+Reads (FC03) are shared between clients:
+  - identical reads already on the wire are coalesced: later callers wait for
+    the same transaction instead of queueing another one
+  - answered reads are cached for --ttl-ms; a read inside a cached range is
+    answered from the cache without touching the bus
+Writes always go to the bus, in arrival order, and drop everything cached for the
+device they touch (a broadcast drops the whole cache). A read-only consumer
+polling no faster than the TTL therefore adds almost no bus load.
+
+Usage:
+    python3 src/bus_server.py [--host 127.0.0.1] [--port 5020] [--ttl-ms 50] [--fast]
+"""
+
+import argparse
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+from bus import create_client
+from bus_lock import BusLock
+from setting import *
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5020
+DEFAULT_TTL = 0.05          # 読み出し結果のキャッシュ期間 [s]
+STATS_INTERVAL = 10.0       # 統計の表示間隔 [s]
+
+_MBAP = struct.Struct('>HHHB')
+
+# Modbus の例外コード
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_VALUE = 0x03
+GATEWAY_TARGET_FAILED = 0x0B    # 転送先のデバイスが応答しない
+
+
+class GatewayError(Exception):
+    """クライアントに例外応答として返すエラー"""
+
+    def __init__(self, code, message=""):
+        super().__init__(message or f"exception code 0x{code:02X}")
+        self.code = code
+
+
+class ServerStats:
+    """クライアントからの要求とバスのトランザクションの件数"""
+
+    __slots__ = ('requests', 'reads', 'cache_hits', 'coalesced', 'bus_reads', 'bus_writes', 'errors')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def __str__(self):
+        saved = self.cache_hits + self.coalesced
+        share = saved / self.reads if self.reads else 0.0
+        return (f"{self.requests} requests ({self.reads} reads: {self.cache_hits} cached, {self.coalesced} coalesced, "
+                f"{share:.0%} served without the bus); bus: {self.bus_reads} reads, {self.bus_writes} writes, "
+                f"{self.errors} errors")
+
+
+class BusGateway:
+    """
+    1つのクライアントでバスを使い、読み出しを共有する
+
+    Args:
+        client: Modbus クライアント（接続済み）
+        ttl (float): 読み出し結果のキャッシュ期間 [s]
+        lock (BusLock): クライアントを共有する場合のロック
+    """
+
+    def __init__(self, client, ttl=DEFAULT_TTL, lock=None):
+        self.client = client
+        self.ttl = ttl
+        self.lock = lock or BusLock()
+        self.stats = ServerStats()
+        self._cache = {}        # デバイスID -> [(アドレス, レジスタ値, 読み出し時刻), ...]
+        self._inflight = {}     # (デバイスID, アドレス, 個数) -> Future
+        self._writes = 0        # 書き込みの回数（書き込みをまたいだ読み出しはキャッシュしない）
+        self._state = threading.Lock()
+
+    def _cached(self, device_id, address, count, now):
+        for start, registers, read_at in self._cache.get(device_id, ()):
+            if now - read_at <= self.ttl and start <= address and address + count <= start + len(registers):
+                return registers[address - start:address - start + count]
+        return None
+
+    def _store(self, device_id, address, registers, now):
+        entries = [e for e in self._cache.get(device_id, ()) if now - e[2] <= self.ttl and e[0] != address]
+        entries.append((address, registers, now))
+        self._cache[device_id] = entries
+
+    def _invalidate(self, device_id):
+        # 書き込みは他のレジスタも変える（指令1への START / STOP で状態1・2が変わる）ため、
+        # 重なる範囲だけでなくそのデバイスのキャッシュをすべて捨てる
+        if device_id == 0:
+            self._cache.clear()
+        else:
+            self._cache.pop(device_id, None)
+
+    def read(self, device_id, address, count):
+        """保持レジスタを読む（キャッシュ・同じ読み出しの待ち合わせを使う）"""
+        key = (device_id, address, count)
+        with self._state:
+            self.stats.reads += 1
+            registers = self._cached(device_id, address, count, time.monotonic())
+            if registers is not None:
+                self.stats.cache_hits += 1
+                return registers
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                writes = self._writes
+            else:
+                self.stats.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            with self.lock:
+                res = self.client.read_holding_registers(address=address, count=count, device_id=device_id)
+            registers = self._registers(res)
+        except BaseException as e:
+            with self._state:
+                del self._inflight[key]
+                self.stats.errors += 1
+            future.set_exception(e)
+            raise
+        with self._state:
+            del self._inflight[key]
+            self.stats.bus_reads += 1
+            if writes == self._writes:
+                self._store(device_id, address, registers, time.monotonic())
+        future.set_result(registers)
+        return registers
+
+    def write(self, device_id, address, values):
+        """保持レジスタに書き込む（ブロードキャストは応答を待たない）"""
+        with self._state:
+            self._writes += 1
+            self._invalidate(device_id)
+        try:
+            with self.lock:
+                res = self.client.write_registers(address=address, values=values, device_id=device_id,
+                                                  no_response_expected=device_id == 0)
+            if device_id != 0:
+                self._registers(res)
+        except BaseException:
+            with self._state:
+                self.stats.errors += 1
+            raise
+        finally:
+            with self._state:
+                self.stats.bus_writes += 1
+
+    def readwrite(self, device_id, read_address, read_count, write_address, values):
+        """FC17（書き込み後に読み出し。読み出し結果はキャッシュしない）"""
+        with self._state:
+            self._writes += 1
+            self._invalidate(device_id)
+        try:
+            with self.lock:
+                res = self.client.readwrite_registers(read_address=read_address, read_count=read_count,
+                                                      write_address=write_address, values=values,
+                                                      device_id=device_id)
+            return self._registers(res)
+        except BaseException:
+            with self._state:
+                self.stats.errors += 1
+            raise
+        finally:
+            with self._state:
+                self.stats.bus_writes += 1
+
+    @staticmethod
+    def _registers(res):
+        if res is None:
+            return []
+        if res.isError():
+            raise GatewayError(getattr(res, 'exception_code', 0) or GATEWAY_TARGET_FAILED, str(res))
+        return list(getattr(res, 'registers', None) or [])
+
+    def execute(self, device_id, pdu):
+        """
+        要求 PDU を実行して応答 PDU を返す
+
+        Returns:
+            bytes: 応答 PDU。ブロードキャストの場合は None
+        """
+        function_code = pdu[0]
+        with self._state:
+            self.stats.requests += 1
+        try:
+            if function_code == 0x03:
+                address, count = struct.unpack_from('>HH', pdu, 1)
+                if not 1 <= count <= 125:
+                    raise GatewayError(ILLEGAL_DATA_VALUE)
+                registers = self.read(device_id, address, count)
+                return bytes([0x03, 2 * count]) + struct.pack(f'>{count}H', *registers)
+            if function_code == 0x06:
+                address, value = struct.unpack_from('>HH', pdu, 1)
+                self.write(device_id, address, [value])
+                return None if device_id == 0 else pdu[:5]
+            if function_code == 0x10:
+                address, count = struct.unpack_from('>HH', pdu, 1)
+                self.write(device_id, address, list(struct.unpack_from(f'>{count}H', pdu, 6)))
+                return None if device_id == 0 else pdu[:5]
+            if function_code == 0x17:
+                read_address, read_count, write_address, write_count = struct.unpack_from('>HHHH', pdu, 1)
+                values = list(struct.unpack_from(f'>{write_count}H', pdu, 10))
+                registers = self.readwrite(device_id, read_address, read_count, write_address, values)
+                return bytes([0x17, 2 * read_count]) + struct.pack(f'>{read_count}H', *registers)
+            raise GatewayError(ILLEGAL_FUNCTION)
+        except GatewayError as e:
+            code = e.code
+        except struct.error:
+            code = ILLEGAL_DATA_VALUE
+        except Exception:
+            # タイムアウトなど、転送先から応答が得られなかった
+            code = GATEWAY_TARGET_FAILED
+        return None if device_id == 0 else bytes([function_code | 0x80, code])
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """1接続分の Modbus TCP の要求を順に処理する"""
+
+    def _recv_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return bytes(data)
+
+    def handle(self):
+        gateway = self.server.gateway
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            header = self._recv_exact(_MBAP.size)
+            if header is None:
+                return
+            transaction_id, protocol, length, unit = _MBAP.unpack(header)
+            pdu = self._recv_exact(length - 1) if length > 1 else b''
+            if pdu is None or protocol != 0 or not pdu:
+                return
+            response = gateway.execute(unit, pdu)
+            if response is not None:
+                self.request.sendall(_MBAP.pack(transaction_id, 0, len(response) + 1, unit) + response)
+
+
+class BusServer(socketserver.ThreadingTCPServer):
+    """接続ごとのスレッドで要求を受け付ける Modbus TCP サーバ"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, gateway, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        super().__init__((host, port), _Handler)
+        self.gateway = gateway
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share the Modbus RTU bus with several local clients")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="listen address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="listen port (Modbus TCP)")
+    parser.add_argument("--ttl-ms", type=float, default=DEFAULT_TTL * 1000, help="read cache lifetime [ms]")
+    parser.add_argument("--fast", action="store_true", help="use the fast RTU transport on the bus")
+    args = parser.parse_args()
+
+    client = create_client(fast=args.fast, server=None)
+    if not client.connect():
+        print(f"ERROR: Cannot open port {MODBUS_PORT}")
+        raise SystemExit(1)
+    gateway = BusGateway(client, ttl=args.ttl_ms / 1000)
+    server = BusServer(gateway, args.host, args.port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving {MODBUS_PORT} on {args.host}:{args.port} (cache {args.ttl_ms:.0f} ms)")
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            print(gateway.stats)
+            print(f"  {client.usage}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        client.close()
+        print(gateway.stats)
@@ -0,0 +1,118 @@
+"""
+RS-485 上の Modbus RTU フレームの時間計算
+
+フレーム長、ボーレート、キャラクタ構成（スタート1 + データ8 + パリティ + ストップ）、
+3.5キャラクタの無通信区間、応答までのターンアラウンドからトランザクションの
+通信時間を求める。
+"""
+
+import time
+
+import serial
+
+from bus import STATUS_1_ADDR
+from setting import *
+
+# Modbus RTU のフレーム長 [byte]（アドレス1 + ファンクション1 + ... + CRC2）
+READ_REQUEST_BYTES = 8                    # FC03 要求
+
+# ボーレートが19200bpsを超える場合、フレーム間の無通信区間は1.75msに固定（Modbus仕様）
+FIXED_SILENT_INTERVAL = 0.00175
+FIXED_SILENT_BAUDRATE = 19200
+
+DEFAULT_TURNAROUND = 0.001   # ドライバの応答までの処理時間 [s]（実測で置き換える）
+
+
+def bits_per_char(parity=MODBUS_PARITY, stopbits=MODBUS_STOPBITS):
+    """1キャラクタのビット数（スタート + データ8 + パリティ + ストップ）"""
+    return 1 + 8 + (0 if parity == serial.PARITY_NONE else 1) + stopbits
+
+
+def char_time(baudrate=MODBUS_BAUDRATE, parity=MODBUS_PARITY, stopbits=MODBUS_STOPBITS):
+    """1キャラクタの送信時間 [s]"""
+    return bits_per_char(parity, stopbits) / baudrate
+
+
+def silent_interval(baudrate=MODBUS_BAUDRATE, parity=MODBUS_PARITY, stopbits=MODBUS_STOPBITS):
+    """フレーム間の無通信区間（3.5キャラクタ）[s]"""
+    if baudrate > FIXED_SILENT_BAUDRATE:
+        return FIXED_SILENT_INTERVAL
+    return 3.5 * char_time(baudrate, parity, stopbits)
+
+
+def read_response_bytes(count):
+    """FC03 応答のバイト数"""
+    return 5 + 2 * count
+
+
+def write_request_bytes(count):
+    """FC10 要求のバイト数"""
+    return 9 + 2 * count
+
+
+WRITE_RESPONSE_BYTES = 8
+
+
+def readwrite_request_bytes(write_count):
+    """FC17 要求のバイト数"""
+    return 13 + 2 * write_count
+
+
+def frame_sizes(kind, count, read_count=0):
+    """
+    トランザクションの (要求, 応答) のバイト数
+
+    Args:
+        kind (str): 'read'（FC03）/ 'write'（FC10）/ 'readwrite'（FC17）/ 'broadcast'（応答なしのFC10）
+        count (int): 読み出し（read）または書き込み（write/readwrite/broadcast）のレジスタ数
+        read_count (int): readwrite の読み出しレジスタ数
+    """
+    if kind == 'read':
+        return READ_REQUEST_BYTES, read_response_bytes(count)
+    if kind == 'write':
+        return write_request_bytes(count), WRITE_RESPONSE_BYTES
+    if kind == 'readwrite':
+        return readwrite_request_bytes(count), read_response_bytes(read_count)
+    if kind == 'broadcast':
+        return write_request_bytes(count), 0
+    raise ValueError(f"unknown transaction kind: {kind}")
+
+
+def transaction_time(kind, count, read_count=0, baudrate=MODBUS_BAUDRATE,
+                     turnaround=DEFAULT_TURNAROUND, parity=MODBUS_PARITY, stopbits=MODBUS_STOPBITS):
+    """
+    1トランザクションがバスを占有する時間 [s]
+
+    要求フレーム + 無通信区間 + ターンアラウンド + 応答フレーム + 無通信区間。
+    応答のないブロードキャストは要求フレームと無通信区間のみ。
+    """
+    request, response = frame_sizes(kind, count, read_count)
+    t_char = char_time(baudrate, parity, stopbits)
+    t_silent = silent_interval(baudrate, parity, stopbits)
+    total = request * t_char + t_silent
+    if response:
+        total += turnaround + response * t_char + t_silent
+    return total
+
+
+def measure_turnaround(client, device_id, samples=20, baudrate=MODBUS_BAUDRATE):
+    """
+    状態読み出しの往復時間からドライバのターンアラウンドを実測する
+
+    往復時間から通信時間を差し引いた値の95パーセンタイルを返す（OSのスケジューリングによる
+    外れ値を除きつつ、計画には最悪に近い値を使う）。
+
+    Returns:
+        float: ターンアラウンド [s]
+    """
+    wire = transaction_time('read', 2, baudrate=baudrate, turnaround=0.0)
+    results = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        res = client.read_holding_registers(address=STATUS_1_ADDR, count=2, device_id=device_id)
+        elapsed = time.perf_counter() - started
+        if res.isError():
+            raise Exception(f"ID {device_id}: status read failed: {res}")
+        results.append(max(0.0, elapsed - wire))
+    results.sort()
+    return results[int(0.95 * (len(results) - 1))]
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Bus utilization accounting and capacity planning
+
+Accounting: every client made by create_client() counts the bytes it sends
+and receives on its serial port, plus the 3.5-character silent interval in
+front of each frame, and converts them to wire time with the character
+time of the port (start + 8 data + parity + stop bits). utilization() is the
+share of the last second the line spent on frames, out of the theoretical
+capacity at the port's baud rate. Driver turnaround is idle line time and is
+not counted.
+
+    usage = client.usage               # BusUsage of the client's port
+    print(usage)                       # "/dev/ttyUSB1 at 115200 bps: 37% busy ..."
+
+Planning: for a workload of N axes with command and status rates, the
+planner states whether it fits at each supported baud rate (bus_timing.py
+frame model, including turnaround) and recommends how many ports to split
+the axes over.
+
+Usage:
+    python3 src/bus_usage.py plan --axes 28 --command-rate 10 --status-rate 20
+    python3 src/bus_usage.py plan --axes 28 --status-rate 50 --status-registers 2 --baudrates 115200,230400
+"""
+
+import argparse
+import math
+import threading
+import time
+
+from bus_capture import tap
+from bus_timing import char_time, silent_interval, transaction_time, DEFAULT_TURNAROUND
+from setting import *
+
+SUPPORTED_BAUDRATES = (9600, 19200, 38400, 57600, 115200, 230400)
+DEFAULT_HEADROOM = 0.7      # 計画で使ってよいバス時間の割合（再送・割り込みの STOP の余裕を残す）
+WINDOW = 1.0                # 利用率を求める期間 [s]
+RESOLUTION = 0.1            # 利用率の集計の刻み [s]
+
+
+class BusUsage:
+    """
+    1ポート分の送受信バイト数と通信時間の集計
+
+    Args:
+        port (str): シリアルポート
+        baudrate, parity, stopbits: ポートの通信設定（キャラクタ時間の計算に使う）
+    """
+
+    def __init__(self, port=MODBUS_PORT, baudrate=MODBUS_BAUDRATE, parity=MODBUS_PARITY,
+                 stopbits=MODBUS_STOPBITS, window=WINDOW, resolution=RESOLUTION):
+        self.port = port
+        self.baudrate = baudrate
+        self.char = char_time(baudrate, parity, stopbits)
+        self.silent = silent_interval(baudrate, parity, stopbits)
+        self.resolution = resolution
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.frames = 0
+        self.busy = 0.0                           # 開始からの通信時間の合計 [s]
+        self.started = time.monotonic()
+        slots = max(1, int(round(window / resolution)))
+        self._buckets = [0.0] * slots             # 刻みごとの通信時間（リングバッファ）
+        self._bucket_ids = [-1] * slots
+        self._awaiting = False                    # 要求の送信後、応答の最初のバイトを待っている
+        self._lock = threading.Lock()
+
+    def _add(self, seconds):
+        bucket = int(time.monotonic() / self.resolution)
+        slot = bucket % len(self._buckets)
+        if self._bucket_ids[slot] != bucket:
+            self._bucket_ids[slot] = bucket
+            self._buckets[slot] = 0.0
+        self._buckets[slot] += seconds
+        self.busy += seconds
+
+    def sent(self, nbytes):
+        """要求フレームの送信（フレームの前の無通信区間を含める）"""
+        with self._lock:
+            self.bytes_sent += nbytes
+            self.frames += 1
+            self._awaiting = True
+            self._add(nbytes * self.char + self.silent)
+
+    def received(self, nbytes):
+        """応答の受信（数回に分けて読まれても無通信区間は応答1つに1回）"""
+        with self._lock:
+            self.bytes_received += nbytes
+            seconds = nbytes * self.char
+            if self._awaiting:
+                self._awaiting = False
+                self.frames += 1
+                seconds += self.silent
+            self._add(seconds)
+
+    def utilization(self):
+        """直近の期間のうちフレームの送受信に使った時間の割合"""
+        bucket = int(time.monotonic() / self.resolution)
+        slots = len(self._buckets)
+        with self._lock:
+            busy = sum(t for t, b in zip(self._buckets, self._bucket_ids) if bucket - slots < b <= bucket)
+        return busy / (slots * self.resolution)
+
+    def average(self):
+        """開始からの平均の利用率"""
+        elapsed = time.monotonic() - self.started
+        return self.busy / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.port} at {self.baudrate} bps: {self.utilization():.0%} busy "
+                f"(average {self.average():.0%}), {self.frames} frames, "
+                f"{self.bytes_sent} bytes sent, {self.bytes_received} bytes received")
+
+
+_ports = {}
+_ports_lock = threading.Lock()
+
+
+def usage_for(port=MODBUS_PORT, baudrate=MODBUS_BAUDRATE, parity=MODBUS_PARITY, stopbits=MODBUS_STOPBITS):
+    """ポートの集計を返す（同じポートのクライアントは1つの集計を共有する）"""
+    with _ports_lock:
+        usage = _ports.get(port)
+        if usage is None:
+            usage = _ports[port] = BusUsage(port, baudrate, parity, stopbits)
+        return usage
+
+
+def all_usage():
+    with _ports_lock:
+        return list(_ports.values())
+
+
+def attach_usage(client, usage):
+    """クライアントの送受信を usage に集計する（client.usage からも参照できる）"""
+    tap(client, lambda data: usage.sent(len(data)), lambda data: usage.received(len(data)))
+    client.usage = usage
+    return client
+
+
+# ---- 容量の計画 ----
+
+class PortLoad:
+    """1ボーレートでの負荷の見積もり"""
+
+    def __init__(self, baudrate, axis_load, axes, headroom):
+        self.baudrate = baudrate
+        self.axis_load = axis_load            # 1軸あたりのバス占有率（1秒あたりの占有時間）
+        self.axes = axes
+        self.headroom = headroom
+
+    @property
+    def load(self):
+        return self.axis_load * self.axes
+
+    @property
+    def axes_per_port(self):
+        """1ポートに収まる軸数"""
+        return int(self.headroom // self.axis_load) if self.axis_load else self.axes
+
+    @property
+    def ports(self):
+        """必要なポート数"""
+        if not self.axes_per_port:
+            return None         # 1軸でも収まらない
+        return math.ceil(self.axes / self.axes_per_port)
+
+    @property
+    def fits(self):
+        return self.load <= self.headroom
+
+    def split(self):
+        """軸をポートに均等に分けた場合の各ポートの軸数"""
+        ports = self.ports
+        if not ports:
+            return []
+        base, extra = divmod(self.axes, ports)
+        return [base + (1 if i < extra else 0) for i in range(ports)]
+
+
+def plan_capacity(axes, command_rate, status_rate, command_registers=2, status_registers=2,
+                  baudrates=SUPPORTED_BAUDRATES, turnaround=DEFAULT_TURNAROUND, headroom=DEFAULT_HEADROOM):
+    """
+    ボーレートごとに負荷を見積もる
+
+    Args:
+        axes (int): 軸数
+        command_rate (float): 1軸あたりの指令の書き込み回数 [1/s]（FC10）
+        status_rate (float): 1軸あたりの状態の読み出し回数 [1/s]（FC03）
+        command_registers, status_registers (int): 1回のレジスタ数
+        headroom (float): 1ポートで使ってよい占有率
+
+    Returns:
+        list: PortLoad（baudrates の順）
+    """
+    result = []
+    for baudrate in baudrates:
+        axis_load = (command_rate * transaction_time('write', command_registers, baudrate=baudrate,
+                                                     turnaround=turnaround)
+                     + status_rate * transaction_time('read', status_registers, baudrate=baudrate,
+                                                      turnaround=turnaround))
+        result.append(PortLoad(baudrate, axis_load, axes, headroom))
+    return result
+
+
+def split_text(split):
+    """[4, 4, 3] -> "2 x 4 + 1 x 3 axes"（ポート数 x 軸数）"""
+    groups = []
+    for count in split:
+        if groups and groups[-1][1] == count:
+            groups[-1][0] += 1
+        else:
+            groups.append([1, count])
+    return " + ".join(f"{ports} x {count}" for ports, count in groups) + " axes"
+
+
+def print_plan(loads):
+    first = loads[0]
+    print(f"{first.axes} axes, up to {first.headroom:.0%} of each port's capacity")
+    print(f"  {'baud':>7}{'per axis':>10}{'total':>9}{'axes/port':>11}  verdict")
+    for p in loads:
+        if p.fits:
+            verdict = "fits on one port"
+        elif p.ports:
+            verdict = f"split over {p.ports} ports: {split_text(p.split())}"
+        else:
+            verdict = "does not fit (one axis exceeds a port)"
+        print(f"  {p.baudrate:>7}{p.axis_load:>10.1%}{p.load:>9.0%}{p.axes_per_port:>11}  {verdict}")
+    fitting = [p for p in loads if p.ports]
+    if fitting:
+        best = min(fitting, key=lambda p: (p.ports, p.baudrate))
+        print(f"Recommendation: {best.ports} port(s) at {best.baudrate} bps "
+              f"({split_text(best.split())}, {best.load / best.ports:.0%} per port)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan bus capacity for a workload")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("plan", help="check a workload against the supported baud rates")
+    p.add_argument("--axes", type=int, default=AXIS_COUNT)
+    p.add_argument("--command-rate", type=float, default=10.0, help="command writes per axis per second")
+    p.add_argument("--status-rate", type=float, default=20.0, help="status reads per axis per second")
+    p.add_argument("--command-registers", type=int, default=2, help="registers per command write")
+    p.add_argument("--status-registers", type=int, default=2, help="registers per status read")
+    p.add_argument("--baudrates", default=",".join(map(str, SUPPORTED_BAUDRATES)))
+    p.add_argument("--turnaround-ms", type=float, default=DEFAULT_TURNAROUND * 1000, help="driver turnaround [ms]")
+    p.add_argument("--headroom", type=float, default=DEFAULT_HEADROOM, help="usable share of each port")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        print_plan(plan_capacity(args.axes, args.command_rate, args.status_rate, args.command_registers,
+                                 args.status_registers, [int(b) for b in args.baudrates.split(",")],
+                                 args.turnaround_ms / 1000, args.headroom))
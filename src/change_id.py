@@ -3,6 +3,7 @@ import serial
 import time
 import sys
 from pymodbus.client import ModbusSerialClient as ModbusClient
+from register_map import AZ
 
 # 通信設定（環境に合わせて固定）
 MODBUS_PORT = '/dev/ttyUSB0'
@@ -10,8 +11,8 @@ MODBUS_BAUDRATE = 115200
 MODBUS_PARITY = serial.PARITY_EVEN
 
 # オリエンタルモーター パラメータアドレス (AZシリーズ等)
-ADDR_SLAVE_ID = 0x1380        # スレーブID設定レジスタ
-ADDR_CONFIG_COMMAND = 0x0192   # 構成設定コマンド
+ADDR_SLAVE_ID = AZ.slave_id.address         # スレーブID設定レジスタ
+ADDR_CONFIG_COMMAND = AZ.nv_write.address     # 構成設定コマンド
 
 def set_new_slave_id(current_id, new_id):
     client = ModbusClient(
@@ -32,7 +33,7 @@ def set_new_slave_id(current_id, new_id):
 
         # 1. 新しいSlave IDを書き込む (32bitレジスタ [上位16bit, 下位16bit])
         # 以前成功したコードに合わせ、引数名は slave (または device_id) を使用
-        write_res = client.write_registers(address=ADDR_SLAVE_ID, values=[0, new_id], device_id=current_id)
+        write_res = client.write_registers(address=ADDR_SLAVE_ID, values=AZ.slave_id.encode(new_id), device_id=current_id)
         
         if write_res.isError():
             print(f"ID書き込みエラー: {write_res}")
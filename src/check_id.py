@@ -4,10 +4,13 @@ RS485 Modbus RTU Device ID Scanner
 Detects device IDs of chain-connected drivers
 """
 
+import argparse
 import serial
 from pymodbus.client import ModbusSerialClient as ModbusClient
 from pymodbus.exceptions import ModbusException
 import time
+from profiler import Profiler, add_profile_arguments
+from register_map import AZ
 
 # Modbus settings
 MODBUS_METHOD = 'rtu'
@@ -18,13 +21,13 @@ MODBUS_PARITY = serial.PARITY_EVEN
 MODBUS_STOPBITS = serial.STOPBITS_ONE
 
 # Device ID address
-MODBUS_ID_ADDRESS = 0x1380
+MODBUS_ID_ADDRESS = AZ.slave_id.address
 
 # Scan range (Modbus device addresses are typically 1-247)
 SCAN_START = 1
 SCAN_END = 32
 
-def scan_modbus_devices():
+def scan_modbus_devices(profiler=None):
     """
     Scan all devices on RS485 chain and detect device IDs
     """
@@ -50,6 +53,9 @@ def scan_modbus_devices():
         stopbits=MODBUS_STOPBITS
     )
     
+    if profiler:
+        profiler.instrument_client(client)
+
     # Connect
     if not client.connect():
         print("ERROR: Cannot connect to Modbus port")
@@ -65,7 +71,7 @@ def scan_modbus_devices():
     for target_id in range(1, 33):
         try:        
             print(f"Scanning ID: {target_id}...", end="\r")
-            res = client.read_holding_registers(address=0x1380, count=2, device_id=target_id)
+            res = client.read_holding_registers(address=MODBUS_ID_ADDRESS, count=AZ.slave_id.count, device_id=target_id)
             time.sleep(1)
             if not res.isError():
                 print(f"\nSUCCESS! Found device at ID: {target_id}")
@@ -76,8 +82,13 @@ def scan_modbus_devices():
             continue
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan the RS485 chain for device IDs")
+    add_profile_arguments(parser)
+    profiler = Profiler.from_args(parser.parse_args())
+    if profiler:
+        profiler.start()
     try:
-        scan_modbus_devices()
+        scan_modbus_devices(profiler)
     except KeyboardInterrupt:
         print("\n\nInterrupted")
     except Exception as e:
@@ -0,0 +1,205 @@
+"""
+運転完了の待ち合わせ
+
+待ち合わせ中の全軸の状態（MOVE/READY/ALM）を1周期に1回ずつまとめて読み取り、
+運転が終わった軸から順に Future を完了させてポーリング対象から外す。
+予測運転時間（motion_time.py）を渡した軸は、予測完了時刻の少し前までポーリングしない。
+固定の待ち時間ではなく、実際の運転完了で多段の動作を進めるために使う。
+
+使用例:
+    watcher = CompletionWatcher(client)
+    futures = watcher.wait_idle([2, 3, 4], timeout=30, callback=lambda id, f: print(id, f.result()))
+    for future in futures.values():
+        future.result()
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+from bus import read_status, READY_BIT, MOVE_BIT, ALM_BIT
+
+# 予測完了時刻のどれだけ前からポーリングを再開するか（予測時間に対する割合）
+POLL_LEAD = 0.1
+
+
+class AxisAlarm(Exception):
+    """待ち合わせ中の軸でアラームが発生した"""
+
+    def __init__(self, device_id, status1):
+        super().__init__(f"ID {device_id}: alarm (status 0x{status1:04X})")
+        self.device_id = device_id
+        self.status1 = status1
+
+
+class _Pending:
+    __slots__ = ("device_id", "future", "started", "deadline", "grace_end", "seen_move",
+                 "predicted", "not_before")
+
+    def __init__(self, device_id, future, started, deadline, grace_end, predicted, not_before):
+        self.device_id = device_id
+        self.future = future
+        self.started = started
+        self.deadline = deadline
+        self.grace_end = grace_end
+        self.seen_move = False
+        self.predicted = predicted
+        self.not_before = not_before
+
+
+class CompletionWatcher:
+    """
+    複数軸の運転完了をバックグラウンドで監視する
+
+    Args:
+        client: Modbus クライアント
+        lock (threading.Lock): 他スレッドとクライアントを共有する場合のロック
+        interval (float): ポーリング周期 [s]
+        grace (float): 起動直後に MOVE が立つまでの猶予 [s]（この間は停止中でも完了としない）
+        estimator (MotionEstimator): 予測時間を渡した軸の実測完了時間で補正する予測器
+        alarms (AlarmMonitor): 読んだ状態1を渡すアラーム監視（alarm_sweep.py）
+    """
+
+    def __init__(self, client, lock=None, interval=0.02, grace=0.05, estimator=None, alarms=None):
+        self.client = client
+        self.lock = lock or threading.Lock()
+        self.interval = interval
+        self.grace = grace
+        self.estimator = estimator
+        self.alarms = alarms
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def watch(self, device_id, timeout, callback=None, predicted=None):
+        """
+        1軸の運転完了を待つ Future を返す
+
+        Future の結果は完了時の状態1。アラーム時は AxisAlarm、
+        タイムアウト時は TimeoutError が設定される。
+
+        Args:
+            device_id (int): デバイスID
+            timeout (float): タイムアウト [s]
+            callback (callable): 完了時に callback(device_id, future) を監視スレッドから呼ぶ
+            predicted (float): 予測運転時間 [s]。指定すると予測完了時刻の少し前まで
+                この軸のポーリングを止める
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(device_id, f))
+        now = time.monotonic()
+        not_before = now
+        if predicted:
+            not_before = now + predicted - max(self.interval, predicted * POLL_LEAD)
+        with self._cond:
+            previous = self._pending.get(device_id)
+            if previous is not None:
+                previous.future.cancel()
+            self._pending[device_id] = _Pending(device_id, future, now, now + timeout, now + self.grace,
+                                                predicted, not_before)
+            self._cond.notify()
+        return future
+
+    def wait_idle(self, axes, timeout, callback=None, predicted=None):
+        """
+        複数軸の運転完了を待つ
+
+        Args:
+            predicted (dict): デバイスID -> 予測運転時間 [s]
+
+        Returns:
+            dict: デバイスID -> Future
+        """
+        predicted = predicted or {}
+        return {device_id: self.watch(device_id, timeout, callback, predicted.get(device_id))
+                for device_id in axes}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for pending in self._pending.values():
+                pending.future.cancel()
+            self._pending.clear()
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    sweep = [p for p in self._pending.values() if p.not_before <= now]
+                    if sweep:
+                        break
+                    # 予測完了時刻が最も早い軸まで待つ（新しい軸が登録されれば起きる）
+                    wake = min((p.not_before for p in self._pending.values()), default=None)
+                    self._cond.wait(None if wake is None else wake - now)
+                if self._closed:
+                    return
+
+            # 1周期で、予測完了時刻を過ぎた待ち合わせ中の軸を1回ずつ読む
+            for pending in sweep:
+                self._check(pending)
+            time.sleep(self.interval)
+
+    def _check(self, pending):
+        try:
+            with self.lock:
+                status1, _ = read_status(self.client, pending.device_id)
+        except Exception as e:
+            if time.monotonic() >= pending.deadline:
+                self._finish(pending, exception=TimeoutError(f"ID {pending.device_id}: {e}"))
+            return
+
+        if self.alarms is not None:
+            self.alarms.observe(pending.device_id, status1)
+        now = time.monotonic()
+        if status1 & ALM_BIT:
+            self._finish(pending, exception=AxisAlarm(pending.device_id, status1))
+        elif status1 & MOVE_BIT:
+            pending.seen_move = True
+            if now >= pending.deadline:
+                self._finish(pending, exception=TimeoutError(f"ID {pending.device_id}: still moving"))
+        elif status1 & READY_BIT and (pending.seen_move or now >= pending.grace_end):
+            if self.estimator is not None and pending.predicted:
+                self.estimator.observe(pending.device_id, pending.predicted, now - pending.started)
+            self._finish(pending, result=status1)
+        elif now >= pending.deadline:
+            self._finish(pending, exception=TimeoutError(f"ID {pending.device_id}: not ready (status 0x{status1:04X})"))
+
+    def _finish(self, pending, result=None, exception=None):
+        with self._cond:
+            # 同じ軸が再登録されていれば古い待ち合わせは無視する
+            if self._pending.get(pending.device_id) is not pending:
+                return
+            del self._pending[pending.device_id]
+        if not pending.future.set_running_or_notify_cancel():
+            return
+        if exception is not None:
+            pending.future.set_exception(exception)
+        else:
+            pending.future.set_result(result)
+
+
+def wait_idle(client, axes, timeout, callback=None, lock=None, interval=0.02):
+    """
+    複数軸の運転完了をブロックして待つ
+
+    Returns:
+        dict: デバイスID -> 完了時の状態1、またはアラーム/タイムアウトの例外
+    """
+    watcher = CompletionWatcher(client, lock=lock, interval=interval)
+    try:
+        futures = watcher.wait_idle(axes, timeout, callback)
+        results = {}
+        for device_id, future in futures.items():
+            try:
+                results[device_id] = future.result()
+            except Exception as e:
+                results[device_id] = e
+        return results
+    finally:
+        watcher.close()
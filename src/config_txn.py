@@ -0,0 +1,137 @@
+"""
+パラメータ設定のトランザクション
+
+任意個のパラメータ書き込みをドライバごとにステージし、検証したうえで
+ドライバ1台につき不揮発メモリ書き込み（0192h）と構成設定（018Ch）を
+1回ずつだけ発行してコミットする。ポートが異なるドライバは並列にコミットする。
+
+使用例:
+    txn = ConfigTransaction()
+    txn.stage(11, AZ.rotation_direction.address, 1)   # 回転方向 CW
+    txn.stage(11, AZ.slave_id.address, 18)            # ID
+    txn.stage(12, AZ.rotation_direction.address, 0, port='/dev/ttyUSB1')
+    results = txn.commit()
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bus import *
+from register_map import AZ
+from util import *
+
+# パラメータごとの許容範囲（未登録のアドレスは符号付き32ビットの範囲で検証する）
+PARAMETER_RANGES = {
+    AZ.rotation_direction.address: (0, 1),     # 回転方向
+    AZ.slave_id.address: (1, 247),             # スレーブID
+}
+INT32_RANGE = (-0x80000000, 0x7FFFFFFF)
+
+
+class ConfigTransaction:
+    """ドライバごとのパラメータ書き込みをまとめてコミットするトランザクション"""
+
+    def __init__(self, port=MODBUS_PORT, nv_write=True, configure=True):
+        self.port = port
+        self.nv_write = nv_write
+        self.configure = configure
+        # (ポート, ID) -> {アドレス: (値, レジスタ数)}
+        self.staged = {}
+        self._lock = threading.Lock()
+
+    def stage(self, device_id, address, value, count=2, port=None):
+        """
+        パラメータ書き込みをステージする（同じアドレスは後の値で上書き）
+
+        Args:
+            device_id (int): デバイスID
+            address (int): パラメータの先頭アドレス
+            value (int): 書き込む値
+            count (int): レジスタ数（1または2）
+            port (str): シリアルポート（省略時はトランザクションの既定ポート）
+        """
+        low, high = PARAMETER_RANGES.get(address, INT32_RANGE if count == 2 else (0, 0xFFFF))
+        if count not in (1, 2):
+            raise ValueError(f"register count must be 1 or 2: {count}")
+        if not low <= value <= high:
+            raise ValueError(f"ID {device_id}: 0x{address:04X} value {value} is outside {low}..{high}")
+        with self._lock:
+            self.staged.setdefault((port or self.port, device_id), {})[address] = (value, count)
+
+    def validate(self):
+        """
+        コミット前にステージした内容を検証する
+
+        Raises:
+            ValueError: 同じドライバ内でパラメータの範囲が重なっている場合
+        """
+        for (port, device_id), writes in self.staged.items():
+            end = -1
+            for address in sorted(writes):
+                if address < end:
+                    raise ValueError(f"{port} ID {device_id}: parameters overlap at 0x{address:04X}")
+                end = address + writes[address][1]
+
+    def commit(self, clients=None):
+        """
+        ステージした書き込みをコミットする
+
+        ポートごとに1スレッドでコミットし、同じポート上のドライバは順番に処理する。
+
+        Args:
+            clients (dict): ポート -> 接続済みクライアント（省略時はポートごとに生成する）
+
+        Returns:
+            dict: (ポート, ID) -> None（成功）または例外
+        """
+        self.validate()
+        by_port = {}
+        for port, device_id in self.staged:
+            by_port.setdefault(port, []).append(device_id)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(by_port))) as pool:
+            futures = [pool.submit(self._commit_port, port, ids, (clients or {}).get(port))
+                       for port, ids in by_port.items()]
+            for future in futures:
+                results.update(future.result())
+        with self._lock:
+            for key, error in results.items():
+                if error is None:
+                    del self.staged[key]
+        return results
+
+    def _commit_port(self, port, ids, client):
+        own_client = client is None
+        if own_client:
+            client = create_client(port=port)
+            if not client.connect():
+                error = Exception(f"Cannot open port {port}")
+                return {(port, device_id): error for device_id in ids}
+        results = {}
+        try:
+            for device_id in sorted(ids):
+                try:
+                    self._commit_driver(client, device_id, self.staged[(port, device_id)])
+                    results[(port, device_id)] = None
+                except Exception as e:
+                    results[(port, device_id)] = e
+        finally:
+            if own_client:
+                client.close()
+        return results
+
+    def _commit_driver(self, client, device_id, writes):
+        words = {(address, count): list(decimal_to_hex(value)) if count == 2 else [value & 0xFFFF]
+                 for address, (value, count) in writes.items()}
+        # RAM上のパラメータへ書き込む（隣接するものは1回の書き込みにまとめる）
+        for start, _, members in plan_blocks(words, MAX_WRITE_COUNT):
+            values = [w for member in members for w in words[member]]
+            check(client.write_registers(address=start, values=values, device_id=device_id),
+                  f"ID {device_id}: write of 0x{start:04X}+{len(values)}")
+        if self.nv_write:
+            check(client.write_registers(address=NV_MEMORY_WRITE_ADDRESS, values=[0, 1], device_id=device_id),
+                  f"ID {device_id}: NV write")
+        if self.configure:
+            check(client.write_registers(address=CONFIGURATION_EXECUTE_ADDRESS, values=[0, 1], device_id=device_id),
+                  f"ID {device_id}: configuration")
@@ -0,0 +1,247 @@
+"""
+同時到着の協調運転
+
+複数軸をまとめて動かすとき、各軸に入力された速度をそのまま送ると移動量の小さい軸が
+先に止まり、次の工程は最も遅い軸を待つことになる。ここでは入力された速度を上限として
+扱い、全軸が同じ時刻に止まるよう軸ごとの速度を NumPy でまとめて計算する。
+
+1. 上限速度・加減速レートでの最短運転時間（台形 / 三角形）を全軸について求める
+2. 送信の順番による起動のずれを加えた到着時刻の最大値を、全軸の到着時刻とする
+3. 各軸の運転時間がそれに一致する速度を、台形の運転時間の式 d/v + k·v = T
+   （k = 1/(2·accel) + 1/(2·decel)）の小さい方の解として求める
+
+送信は2通り。
+
+- staggered（既定）: 速度を全軸に書き込んでから、位置の書き込み（初期化で位置トリガを
+  設定済みなら、これで起動する）を移動時間の長い軸から続けて送る。起動のずれは
+  bus_timing.py のフレーム時間で見積もり、計画に織り込む。
+- broadcast: 軸ごとにダイレクトデータ一式をトリガ 0（起動しない）で書き込み、
+  ブロードキャストでトリガを書き込んで全軸を同時に起動する。バス上の全ドライバが
+  起動するため、チェーンの全軸が計画に含まれる場合にだけ使う。起動後のトリガは 1 に
+  なるので、通常の Send Step を使う前に初期化し直す。
+
+使用例:
+    plan = plan_arrival([1000, 4000], [2000, 2000], accels, decels)
+    plan.speeds        # array([ 501, 2000]) など
+    execute(client, [2, 3], plan)
+
+    python3 src/coordinated_move.py --steps 1000,4000 --speeds 2000             # 計画の表示のみ
+    python3 src/coordinated_move.py --steps 1000,4000 --speeds 2000 --ids 2,3 --mode broadcast
+"""
+
+import argparse
+
+import numpy as np
+
+from bus import check, create_client
+from bus_timing import transaction_time, DEFAULT_TURNAROUND
+from direct_data import DirectRecord, DIRECT_DATA_ADDRESS, METHOD_INCREMENTAL, TRIGGER_ALL
+from motion_time import DEFAULT_ACCEL, DEFAULT_DECEL
+from register_map import CVD
+from setting import *
+from util import parse_ids
+
+STAGGERED = 'staggered'
+BROADCAST = 'broadcast'
+
+POSITION = CVD.direct_position
+SPEED = CVD.direct_speed
+TRIGGER = CVD.direct_trigger
+MIN_SPEED = 1              # 速度レジスタの下限 [Hz]
+
+
+def move_times(distances, speeds, accels, decels):
+    """
+    台形速度プロファイルでの運転時間（motion_time.trapezoid_time のベクトル版）
+
+    Args:
+        distances, speeds, accels, decels: 軸ごとの値（配列またはスカラー）
+
+    Returns:
+        numpy.ndarray: 運転時間 [s]（移動量か速度が 0 の軸は 0）
+    """
+    d = np.abs(np.asarray(distances, dtype=float))
+    v = np.asarray(speeds, dtype=float)
+    a = np.asarray(accels, dtype=float)
+    b = np.asarray(decels, dtype=float)
+    k = 0.5 / a + 0.5 / b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 運転速度に届かない場合は三角形プロファイル（頂点速度 peak、運転時間 2·k·peak）
+        peak = np.sqrt(2 * d * a * b / (a + b))
+        t = np.where(k * v * v >= d, 2 * k * peak, d / v + k * v)
+    return np.where((d == 0) | (v <= 0), 0.0, t)
+
+
+def speeds_for_time(distances, times, accels, decels):
+    """
+    運転時間がちょうど times になる速度
+
+    d/v + k·v = T の小さい方の解 v = 2d / (T + √(T² − 4kd))。T が三角形プロファイルの
+    最短時間以上なら実数解があり、このときの加減速区間は移動量に収まる。
+    """
+    d = np.abs(np.asarray(distances, dtype=float))
+    t = np.asarray(times, dtype=float)
+    k = 0.5 / np.asarray(accels, dtype=float) + 0.5 / np.asarray(decels, dtype=float)
+    root = np.sqrt(np.maximum(t * t - 4 * k * d, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v = 2 * d / (t + root)
+    return np.where(d == 0, 0.0, v)
+
+
+class CoordinatedPlan:
+    """協調運転の計画（配列はすべて入力の軸の順）"""
+
+    def __init__(self, distances, speeds, order, offsets, arrivals, unsynchronized, early):
+        self.distances = distances            # 移動量 [step]
+        self.speeds = speeds                  # 送信する速度 [Hz]（整数）
+        self.order = order                    # 起動する軸の順番（インデックス）
+        self.offsets = offsets                # 起動の遅れ [s]
+        self.arrivals = arrivals              # 最初の起動からの到着時刻 [s]
+        self.unsynchronized = unsynchronized  # 上限速度のまま送った場合に最後の軸が止まる時刻 [s]
+        self.early = early                    # MIN_SPEED まで下げても先に止まる軸（bool の配列）
+
+    @property
+    def duration(self):
+        """最後の軸が止まるまでの時間 [s]"""
+        return float(self.arrivals.max()) if len(self.arrivals) else 0.0
+
+    @property
+    def spread(self):
+        """同時に止まる軸の到着時刻のばらつき [s]（速度の丸めによる。early の軸は含めない）"""
+        moving = self.arrivals[(self.distances != 0) & ~self.early]
+        return float(moving.max() - moving.min()) if len(moving) else 0.0
+
+    @property
+    def early_axes(self):
+        """同時に止められない軸のインデックス"""
+        return [int(i) for i in np.flatnonzero(self.early)]
+
+    def __str__(self):
+        together = int(np.count_nonzero((self.distances != 0) & ~self.early))
+        if self.early.any():
+            moving = int(np.count_nonzero(self.distances != 0))
+            head = f"only {together} of {moving} moving axes arrive together"
+        else:
+            head = f"{together} axes arrive together"
+        text = (f"{head} after {self.duration * 1000:.1f} ms "
+                f"(spread {self.spread * 1000:.2f} ms; {self.unsynchronized * 1000:.1f} ms at the typed speeds)")
+        for i in self.early_axes:
+            text += (f"\n  axis {i + 1} ({int(self.distances[i])} steps) cannot go below {MIN_SPEED} Hz "
+                     f"and stops {(self.duration - self.arrivals[i]) * 1000:.1f} ms early")
+        return text
+
+
+def start_step(mode=STAGGERED, baudrate=MODBUS_BAUDRATE, turnaround=DEFAULT_TURNAROUND):
+    """1軸ごとの起動のずれ [s]（staggered は位置の書き込み1回分、broadcast は 0）"""
+    if mode == BROADCAST:
+        return 0.0
+    return transaction_time('write', 2, baudrate=baudrate, turnaround=turnaround)
+
+
+def plan_arrival(distances, max_speeds, accels=DEFAULT_ACCEL, decels=DEFAULT_DECEL, step=0.0):
+    """
+    全軸が同時に止まる速度を求める
+
+    Args:
+        distances: 軸ごとの移動量 [step]
+        max_speeds: 軸ごとの上限速度 [Hz]（操作者が入力した速度）
+        accels, decels: 軸ごとの加速・減速レート [step/s^2]（配列またはスカラー）
+        step (float): 1軸ごとの起動のずれ [s]（start_step()）
+
+    Returns:
+        CoordinatedPlan
+    """
+    d = np.asarray(distances, dtype=np.int64)
+    vmax = np.asarray(max_speeds, dtype=float)
+    n = len(d)
+    a = np.broadcast_to(np.asarray(accels, dtype=float), n)
+    b = np.broadcast_to(np.asarray(decels, dtype=float), n)
+    if np.any((d != 0) & (vmax < MIN_SPEED)):
+        raise ValueError("every moving axis needs a speed of at least 1 Hz")
+
+    fastest = move_times(d, vmax, a, b)
+    # 移動時間の長い軸から起動し、起動の遅れを到着時刻に含める
+    order = np.argsort(-fastest, kind='stable')
+    offsets = np.empty(n)
+    offsets[order] = np.arange(n) * step
+    arrival = float((fastest + offsets).max()) if n else 0.0
+
+    # 速度は切り上げる（到着が遅れる側には丸めない）
+    wanted = speeds_for_time(d, np.maximum(arrival - offsets, 0.0), a, b)
+    speeds = np.ceil(wanted - 1e-9)
+    # 下限速度でも先に着く軸（移動量が小さすぎる）は同時到着から外れる
+    early = (d != 0) & (wanted < MIN_SPEED - 1e-9)
+    speeds = np.where(d == 0, vmax, np.clip(speeds, MIN_SPEED, vmax)).astype(np.int64)
+    arrivals = np.where(d == 0, 0.0, offsets + move_times(d, speeds, a, b))
+    return CoordinatedPlan(d, speeds, order, offsets, arrivals, float(fastest.max()) if n else 0.0, early)
+
+
+def execute(client, device_ids, plan, mode=STAGGERED, accels=DEFAULT_ACCEL, decels=DEFAULT_DECEL):
+    """
+    計画を送信する（呼び出し側でバスのロックを持つ）
+
+    Args:
+        device_ids: plan と同じ順のデバイスID
+        mode (str): STAGGERED / BROADCAST
+    """
+    ids = [int(device_id) for device_id in device_ids]
+    order = [int(i) for i in plan.order]
+    if mode == BROADCAST:
+        a = np.broadcast_to(np.asarray(accels), len(ids))
+        b = np.broadcast_to(np.asarray(decels), len(ids))
+        for i in order:
+            record = DirectRecord(int(plan.distances[i]), int(plan.speeds[i]), METHOD_INCREMENTAL,
+                                  int(a[i]), int(b[i]))
+            res = client.write_registers(address=DIRECT_DATA_ADDRESS, values=record.encode(0), device_id=ids[i])
+            check(res, f"ID {ids[i]}: direct data write")
+        client.write_registers(address=TRIGGER.address, values=TRIGGER.encode(TRIGGER_ALL), device_id=0,
+                               no_response_expected=True)
+        return
+    for i in order:
+        res = client.write_registers(address=SPEED.address, values=SPEED.encode(plan.speeds[i]), device_id=ids[i])
+        check(res, f"ID {ids[i]}: speed write")
+    for i in order:
+        if plan.distances[i] == 0:
+            continue
+        res = client.write_registers(address=POSITION.address, values=POSITION.encode(plan.distances[i]),
+                                     device_id=ids[i])
+        check(res, f"ID {ids[i]}: step write")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan speeds so that several axes arrive together")
+    parser.add_argument("--steps", required=True, help="steps per axis, e.g. 1000,-4000,250")
+    parser.add_argument("--speeds", required=True, help="maximum speed per axis [Hz] (one value for all)")
+    parser.add_argument("--accel", type=float, default=DEFAULT_ACCEL, help="acceleration [step/s^2]")
+    parser.add_argument("--decel", type=float, default=DEFAULT_DECEL, help="deceleration [step/s^2]")
+    parser.add_argument("--mode", choices=(STAGGERED, BROADCAST), default=STAGGERED, help="how the axes are started")
+    parser.add_argument("--baudrate", type=int, default=MODBUS_BAUDRATE)
+    parser.add_argument("--ids", help="send the plan to these axes on MODBUS_PORT, one ID per step (e.g. 2-4)")
+    args = parser.parse_args()
+
+    steps = [int(s) for s in args.steps.split(",")]
+    speeds = [int(s) for s in args.speeds.split(",")]
+    if len(speeds) == 1:
+        speeds *= len(steps)
+    if len(speeds) != len(steps):
+        parser.error("--speeds needs one value or one per axis")
+    ids = parse_ids(args.ids) if args.ids else None
+    if ids is not None and len(ids) != len(steps):
+        parser.error("--ids needs one ID per axis in --steps")
+    plan = plan_arrival(steps, speeds, args.accel, args.decel, start_step(args.mode, args.baudrate))
+    print(plan)
+    print(f"  {'axis':>4}{'steps':>10}{'max Hz':>8}{'Hz':>8}{'start ms':>10}{'stop ms':>10}")
+    for i in range(len(steps)):
+        print(f"  {i + 1:>4}{steps[i]:>10}{speeds[i]:>8}{plan.speeds[i]:>8}"
+              f"{plan.offsets[i] * 1000:>10.2f}{plan.arrivals[i] * 1000:>10.2f}")
+
+    if ids is not None:
+        client = create_client(baudrate=args.baudrate)
+        if not client.connect():
+            print(f"ERROR: Cannot open port {MODBUS_PORT}")
+            raise SystemExit(1)
+        try:
+            execute(client, ids, plan, args.mode, args.accel, args.decel)
+        finally:
+            client.close()
+        print(f"Sent to IDs {', '.join(map(str, ids))} ({args.mode}); the planned speeds stay in the speed register")
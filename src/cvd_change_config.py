@@ -3,22 +3,22 @@ from pymodbus.client import ModbusSerialClient as ModbusClient
 import serial
 
 from setting import *
-import time
 from util import *
+from config_txn import ConfigTransaction
+from register_map import CVD
 
 def change_motor_id():
     try:
         current_id = int(entry_current_id.get())
         new_id = int(entry_new_id.get())
         
-        # Change ID (Write [0, new_id] to address 1380h)
-        client.write_registers(address=0x1380, values=[0, new_id], slave=current_id)
-        status_label.config(text="ID change completed. Preparing to restart.", fg="green")
-        time.sleep(1)
-        
-        # Restart command (Write [0, 1] to address 0190h)
-        client.write_registers(address=0x0192, values=[0, 1], slave=current_id)
-        status_label.config(text="Restart command sent. Please wait for device to restart.", fg="green")
+        # Stage the ID change (1380h) and commit it with one NV write and one configuration
+        txn = ConfigTransaction()
+        txn.stage(current_id, CVD.slave_id.address, new_id)
+        error = txn.commit({txn.port: client})[(txn.port, current_id)]
+        if error is not None:
+            raise error
+        status_label.config(text="ID change committed. Device is restarting.", fg="green")
     except Exception as e:
         status_label.config(text=f"Error: {e}", fg="red")
 
@@ -4,16 +4,17 @@ import serial
 
 from setting import *
 from util import *
+from register_map import CVD
+from direct_data import TRIGGER_POSITION
 
 
-def modbus_write(address, value, slave):
-    upper, lower = decimal_to_hex(value)
-    client.write_registers(address, [upper, lower], slave)
+def modbus_write(register, value, slave):
+    client.write_registers(register.address, register.encode(value), slave)
 
 def initialize_motor():
     try:
         slave_id = int(entry_id.get())
-        client.write_registers(address=0x0066, values=[0xffff, 0xfffb], slave=slave_id)
+        client.write_registers(address=CVD.direct_trigger.address, values=CVD.direct_trigger.encode(TRIGGER_POSITION), slave=slave_id)
         status_label.config(text="Initialization successful", fg="green")
     except Exception as e:
         status_label.config(text=f"Error: {e}", fg="red")
@@ -22,7 +23,7 @@ def send_speed():
     try:
         slave_id = int(entry_id.get())
         speed = int(entry_speed.get())
-        client.write_registers(address=0x005e, values=[0, speed], slave=slave_id)
+        client.write_registers(address=CVD.direct_speed.address, values=CVD.direct_speed.encode(speed), slave=slave_id)
         status_label.config(text="Speed sent successfully", fg="green")
     except Exception as e:
         status_label.config(text=f"Error: {e}", fg="red")
@@ -31,7 +32,7 @@ def send_step():
     try:
         slave_id = int(entry_id.get())
         step = int(entry_step.get())
-        modbus_write(0x005c, step, slave_id)
+        modbus_write(CVD.direct_position, step, slave_id)
         status_label.config(text="Step sent successfully", fg="green")
     except Exception as e:
         status_label.config(text=f"Error: {e}", fg="red")
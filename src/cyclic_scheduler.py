@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Fixed-cycle bus scheduler
+
+Every cycle (e.g. 20 ms) each axis gets the same time slots at the same offset:
+a command slot (FC10 write of COMMAND_1) and a status slot (FC03 read of
+STATUS_1/2), or a single FC17 slot with --combined. Slot lengths come from the
+on-wire time in bus_timing.py (frame length, baud rate, 3.5-character silent
+interval, driver turnaround) plus a guard margin. A plan that does not fit in
+the cycle is rejected before anything is sent.
+
+At runtime the scheduler starts each slot at its planned offset and measures
+how late every cycle starts (jitter) and how many cycles overran.
+
+Feasibility check (no bus access):
+    python3 src/cyclic_scheduler.py --ids 1-28 --cycle-ms 20
+Measure the turnaround first, then run 500 cycles:
+    python3 src/cyclic_scheduler.py --ids 1-28 --cycle-ms 200 --measure --run 500
+"""
+
+import argparse
+import math
+import threading
+import time
+
+from bus import *
+from bus_lock import BusAborted
+from bus_timing import transaction_time, measure_turnaround, DEFAULT_TURNAROUND
+from util import parse_ids
+
+DEFAULT_CYCLE = 0.020   # [s]
+DEFAULT_GUARD = 0.0005  # スロット間の余裕 [s]（スケジューリングの遅れを吸収する）
+SPIN_MARGIN = 0.001     # この時間より近いスロットは sleep せずに待つ [s]
+
+
+class Slot:
+    """周期内の1トランザクションの割り当て"""
+
+    __slots__ = ('kind', 'device_id', 'offset', 'duration')
+
+    def __init__(self, kind, device_id, offset, duration):
+        self.kind = kind              # 'command' / 'status' / 'combined'
+        self.device_id = device_id
+        self.offset = offset          # 周期の先頭からの開始時刻 [s]
+        self.duration = duration      # 通信時間 + 余裕 [s]
+
+
+class CyclePlan:
+    """固定周期のスロット割り当て"""
+
+    def __init__(self, cycle, slots):
+        self.cycle = cycle
+        self.slots = slots
+
+    @property
+    def busy(self):
+        """1周期のうちバスを使う時間 [s]"""
+        if not self.slots:
+            return 0.0
+        last = self.slots[-1]
+        return last.offset + last.duration
+
+    @property
+    def slack(self):
+        return self.cycle - self.busy
+
+    @property
+    def utilization(self):
+        return self.busy / self.cycle
+
+    def __str__(self):
+        axes = len({slot.device_id for slot in self.slots})
+        return (f"{axes} axes, {len(self.slots)} slots: {self.busy * 1000:.2f} ms of "
+                f"{self.cycle * 1000:.1f} ms cycle ({self.utilization:.0%}, slack {self.slack * 1000:.2f} ms)")
+
+
+def slot_durations(combined=False, command_count=1, status_count=2, baudrate=MODBUS_BAUDRATE,
+                   turnaround=DEFAULT_TURNAROUND, guard=DEFAULT_GUARD):
+    """
+    1軸分のスロットの (種類, 長さ) のリスト
+
+    Args:
+        combined (bool): 指令と状態読み出しを FC17 の1スロットにまとめる
+        command_count (int): 指令スロットで書き込むレジスタ数
+        status_count (int): 状態スロットで読み出すレジスタ数
+    """
+    if combined:
+        return [('combined', transaction_time('readwrite', command_count, status_count,
+                                              baudrate=baudrate, turnaround=turnaround) + guard)]
+    return [('command', transaction_time('write', command_count, baudrate=baudrate, turnaround=turnaround) + guard),
+            ('status', transaction_time('read', status_count, baudrate=baudrate, turnaround=turnaround) + guard)]
+
+
+def plan_cycle(axes, cycle=DEFAULT_CYCLE, **timing):
+    """
+    各軸に指令・状態のスロットを割り当てる
+
+    Args:
+        axes (list): デバイスID（この順にスロットを並べる）
+        cycle (float): 周期 [s]
+        **timing: slot_durations() の引数
+
+    Returns:
+        CyclePlan: スロット割り当て
+
+    Raises:
+        ValueError: 周期内に収まらない場合
+    """
+    per_axis = slot_durations(**timing)
+    slots = []
+    offset = 0.0
+    for device_id in axes:
+        for kind, duration in per_axis:
+            slots.append(Slot(kind, device_id, offset, duration))
+            offset += duration
+    if offset > cycle:
+        axis_time = sum(duration for _, duration in per_axis)
+        raise ValueError(f"{len(axes)} axes need {offset * 1000:.2f} ms per cycle but the cycle is "
+                         f"{cycle * 1000:.1f} ms: at most {int(cycle // axis_time)} axes fit, or use a cycle of "
+                         f"at least {offset * 1000:.1f} ms, or split the axes over "
+                         f"{math.ceil(offset / cycle)} ports")
+    return CyclePlan(cycle, slots)
+
+
+def minimum_cycle(axis_count, **timing):
+    """axis_count 軸を収めるのに必要な最短の周期 [s]"""
+    return axis_count * sum(duration for _, duration in slot_durations(**timing))
+
+
+class JitterStats:
+    """周期の開始遅れの統計（サンプルを溜めずに逐次計算する）"""
+
+    def __init__(self):
+        self.cycles = 0
+        self.overruns = 0      # 周期内に終わらなかった回数
+        self.skipped = 0       # 超過のために飛ばした周期の数
+        self.max = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, lateness):
+        self.cycles += 1
+        delta = lateness - self._mean
+        self._mean += delta / self.cycles
+        self._m2 += delta * (lateness - self._mean)
+        if lateness > self.max:
+            self.max = lateness
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / self.cycles) if self.cycles else 0.0
+
+    def __str__(self):
+        return (f"{self.cycles} cycles: start jitter mean {self.mean * 1000:.3f} ms, "
+                f"stdev {self.stdev * 1000:.3f} ms, max {self.max * 1000:.3f} ms; "
+                f"{self.overruns} overrun(s), {self.skipped} skipped cycle(s)")
+
+
+def _wait_until(deadline):
+    """deadline まで待つ（直前は sleep の粒度が粗いため空回りで待つ）"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > SPIN_MARGIN:
+            time.sleep(remaining - SPIN_MARGIN)
+
+
+class CyclicScheduler:
+    """
+    CyclePlan に従って固定周期でバスを動かす
+
+    指令は set_command() で軸ごとに最新の1つだけを保持し、その軸の指令スロットで送る。
+    指令のない軸の指令スロットは空けたままにして、他の軸のスロット時刻を変えない。
+
+    Args:
+        client: Modbus クライアント
+        plan (CyclePlan): スロット割り当て
+        lock (BusLock): クライアントを共有している場合のロック。停止要求で run() を打ち切る
+        on_status (callable): 状態を読むたびに (デバイスID, 状態1, 状態2) で呼ぶ（スケジューラのスレッド）
+    """
+
+    def __init__(self, client, plan, lock=None, on_status=None):
+        self.client = client
+        self.plan = plan
+        self.lock = lock
+        self.on_status = on_status
+        self.status = {}      # デバイスID -> (状態1, 状態2)
+        self.errors = {}      # デバイスID -> 最後の例外
+        self.stats = JitterStats()
+        self._commands = {}
+        self._commands_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def set_command(self, device_id, command):
+        """次の指令スロットで送る指令1の値を設定する（未送信の指令は上書き）"""
+        with self._commands_lock:
+            self._commands[device_id] = command
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, cycles=None):
+        """
+        周期運転する
+
+        Args:
+            cycles (int): 実行する周期数。None の場合は stop() まで
+
+        Returns:
+            JitterStats: 周期の開始遅れの統計
+        """
+        self._stop.clear()
+        token = self.lock.token() if self.lock else None
+        cycle = self.plan.cycle
+        start = time.perf_counter()
+        index = 0
+        try:
+            while not self._stop.is_set() and (cycles is None or self.stats.cycles < cycles):
+                planned = start + index * cycle
+                _wait_until(planned)
+                self.stats.add(time.perf_counter() - planned)
+                for slot in self.plan.slots:
+                    _wait_until(planned + slot.offset)
+                    self._run_slot(slot, token)
+                # 周期を超えた場合は次の境界まで飛ばし、遅れを持ち越さない
+                late = time.perf_counter() - (planned + cycle)
+                index += 1
+                if late > 0:
+                    self.stats.overruns += 1
+                    skip = int(late // cycle) + 1
+                    self.stats.skipped += skip
+                    index += skip
+        except BusAborted:
+            pass
+        return self.stats
+
+    def _run_slot(self, slot, token):
+        device_id = slot.device_id
+        if slot.kind == 'status':
+            self._transact(device_id, token, lambda: read_status(self.client, device_id))
+            return
+        with self._commands_lock:
+            command = self._commands.pop(device_id, None)
+        if slot.kind == 'combined':
+            if command is None:
+                self._transact(device_id, token, lambda: read_status(self.client, device_id))
+            else:
+                self._transact(device_id, token, lambda: command_status(self.client, device_id, command))
+        elif command is not None:
+            self._transact(device_id, token, lambda: check(
+                self.client.write_registers(address=COMMAND_1_ADDR, values=[command], device_id=device_id),
+                f"ID {device_id}: command 0x{command:04X}"), status=False)
+
+    def _transact(self, device_id, token, request, status=True):
+        try:
+            if self.lock is None:
+                result = request()
+            else:
+                with self.lock.hold(token):
+                    result = request()
+        except BusAborted:
+            raise
+        except Exception as e:
+            self.errors[device_id] = e
+            return
+        self.errors.pop(device_id, None)
+        if status:
+            self.status[device_id] = result
+            if self.on_status:
+                self.on_status(device_id, *result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and run a fixed-cycle bus schedule")
+    parser.add_argument("--ids", default=f"1-{AXIS_COUNT}", help="axes, e.g. 1-28")
+    parser.add_argument("--cycle-ms", type=float, default=DEFAULT_CYCLE * 1000, help="cycle length [ms]")
+    parser.add_argument("--baudrate", type=int, default=MODBUS_BAUDRATE)
+    parser.add_argument("--turnaround-ms", type=float, default=DEFAULT_TURNAROUND * 1000,
+                        help="driver turnaround [ms] (ignored with --measure)")
+    parser.add_argument("--guard-ms", type=float, default=DEFAULT_GUARD * 1000, help="margin per slot [ms]")
+    parser.add_argument("--combined", action="store_true", help="one FC17 slot per axis instead of write + read")
+    parser.add_argument("--measure", action="store_true", help="measure the turnaround on the first axis")
+    parser.add_argument("--run", type=int, default=0, metavar="CYCLES", help="run the plan and report jitter")
+    args = parser.parse_args()
+
+    axes = parse_ids(args.ids)
+    timing = dict(combined=args.combined, baudrate=args.baudrate,
+                  turnaround=args.turnaround_ms / 1000, guard=args.guard_ms / 1000)
+
+    client = None
+    if args.measure or args.run:
+        client = create_client(baudrate=args.baudrate)
+        if not client.connect():
+            print(f"ERROR: Cannot open port {MODBUS_PORT}")
+            raise SystemExit(1)
+    try:
+        if args.measure:
+            timing['turnaround'] = measure_turnaround(client, axes[0], baudrate=args.baudrate)
+            print(f"Measured turnaround (ID {axes[0]}): {timing['turnaround'] * 1000:.2f} ms")
+        try:
+            plan = plan_cycle(axes, args.cycle_ms / 1000, **timing)
+        except ValueError as e:
+            print(f"NOT FEASIBLE: {e}")
+            raise SystemExit(1)
+        print(f"FEASIBLE: {plan}")
+        if args.run:
+            scheduler = CyclicScheduler(client, plan)
+            print(scheduler.run(args.run))
+            for device_id, error in sorted(scheduler.errors.items()):
+                print(f"  ID {device_id}: {error}")
+    finally:
+        if client:
+            client.close()
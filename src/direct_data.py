@@ -0,0 +1,111 @@
+"""
+ダイレクトデータ運転（AZ / LRD）
+
+運転データ No.・方式・位置・速度・加速・減速・運転電流・トリガ（0058h〜0067h）を
+1回の FC10 書き込みで送る。トリガが書き込まれた時点でドライバが運転を始めるため、
+位置・速度の書き込み、C-ON、START、START の解除と続けていた複数の往復が1フレームになる。
+
+運転中の目標位置・速度の変更も、トリガに「位置のみ」「速度のみ」を指定した同じ書き込みで行う。
+
+使用例:
+    drive = DirectDrive(client)
+    drive.move(2, position=10000, speed=2000)     # 1フレームで起動
+    drive.update_target(2, 15000)                 # 運転中に目標位置だけ変更
+"""
+
+import threading
+
+from bus import check
+from motion_time import DEFAULT_ACCEL, DEFAULT_DECEL
+from register_map import AZ
+
+# 運転データ No.（0058h）から 0067h のトリガまでの16レジスタ（register_map.py で計画済み）
+DIRECT_DATA_BLOCK, = AZ.group('direct_data')
+DIRECT_DATA_ADDRESS = DIRECT_DATA_BLOCK.address
+DIRECT_DATA_COUNT = DIRECT_DATA_BLOCK.count
+
+# 運転方式
+METHOD_ABSOLUTE = 1
+METHOD_INCREMENTAL = 2
+
+# トリガ（1: 全データを反映して起動、負の値: その項目だけを反映）
+TRIGGER_ALL = 1
+TRIGGER_SPEED = -4
+TRIGGER_POSITION = -5
+
+DEFAULT_CURRENT = 1000          # 運転電流（1 = 0.1%）
+
+
+class DirectRecord:
+    """1軸分のダイレクトデータ"""
+
+    __slots__ = ('data_no', 'method', 'position', 'speed', 'accel', 'decel', 'current')
+
+    def __init__(self, position, speed, method=METHOD_ABSOLUTE, accel=DEFAULT_ACCEL, decel=DEFAULT_DECEL,
+                 current=DEFAULT_CURRENT, data_no=0):
+        self.data_no = data_no
+        self.method = method
+        self.position = position
+        self.speed = speed
+        self.accel = accel
+        self.decel = decel
+        self.current = current
+
+    def encode(self, trigger):
+        """0058h〜0067h に書き込むレジスタ値（各項目は32bit、上位ワードが先）"""
+        return DIRECT_DATA_BLOCK.encode((self.data_no, self.method, self.position, self.speed, self.accel,
+                                         self.decel, self.current, trigger))
+
+
+class DirectDrive:
+    """
+    ダイレクトデータ運転の送信と、軸ごとの最後のデータの保持
+
+    Args:
+        client: Modbus クライアント
+        lock: クライアントを共有している場合のロック（BusLock など）
+    """
+
+    def __init__(self, client, lock=None):
+        self.client = client
+        self.lock = lock
+        self.records = {}    # デバイスID -> DirectRecord
+        self._records_lock = threading.Lock()
+
+    def _write(self, device_id, record, trigger):
+        registers = record.encode(trigger)
+        if self.lock is None:
+            res = self.client.write_registers(address=DIRECT_DATA_ADDRESS, values=registers, device_id=device_id)
+        else:
+            with self.lock:
+                res = self.client.write_registers(address=DIRECT_DATA_ADDRESS, values=registers,
+                                                  device_id=device_id)
+        check(res, f"ID {device_id}: direct data write")
+
+    def move(self, device_id, position, speed, method=METHOD_ABSOLUTE, accel=DEFAULT_ACCEL, decel=DEFAULT_DECEL,
+             current=DEFAULT_CURRENT):
+        """運転データ一式とトリガを1フレームで書き込み、運転を開始する"""
+        record = DirectRecord(position, speed, method, accel, decel, current)
+        self._write(device_id, record, TRIGGER_ALL)
+        with self._records_lock:
+            self.records[device_id] = record
+        return record
+
+    def update_target(self, device_id, position):
+        """運転中の目標位置を変更する（位置だけを反映させ、速度などはそのまま）"""
+        record = self._record(device_id)
+        record.position = position
+        self._write(device_id, record, TRIGGER_POSITION)
+
+    def update_speed(self, device_id, speed):
+        """運転中の速度を変更する"""
+        record = self._record(device_id)
+        record.speed = speed
+        self._write(device_id, record, TRIGGER_SPEED)
+
+    def _record(self, device_id):
+        with self._records_lock:
+            record = self.records.get(device_id)
+        if record is None:
+            raise ValueError(f"ID {device_id}: no direct data move has been sent yet")
+        return record
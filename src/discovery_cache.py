@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Persisted bus discovery
+
+Keeps the result of the last successful ID scan per serial port: the
+responding IDs, the serial settings they answered with, and the latency of
+each ID. Controllers pre-fill their ID fields from the cache at startup, then
+validate it in the background with one cheap probe per ID (a 1-register read
+of STATUS_1). A full rescan runs only when validation fails.
+
+The cache is a JSON file (DISCOVERY_CACHE_PATH in setting.py):
+
+    {"format": "oriental-motor-discovery", "version": 1,
+     "ports": {"/dev/ttyUSB1": {"baudrate": 115200, "parity": "E", "stopbits": 1,
+                                "scanned": "2026-10-19T09:12:03", "latency_ms": {"1": 2.1, ...}}}}
+
+Usage:
+    python3 src/discovery_cache.py scan [--ids 1-32]     # full scan, then save
+    python3 src/discovery_cache.py validate              # probe the cached IDs, rescan on failure
+    python3 src/discovery_cache.py show
+"""
+
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+
+from bus import create_client, scan_ids, STATUS_1_ADDR
+from setting import *
+from util import parse_ids
+
+DISCOVERY_FORMAT = "oriental-motor-discovery"
+DISCOVERY_VERSION = 1
+SCAN_IDS = "1-32"           # 再スキャンの範囲
+SCAN_TIMEOUT = 0.05         # スキャン用クライアントのタイムアウト [s]
+
+
+class Discovery:
+    """1ポート分の検出結果"""
+
+    def __init__(self, port, latencies, baudrate=MODBUS_BAUDRATE, parity=MODBUS_PARITY,
+                 stopbits=MODBUS_STOPBITS, scanned=None):
+        self.port = port
+        self.latencies = dict(latencies)    # ID -> 応答時間 [s]
+        self.baudrate = baudrate
+        self.parity = parity
+        self.stopbits = stopbits
+        self.scanned = scanned or datetime.datetime.now().isoformat(timespec="seconds")
+
+    @property
+    def ids(self):
+        return sorted(self.latencies)
+
+    def matches_settings(self):
+        """現在の setting.py の通信設定で検出した結果か"""
+        return (self.baudrate, self.parity, self.stopbits) == (MODBUS_BAUDRATE, MODBUS_PARITY, MODBUS_STOPBITS)
+
+    def to_json(self):
+        return {
+            "baudrate": self.baudrate,
+            "parity": self.parity,
+            "stopbits": self.stopbits,
+            "scanned": self.scanned,
+            "latency_ms": {str(i): round(t * 1000, 3) for i, t in sorted(self.latencies.items())},
+        }
+
+    @classmethod
+    def from_json(cls, port, data):
+        latencies = {int(i): ms / 1000 for i, ms in data.get("latency_ms", {}).items()}
+        return cls(port, latencies, data.get("baudrate"), data.get("parity"), data.get("stopbits"),
+                   data.get("scanned"))
+
+    def __str__(self):
+        ids = ", ".join(map(str, self.ids)) or "none"
+        mean = sum(self.latencies.values()) / len(self.latencies) * 1000 if self.latencies else 0.0
+        return (f"{self.port}: {len(self.latencies)} ID(s) [{ids}] at {self.baudrate} bps, "
+                f"mean latency {mean:.2f} ms, scanned {self.scanned}")
+
+
+def _read_file(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("format") != DISCOVERY_FORMAT or data.get("version", 0) > DISCOVERY_VERSION:
+        return {}
+    return data.get("ports", {})
+
+
+def load_discovery(port=MODBUS_PORT, path=DISCOVERY_CACHE_PATH):
+    """
+    キャッシュからポートの検出結果を読む
+
+    Returns:
+        Discovery: 検出結果。キャッシュがない・読めない場合は None
+    """
+    data = _read_file(path).get(port)
+    return Discovery.from_json(port, data) if data else None
+
+
+def save_discovery(discovery, path=DISCOVERY_CACHE_PATH):
+    """検出結果をキャッシュに書き込む（他のポートの結果は残す。一時ファイル経由で置き換える）"""
+    ports = _read_file(path)
+    ports[discovery.port] = discovery.to_json()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"format": DISCOVERY_FORMAT, "version": DISCOVERY_VERSION, "ports": ports}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def probe(client, ids, lock=None):
+    """
+    各IDを1回ずつ軽い読み出し（状態1）で確認する
+
+    Returns:
+        dict: 応答した ID -> 応答時間 [s]
+    """
+    found = {}
+    for device_id in ids:
+        if lock is None:
+            result = scan_ids(client, [device_id], STATUS_1_ADDR, 1)
+        else:
+            with lock:
+                result = scan_ids(client, [device_id], STATUS_1_ADDR, 1)
+        if device_id in result:
+            found[device_id] = result[device_id][1]
+    return found
+
+
+def rescan(client, ids, port=MODBUS_PORT, lock=None, path=DISCOVERY_CACHE_PATH):
+    """全範囲をスキャンし、応答があればキャッシュに保存する"""
+    discovery = Discovery(port, probe(client, ids, lock))
+    if discovery.latencies:
+        save_discovery(discovery, path)
+    return discovery
+
+
+def validate(client, discovery, scan=SCAN_IDS, lock=None, path=DISCOVERY_CACHE_PATH):
+    """
+    キャッシュのIDを確認し、応答しないIDがあれば再スキャンする
+
+    Returns:
+        tuple: (最新の Discovery, 再スキャンしたか)
+    """
+    if discovery is not None and discovery.matches_settings():
+        found = probe(client, discovery.ids, lock)
+        if len(found) == len(discovery.latencies):
+            discovery.latencies = found
+            save_discovery(discovery, path)
+            return discovery, False
+    port = discovery.port if discovery is not None else MODBUS_PORT
+    return rescan(client, parse_ids(scan), port, lock, path), True
+
+
+class DiscoveryValidator:
+    """
+    キャッシュの確認（と必要な場合の再スキャン）をバックグラウンドで行う
+
+    Args:
+        client: Modbus クライアント（接続済み）
+        discovery (Discovery): 起動時に読んだキャッシュ（None の場合は最初から再スキャン）
+        lock: クライアントを共有する場合のロック
+        callback (callable): 完了時に callback(discovery, rescanned) をバックグラウンドスレッドから呼ぶ
+    """
+
+    def __init__(self, client, discovery, lock=None, callback=None, scan=SCAN_IDS, path=DISCOVERY_CACHE_PATH):
+        self.client = client
+        self.discovery = discovery
+        self.lock = lock
+        self.callback = callback
+        self.scan = scan
+        self.path = path
+        self.done = threading.Event()
+        self.error = None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            discovery, rescanned = validate(self.client, self.discovery, self.scan, self.lock, self.path)
+            self.discovery = discovery
+            if self.callback:
+                self.callback(discovery, rescanned)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the persisted bus discovery cache")
+    parser.add_argument("command", choices=("scan", "validate", "show"))
+    parser.add_argument("--ids", default=SCAN_IDS, help="scan range, e.g. 1-32")
+    parser.add_argument("--cache", default=DISCOVERY_CACHE_PATH, help="cache file")
+    args = parser.parse_args()
+
+    cached = load_discovery(path=args.cache)
+    if args.command == "show":
+        print(cached or f"{MODBUS_PORT}: no cached discovery in {args.cache}")
+        raise SystemExit(0)
+
+    client = create_client(timeout=SCAN_TIMEOUT, retries=0)
+    if not client.connect():
+        print(f"ERROR: Cannot open port {MODBUS_PORT}")
+        raise SystemExit(1)
+    try:
+        started = time.perf_counter()
+        if args.command == "scan":
+            result, rescanned = rescan(client, parse_ids(args.ids), lock=None, path=args.cache), True
+        else:
+            result, rescanned = validate(client, cached, args.ids, path=args.cache)
+        action = "rescanned" if rescanned else "validated"
+        print(f"{action} in {time.perf_counter() - started:.2f} s: {result}")
+    finally:
+        client.close()
@@ -3,19 +3,20 @@ from pymodbus.client import ModbusSerialClient as ModbusClient
 import serial
 from setting import *
 from util import *
+from register_map import CVD
+from direct_data import TRIGGER_POSITION
 
-def modbus_write(address, value, slave):
-    upper, lower = decimal_to_hex(value)
-    client.write_registers(address, [upper, lower], slave=slave)
+def modbus_write(register, value, slave):
+    client.write_registers(register.address, register.encode(value), slave=slave)
 
 def initialize_motors():
     try:
         slave_id1 = int(entry_id1.get())
-        client.write_registers(address=0x0066, values=[0xffff, 0xfffb], slave=slave_id1)
+        modbus_write(CVD.direct_trigger, TRIGGER_POSITION, slave_id1)
         
         if enable_dual_motor.get():
             slave_id2 = int(entry_id2.get())
-            client.write_registers(address=0x0066, values=[0xffff, 0xfffb], slave=slave_id2)
+            modbus_write(CVD.direct_trigger, TRIGGER_POSITION, slave_id2)
             status_label.config(text=f"Motors {slave_id1} and {slave_id2} initialized successfully", fg="green")
         else:
             status_label.config(text=f"Motor {slave_id1} initialized successfully", fg="green")
@@ -26,12 +27,12 @@ def send_speed():
     try:
         slave_id1 = int(entry_id1.get())
         speed1 = int(entry_speed1.get())
-        client.write_registers(address=0x005e, values=[0, speed1], slave=slave_id1)
+        modbus_write(CVD.direct_speed, speed1, slave_id1)
         
         if enable_dual_motor.get():
             slave_id2 = int(entry_id2.get())
             speed2 = int(entry_speed2.get())
-            client.write_registers(address=0x005e, values=[0, speed2], slave=slave_id2)
+            modbus_write(CVD.direct_speed, speed2, slave_id2)
             status_label.config(text=f"Speed sent successfully to motors {slave_id1} and {slave_id2}", fg="green")
         else:
             status_label.config(text=f"Speed sent successfully to motor {slave_id1}", fg="green")
@@ -42,12 +43,12 @@ def send_step():
     try:
         slave_id1 = int(entry_id1.get())
         step1 = int(entry_step1.get())
-        modbus_write(0x005c, step1, slave_id1)
+        modbus_write(CVD.direct_position, step1, slave_id1)
         
         if enable_dual_motor.get():
             slave_id2 = int(entry_id2.get())
             step2 = int(entry_step2.get())
-            modbus_write(0x005c, step2, slave_id2)
+            modbus_write(CVD.direct_position, step2, slave_id2)
             status_label.config(text=f"Step sent successfully to motors {slave_id1} and {slave_id2}", fg="green")
         else:
             status_label.config(text=f"Step sent successfully to motor {slave_id1}", fg="green")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Emergency stop
+
+Sends STOP (bit 0x10 of COMMAND_1, C-ON kept) to the whole fleet either as a
+single broadcast frame or as per-axis writes sent back-to-back. When a
+BusLock is given, the stop jumps ahead of every queued request and aborts
+pending non-stop requests and batches; it only waits for the transaction
+already on the wire.
+
+STOP stays latched in the drivers until COMMAND_1 is rewritten without it.
+The CVD GUIs only move through direct-data triggers and never rewrite
+COMMAND_1, so call release_stop() (C-ON only) before the next move.
+
+GUI: bound to the Escape key in axis_controller.py and lrd_controller.py;
+"Release STOP" in axis_controller.py.
+Headless:
+    report = emergency_stop(client, lock, axes=[1, 2, 3])
+    release_stop(client, lock, axes=[1, 2, 3])
+    python3 src/estop.py [--ids 1-28 | --per-axis] [--release]
+"""
+
+import argparse
+import time
+
+from bus import *
+from util import parse_ids
+
+# 指令1のビット
+C_ON_BIT = 0x20       # Bit5
+STOP_BIT = 0x10       # Bit4
+STOP_COMMAND = C_ON_BIT | STOP_BIT
+RELEASE_COMMAND = C_ON_BIT       # STOP を解除する（C-ON は維持）
+
+
+class StopReport:
+    """停止要求の遅延の内訳"""
+
+    def __init__(self, wait, send, axes, broadcast, max_transaction):
+        self.wait = wait                        # 実行中のトランザクションの完了待ち [s]
+        self.send = send                        # 停止フレームの送信 [s]
+        self.axes = axes
+        self.broadcast = broadcast
+        self.max_transaction = max_transaction  # これまでに観測した最長のトランザクション [s]
+
+    @property
+    def latency(self):
+        return self.wait + self.send
+
+    @property
+    def worst_case(self):
+        """最長のトランザクションの直後に停止要求が来た場合の遅延の見積もり [s]"""
+        return max(self.wait, self.max_transaction) + self.send
+
+    def __str__(self):
+        mode = "broadcast" if self.broadcast else f"{len(self.axes)} axis write(s)"
+        return (f"STOP sent ({mode}): latency {self.latency * 1000:.1f} ms "
+                f"(wait {self.wait * 1000:.1f} ms + send {self.send * 1000:.1f} ms), "
+                f"worst case {self.worst_case * 1000:.1f} ms")
+
+
+def send_command(client, command, axes=None, label="STOP"):
+    """
+    指令1を書き込む（ロックは呼び出し側で取得する）
+
+    Args:
+        command (int): 指令1の値
+        axes (list): 書き込むデバイスID。None の場合はブロードキャストで全軸に送る
+        label (str): エラー表示用の名前
+    """
+    if axes is None:
+        client.write_registers(address=COMMAND_1_ADDR, values=[command],
+                               device_id=BROADCAST_ID, no_response_expected=True)
+        return
+    # 1軸の失敗で残りの軸が遅れないよう、応答エラーはまとめて報告する
+    errors = []
+    for device_id in axes:
+        try:
+            res = client.write_registers(address=COMMAND_1_ADDR, values=[command], device_id=device_id)
+            if res.isError():
+                errors.append(f"ID {device_id}: {res}")
+        except Exception as e:
+            errors.append(f"ID {device_id}: {e}")
+    if errors:
+        raise Exception(f"{label} failed for " + "; ".join(errors))
+
+
+def send_stop(client, axes=None):
+    """
+    停止指令を送る（ロックは呼び出し側で取得する）
+
+    Args:
+        axes (list): 停止するデバイスID。None の場合はブロードキャストで全軸を止める
+    """
+    send_command(client, STOP_COMMAND, axes, "STOP")
+
+
+def release_stop(client, lock=None, axes=None):
+    """
+    STOP を解除する（指令1を C-ON のみに戻す）
+
+    停止中の要求には割り込まず、通常の順番でバスを使う。
+
+    Args:
+        client: Modbus クライアント
+        lock (BusLock): クライアントを共有している場合のロック
+        axes (list): 解除するデバイスID。None の場合はブロードキャスト
+    """
+    if lock is None:
+        send_command(client, RELEASE_COMMAND, axes, "STOP release")
+        return
+    with lock:
+        send_command(client, RELEASE_COMMAND, axes, "STOP release")
+
+
+def emergency_stop(client, lock=None, axes=None):
+    """
+    待ち行列に割り込んで全軸を停止する
+
+    Args:
+        client: Modbus クライアント
+        lock (BusLock): クライアントを共有している場合のロック
+        axes (list): 個別に停止するデバイスID。None の場合はブロードキャスト
+
+    Returns:
+        StopReport: 停止遅延の内訳
+    """
+    requested = time.perf_counter()
+    if lock is None:
+        acquired = requested
+        send_stop(client, axes)
+        max_transaction = 0.0
+    else:
+        with lock.preempt():
+            acquired = time.perf_counter()
+            send_stop(client, axes)
+        max_transaction = lock.max_hold
+    sent = time.perf_counter()
+    return StopReport(acquired - requested, sent - acquired, axes or [], axes is None, max_transaction)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stop every axis on the bus")
+    parser.add_argument("--ids", default="", help="axes for per-axis stops, e.g. 1-28 (implies --per-axis)")
+    parser.add_argument("--per-axis", action="store_true", help="send per-axis stops instead of a broadcast (IDs 1-31 without --ids)")
+    parser.add_argument("--release", action="store_true", help="clear STOP (write C-ON only) instead of stopping")
+    args = parser.parse_args()
+
+    # --ids を指定した場合は個別に送る（ブロードキャストで指定外の軸まで止めない）
+    axes = None
+    if args.ids or args.per_axis:
+        axes = parse_ids(args.ids or "1-31")
+        if not axes:
+            parser.error("--ids selects no axes")
+
+    client = create_client()
+    if not client.connect():
+        print(f"ERROR: Cannot open port {MODBUS_PORT}")
+        raise SystemExit(1)
+    try:
+        if args.release:
+            release_stop(client, axes=axes)
+            print("STOP released (" + ("broadcast" if axes is None else f"{len(axes)} axis write(s)") + ")")
+        else:
+            print(emergency_stop(client, axes=axes))
+    finally:
+        client.close()
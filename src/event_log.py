@@ -0,0 +1,211 @@
+"""
+非同期イベントログ
+
+ホットパス（Tk のコールバック、ポーリング）から print() の代わりに使う構造化ログ。
+log.info('send_speed', id=2, response=response) のように、イベント名とフィールドを
+整形せずにキューへ積むだけで戻る。整形（JSON Lines）とファイルへの書き込みは
+バックグラウンドのスレッドがまとめて行い、ファイルはサイズで世代交代する。
+
+ログレベルは実行中に set_level() で切り替えられる（再起動不要）。レベル未満の呼び出しは
+比較1回で捨てる。console_level 以上の記録は書き込みスレッドが標準エラーにも出す。
+
+フィールドの値は書き込みスレッドで整形するため、後から書き換わるオブジェクトは
+書き込み時点の内容になる。整数・文字列・例外・pymodbus の応答はそのまま渡してよい。
+time / level / event はフィールド名に使わない。
+
+使用例:
+    log = EventLog.from_args(args)      # --log / --log-level（add_log_arguments）
+    log.debug('command', id=2, command=0x2101)
+    log.error('send_speed_failed', id=2, error=e)
+    log.set_level('DEBUG')
+    log.close()                         # 残りを書き出す（atexit でも呼ばれる）
+"""
+
+import atexit
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+from setting import *
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR, 'OFF': OFF}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+
+def parse_level(level):
+    """'DEBUG' などの名前または数値 -> レベルの数値"""
+    if isinstance(level, str):
+        try:
+            return LEVELS[level.upper()]
+        except KeyError:
+            raise ValueError(f"unknown log level {level!r} (expected one of {', '.join(LEVELS)})") from None
+    return int(level)
+
+
+def _format_value(value):
+    """JSON にできない値の表記（例外は型名も残す）"""
+    if isinstance(value, BaseException):
+        return f"{type(value).__name__}: {value}"
+    return str(value)
+
+
+def add_log_arguments(parser):
+    """エントリポイントの argparse に --log / --log-level を追加する"""
+    parser.add_argument("--log", default=EVENT_LOG_PATH, metavar="FILE",
+                        help=f"event log file, rotated by size (default: {EVENT_LOG_PATH}; '' disables)")
+    parser.add_argument("--log-level", default=EVENT_LOG_LEVEL, choices=list(LEVELS),
+                        help=f"initial log level, can be changed while running (default: {EVENT_LOG_LEVEL})")
+
+
+class EventLog:
+    """
+    イベントをキューに積み、バックグラウンドでまとめてファイルに書き出す
+
+    Args:
+        path (str): 出力ファイル（None の場合はファイルに書かず、console_level 以上を標準エラーに出すだけ）
+        level (int | str): 記録する最低レベル
+        console_level (int | str): 標準エラーにも出す最低レベル
+        max_bytes (int): このサイズを超えたら世代交代する（書き出しのまとまりごとに確かめる）
+        backups (int): 残す古いファイルの数（path.1 〜 path.N）
+        flush_interval (float): 書き出しの周期 [s]
+        batch_size (int): キューにこの件数たまったら周期を待たずに書き出す
+        capacity (int): キューの上限（超えた分は古いものから捨て、dropped に数える）
+    """
+
+    def __init__(self, path=None, level=INFO, console_level=WARNING, max_bytes=EVENT_LOG_MAX_BYTES,
+                 backups=EVENT_LOG_BACKUPS, flush_interval=0.2, batch_size=256, capacity=100000):
+        self.path = path
+        self.level = parse_level(level)
+        self.console_level = parse_level(console_level)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.written = 0
+        self._queue = collections.deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._closed = False
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.log or None, level=args.log_level)
+
+    # ---- 記録（呼び出し側のスレッド） ----
+
+    def enabled(self, level):
+        """level の記録が有効か（フィールドを作るのが重い場合に先に確かめる）"""
+        return level >= self.level
+
+    def log(self, level, event, /, **fields):
+        if level < self.level or self._closed:
+            return
+        queue = self._queue
+        if len(queue) == queue.maxlen:
+            self.dropped += 1
+        queue.append((time.time(), level, event, fields))
+        if len(queue) >= self.batch_size:
+            self._wake.set()
+
+    def debug(self, event, /, **fields):
+        if DEBUG >= self.level:
+            self.log(DEBUG, event, **fields)
+
+    def info(self, event, /, **fields):
+        if INFO >= self.level:
+            self.log(INFO, event, **fields)
+
+    def warning(self, event, /, **fields):
+        if WARNING >= self.level:
+            self.log(WARNING, event, **fields)
+
+    def error(self, event, /, **fields):
+        if ERROR >= self.level:
+            self.log(ERROR, event, **fields)
+
+    def set_level(self, level):
+        """記録する最低レベルを変更する（実行中に切り替えてよい）"""
+        self.level = parse_level(level)
+        self.log(max(self.level, INFO), 'log_level', verbosity=self.level_name)
+
+    @property
+    def level_name(self):
+        return LEVEL_NAMES.get(self.level, str(self.level))
+
+    # ---- 書き出し（バックグラウンドのスレッド） ----
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+            if self._closed:
+                self._drain()
+                return
+
+    def _drain(self):
+        queue = self._queue
+        lines = []
+        console = []
+        while queue:
+            timestamp, level, event, fields = queue.popleft()
+            record = {'time': round(timestamp, 6), 'level': LEVEL_NAMES.get(level, level), 'event': event}
+            record.update(fields)
+            line = json.dumps(record, ensure_ascii=False, default=_format_value)
+            lines.append(line)
+            if level >= self.console_level:
+                console.append(line)
+        if not lines:
+            return
+        if console:
+            sys.stderr.write("\n".join(console) + "\n")
+            sys.stderr.flush()
+        if self._file is None:
+            return
+        try:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            self.written += len(lines)
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            sys.stderr.write(f"event log write error: {e}\n")
+
+    def _rotate(self):
+        """path -> path.1 -> ... -> path.N と世代をずらし、新しいファイルを開く"""
+        self._file.close()
+        for n in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{n}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{n + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        """キューに残った記録を書き出してファイルを閉じる"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,257 @@
+"""
+軽量な Modbus RTU トランスポート
+
+pymodbus の ModbusSerialClient と同じ呼び出し方（read_holding_registers / write_register /
+write_registers / readwrite_registers、device_id=、no_response_expected=、応答の
+isError() / registers / exception_code）で使える、高頻度ポーリング向けのクライアント。
+
+- 要求フレームは事前に確保した bytearray に struct.pack_into で組み立てる
+- 応答は再利用する受信バッファに readinto で読み込み、memoryview と struct.unpack_from で解析する
+- 応答の長さは要求から決まるため、pymodbus のような受信待ちのポーリング（1ms 以上の sleep）を
+  せず、必要なバイト数をシリアルのタイムアウト付きで一度に読む
+- CRC はテーブル方式
+
+ホットパス向けに、結果を呼び出し側の配列に書き込む read_registers_into() もある。
+
+create_client(fast=True)（または setting.py の MODBUS_FAST_TRANSPORT）で有効になる。
+"""
+
+import struct
+import time
+
+import serial
+
+from bus_timing import silent_interval
+from setting import *
+
+MAX_FRAME = 256
+
+_HEADER = struct.Struct('>BBHH')          # ID, FC, アドレス, 数（FC03/FC06/FC10）
+_READWRITE = struct.Struct('>BBHHHHB')    # ID, FC, 読み出しアドレス, 読み出し数, 書き込みアドレス, 書き込み数, バイト数
+_CRC = struct.Struct('<H')
+_REGISTER_CODECS = {}                      # レジスタ数 -> struct.Struct('>nH')
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16(buf, start, end):
+    """Modbus CRC-16（buf[start:end]、スライスを作らずに計算する）"""
+    crc = 0xFFFF
+    table = _CRC_TABLE
+    for i in range(start, end):
+        crc = (crc >> 8) ^ table[(crc ^ buf[i]) & 0xFF]
+    return crc
+
+
+def register_codec(count):
+    """count 個のビッグエンディアン16bitレジスタ用の struct.Struct（キャッシュする）"""
+    codec = _REGISTER_CODECS.get(count)
+    if codec is None:
+        codec = _REGISTER_CODECS[count] = struct.Struct(f'>{count}H')
+    return codec
+
+
+class RtuError(Exception):
+    """応答なし・CRC 不一致・不正な応答"""
+
+
+class RtuResponse:
+    """pymodbus の応答と同じ属性を持つ応答"""
+
+    __slots__ = ('registers', 'exception_code', 'function_code', 'device_id')
+
+    def __init__(self, device_id, function_code, registers=None, exception_code=0):
+        self.device_id = device_id
+        self.function_code = function_code
+        self.registers = registers if registers is not None else []
+        self.exception_code = exception_code
+
+    def isError(self):
+        return self.exception_code != 0
+
+    def __str__(self):
+        if self.exception_code:
+            return f"Exception Response(dev_id={self.device_id}, function_code={self.function_code | 0x80}, " \
+                   f"exception_code={self.exception_code})"
+        return f"RtuResponse(dev_id={self.device_id}, function_code={self.function_code}, registers={self.registers})"
+
+
+class FastRtuClient:
+    """
+    事前確保したバッファで動く Modbus RTU クライアント
+
+    Args:
+        port (str): シリアルポート（pyserial の URL も可）
+        serial_port: 生成済みのシリアルポート（指定した場合 port は使わない。シミュレーション用）
+        silent (float): フレーム間の無通信区間 [s]。None の場合はボーレートから求める
+    """
+
+    def __init__(self, port=MODBUS_PORT, baudrate=MODBUS_BAUDRATE, timeout=MODBUS_TIMEOUT, retries=3,
+                 parity=MODBUS_PARITY, stopbits=MODBUS_STOPBITS, serial_port=None, silent=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.retries = retries
+        self.parity = parity
+        self.stopbits = stopbits
+        self.socket = serial_port
+        self._silent = silent_interval(baudrate, parity, stopbits) if silent is None else silent
+        self._last_frame = 0.0
+        self._tx = bytearray(MAX_FRAME)
+        self._rx = bytearray(MAX_FRAME)
+        self._tx_view = memoryview(self._tx)
+        self._rx_view = memoryview(self._rx)
+        # フレーム長ごとのスライス（memoryview も1つ約200バイトあるため使い回す）
+        self._tx_frames = {}
+        self._rx_head = self._rx_view[:5]
+        self._rx_tails = {}
+
+    # ---- 接続 ----
+
+    def connect(self):
+        if self.socket:
+            return True
+        try:
+            self.socket = serial.serial_for_url(self.port, baudrate=self.baudrate, parity=self.parity,
+                                                stopbits=self.stopbits, timeout=self.timeout,
+                                                write_timeout=self.timeout, exclusive=True)
+        except Exception:
+            self.socket = None
+        return self.socket is not None
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+        self.socket = None
+
+    def is_socket_open(self):
+        return bool(self.socket and self.socket.is_open)
+
+    # ---- 入出力（profiler.py はこの3つを通信待ちとして計測し、bus_capture.py は send / recv を記録する） ----
+
+    def _wait_silent(self):
+        """前のフレームからの無通信区間を確保する"""
+        wait = self._last_frame + self._silent - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+    def send(self, frame):
+        socket = self.socket
+        if socket is None:
+            raise RtuError(f"port {self.port} is not open")
+        if socket.in_waiting:
+            socket.reset_input_buffer()
+        socket.write(frame)
+        return len(frame)
+
+    def recv(self, view):
+        """view の長さだけ読み込み、読めたバイト数を返す（タイムアウト時は短くなる）"""
+        n = self.socket.readinto(view)
+        self._last_frame = time.perf_counter()
+        return n or 0
+
+    # ---- トランザクション ----
+
+    def _transact(self, length, device_id, function_code, expected):
+        """
+        _tx[:length] を送って応答を _rx に読み込む
+
+        Returns:
+            int: 例外コード（正常応答は0）。応答なしのブロードキャストは0
+        """
+        tx = self._tx
+        _CRC.pack_into(tx, length, crc16(tx, 0, length))
+        frame = self._tx_frames.get(length)
+        if frame is None:
+            frame = self._tx_frames[length] = self._tx_view[:length + 2]
+        if device_id == 0 or expected == 0:
+            self._wait_silent()
+            self.send(frame)
+            self._last_frame = time.perf_counter()
+            return 0
+        rx = self._rx
+        error = None
+        for _ in range(self.retries + 1):
+            self._wait_silent()
+            self.send(frame)
+            # 例外応答（5バイト）と正常応答を見分けるため、先頭5バイトを先に読む
+            if self.recv(self._rx_head) < 5:
+                error = f"ID {device_id}: no response"
+                continue
+            if rx[0] != device_id or rx[1] & 0x7F != function_code:
+                error = f"ID {device_id}: unexpected response header {rx[0]:02X} {rx[1]:02X}"
+                self.socket.reset_input_buffer()
+                continue
+            if rx[1] & 0x80:
+                end = 5
+            else:
+                end = expected
+                tail = self._rx_tails.get(end)
+                if tail is None:
+                    tail = self._rx_tails[end] = self._rx_view[5:end]
+                if end > 5 and self.recv(tail) < end - 5:
+                    error = f"ID {device_id}: incomplete response"
+                    continue
+            if crc16(rx, 0, end - 2) != _CRC.unpack_from(rx, end - 2)[0]:
+                error = f"ID {device_id}: CRC mismatch"
+                continue
+            return rx[2] if rx[1] & 0x80 else 0
+        raise RtuError(error)
+
+    def read_registers_into(self, address, count, device_id, out, offset=0):
+        """
+        FC03 の結果を out[offset:offset + count] に書き込む（応答オブジェクトを作らない）
+
+        Raises:
+            RtuError: 応答なし・CRC 不一致・例外応答
+        """
+        _HEADER.pack_into(self._tx, 0, device_id, 0x03, address, count)
+        code = self._transact(6, device_id, 0x03, 5 + 2 * count)
+        if code:
+            raise RtuError(f"ID {device_id}: exception code {code} reading 0x{address:04X}")
+        rx = self._rx
+        for i in range(count):
+            out[offset + i] = (rx[3 + 2 * i] << 8) | rx[4 + 2 * i]
+
+    def read_holding_registers(self, address, count=1, device_id=1, **kwargs):
+        _HEADER.pack_into(self._tx, 0, device_id, 0x03, address, count)
+        code = self._transact(6, device_id, 0x03, 5 + 2 * count)
+        if code:
+            return RtuResponse(device_id, 0x03, exception_code=code)
+        return RtuResponse(device_id, 0x03, list(register_codec(count).unpack_from(self._rx, 3)))
+
+    def write_register(self, address, value, device_id=1, no_response_expected=False, **kwargs):
+        _HEADER.pack_into(self._tx, 0, device_id, 0x06, address, value)
+        code = self._transact(6, device_id, 0x06, 0 if no_response_expected else 8)
+        return RtuResponse(device_id, 0x06, exception_code=code)
+
+    def write_registers(self, address, values, device_id=1, no_response_expected=False, **kwargs):
+        count = len(values)
+        tx = self._tx
+        _HEADER.pack_into(tx, 0, device_id, 0x10, address, count)
+        tx[6] = 2 * count
+        register_codec(count).pack_into(tx, 7, *values)
+        code = self._transact(7 + 2 * count, device_id, 0x10, 0 if no_response_expected else 8)
+        return RtuResponse(device_id, 0x10, exception_code=code)
+
+    def readwrite_registers(self, read_address=0, read_count=0, write_address=0, values=(), device_id=1,
+                            **kwargs):
+        count = len(values)
+        tx = self._tx
+        _READWRITE.pack_into(tx, 0, device_id, 0x17, read_address, read_count, write_address, count, 2 * count)
+        register_codec(count).pack_into(tx, 11, *values)
+        code = self._transact(11 + 2 * count, device_id, 0x17, 5 + 2 * read_count)
+        if code:
+            return RtuResponse(device_id, 0x17, exception_code=code)
+        return RtuResponse(device_id, 0x17, list(register_codec(read_count).unpack_from(self._rx, 3)))
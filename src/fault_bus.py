@@ -0,0 +1,137 @@
+"""
+障害を注入するシミュレーションバス
+
+SimulatedBus に、応答の欠落・CRC 破損・遅延の追加・スレーブの脱落・例外応答を
+確率で注入する。応答までの時間は bus_timing.py のフレーム時間（要求と応答の送信時間 +
+ターンアラウンド）で模擬するため、障害のない状態でも実機に近い速度で動く。
+乱数の種を固定すれば同じ障害の列を再現できる。
+
+使用例:
+    bus = FaultyBus(PROFILES['noisy'], {i: {} for i in range(1, 29)})
+    client.socket = SimSerial(bus)
+    ...
+    print(bus.injected)     # {'drop': 12, 'corrupt': 9, ...}
+"""
+
+import random
+import struct
+
+from bus_timing import char_time, DEFAULT_TURNAROUND
+from fast_rtu import crc16
+from sim_bus import SimulatedBus
+from setting import *
+
+SLAVE_DEVICE_BUSY = 0x06
+
+_CRC = struct.Struct('<H')
+
+
+class FaultProfile:
+    """
+    注入する障害の設定
+
+    Args:
+        name (str): 表示名
+        drop (float): 応答を返さない確率
+        corrupt (float): 応答の1バイトを壊す（CRC 不一致にする）確率
+        exception (float): 例外応答（Slave Device Busy）を返す確率
+        latency (float): 応答に加える遅延 [s]
+        jitter (float): 応答に加える遅延のばらつき（0〜jitter の一様分布）[s]
+        dropout_id (int): 途中で応答しなくなるスレーブ（None の場合はなし）
+        dropout_after (int): 脱落するまでの要求数（バス全体）
+        dropout_for (int): 脱落している要求数（None の場合は戻らない）
+    """
+
+    def __init__(self, name, drop=0.0, corrupt=0.0, exception=0.0, latency=0.0, jitter=0.0,
+                 dropout_id=None, dropout_after=0, dropout_for=None):
+        self.name = name
+        self.drop = drop
+        self.corrupt = corrupt
+        self.exception = exception
+        self.latency = latency
+        self.jitter = jitter
+        self.dropout_id = dropout_id
+        self.dropout_after = dropout_after
+        self.dropout_for = dropout_for
+
+    def __str__(self):
+        parts = [f"drop {self.drop:.1%}" if self.drop else "",
+                 f"corrupt {self.corrupt:.1%}" if self.corrupt else "",
+                 f"exception {self.exception:.1%}" if self.exception else "",
+                 f"latency +{self.latency * 1000:.1f} ms" if self.latency else "",
+                 f"jitter {self.jitter * 1000:.1f} ms" if self.jitter else "",
+                 f"ID {self.dropout_id} drops out after {self.dropout_after} requests" if self.dropout_id else ""]
+        return f"{self.name}: " + (", ".join(p for p in parts if p) or "no faults")
+
+
+PROFILES = {
+    'clean': FaultProfile('clean'),
+    'noisy': FaultProfile('noisy', drop=0.01, corrupt=0.01),
+    'lossy': FaultProfile('lossy', drop=0.05),
+    'slow': FaultProfile('slow', latency=0.003, jitter=0.005),
+    'busy': FaultProfile('busy', exception=0.02),
+    'dropout': FaultProfile('dropout', dropout_id=3, dropout_after=200),
+    'bad-day': FaultProfile('bad-day', drop=0.02, corrupt=0.02, exception=0.01, latency=0.001, jitter=0.004,
+                            dropout_id=3, dropout_after=300, dropout_for=300),
+}
+
+
+class FaultyBus(SimulatedBus):
+    """
+    障害を注入するスレーブ群
+
+    Args:
+        profile (FaultProfile): 注入する障害
+        devices (dict): デバイスID -> {アドレス: 値}
+        seed (int): 乱数の種
+        baudrate (int): フレーム時間の計算に使うボーレート（0 の場合は時間を模擬しない）
+        turnaround (float): ドライバの応答までの時間 [s]
+    """
+
+    def __init__(self, profile, devices=None, seed=0, baudrate=MODBUS_BAUDRATE, turnaround=DEFAULT_TURNAROUND):
+        super().__init__(devices)
+        self.profile = profile
+        self.random = random.Random(seed)
+        self.char = char_time(baudrate) if baudrate else 0.0
+        self.turnaround = turnaround if baudrate else 0.0
+        self.frames = 0         # 受け取った要求フレーム（再送を含む）
+        self.injected = {'drop': 0, 'corrupt': 0, 'exception': 0, 'dropout': 0}
+
+    def _dropped_out(self, device_id):
+        p = self.profile
+        if device_id != p.dropout_id or self.frames <= p.dropout_after:
+            return False
+        return p.dropout_for is None or self.frames <= p.dropout_after + p.dropout_for
+
+    def handle(self, frame):
+        self.frames += 1
+        p = self.profile
+        rnd = self.random.random
+        device_id = frame[0] if len(frame) else 0
+        if self._dropped_out(device_id):
+            self.injected['dropout'] += 1
+            return None
+        if p.exception and device_id and rnd() < p.exception and device_id in self.devices:
+            self.injected['exception'] += 1
+            body = bytes([device_id, frame[1] | 0x80, SLAVE_DEVICE_BUSY])
+            return body + _CRC.pack(crc16(body, 0, len(body)))
+        response = super().handle(frame)
+        if response is None:
+            return None
+        if p.drop and rnd() < p.drop:
+            self.injected['drop'] += 1
+            return None
+        if p.corrupt and rnd() < p.corrupt:
+            self.injected['corrupt'] += 1
+            damaged = bytearray(response)
+            damaged[self.random.randrange(2, len(damaged))] ^= 0x5A
+            return bytes(damaged)
+        return response
+
+    def response_delay(self, frame, response):
+        p = self.profile
+        delay = (len(frame) + len(response)) * self.char + self.turnaround + p.latency
+        if p.jitter:
+            delay += self.random.random() * p.jitter
+        return delay
+
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Headless job runner
+
+Runs a motion program from a CSV or JSON Lines file without the GUI, with the
+same register writes as the controllers' Initialize / Send Speed / Send Step.
+One row is one axis command:
+
+    axis,speed,step,wait
+    2,1000,5000,
+    3,800,-2000,1
+
+A row without speed keeps the axis's last speed; a row without step only sets
+the speed. A row with a true wait (1 / true / yes) ends a step: the runner
+waits until every axis moved since the previous wait has actually stopped
+(completion.py), instead of sleeping for a fixed time. JSON Lines rows use the
+same keys: {"axis": 2, "speed": 1000, "step": 5000, "wait": true}.
+
+The file is read lazily and a background thread parses and encodes rows into
+a bounded queue ahead of the bus, so memory stays constant for files with
+hundreds of thousands of rows. Progress (rows, rows/s) goes to stderr, and
+--timing FILE writes the send and motion time of every step as CSV.
+Ctrl+C stops every axis.
+
+Usage:
+    python3 src/job_runner.py program.csv [--initialize] [--timing steps.csv] [--fast] [--dry-run]
+"""
+
+import argparse
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+
+from bus import create_client, check
+from bus_lock import BusLock
+from completion import CompletionWatcher
+from direct_data import TRIGGER_POSITION
+from alarm_sweep import AlarmMonitor
+from estop import emergency_stop
+from motion_time import MotionEstimator
+from motor_model import FIELD_RANGES
+from register_map import CVD
+from setting import *
+
+MOVE_TIMEOUT = 60.0        # 運転完了待ちのタイムアウト [s]
+PREFETCH_STEPS = 64        # 先読みして準備しておくステップ数
+PROGRESS_INTERVAL = 2.0    # 進捗表示の間隔 [s]
+
+SPEED = CVD.direct_speed
+STEP = CVD.direct_position
+INITIALIZE = (CVD.direct_trigger.address, CVD.direct_trigger.encode(TRIGGER_POSITION))   # 位置の書き込みで起動
+
+TRUE_WORDS = ('1', 'true', 'yes', 'y')
+_END = object()
+
+
+class JobError(Exception):
+    """ジョブファイルの内容の誤り（ファイル名と行番号を含む）"""
+
+
+def _number(row, key, field, where):
+    value = row.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise JobError(f"{where}: {key} must be an integer, got {value!r}")
+    low, high = FIELD_RANGES[field]
+    if not low <= number <= high:
+        raise JobError(f"{where}: {key} {number} is out of range {low}..{high}")
+    return number
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_WORDS
+
+
+def read_rows(path):
+    """
+    ジョブファイルを1行ずつ読む（ファイル全体は読み込まない）
+
+    Yields:
+        tuple: (行番号, 軸, 速度 or None, ステップ or None, 待ち合わせ)
+    """
+    jsonl = path.endswith(('.jsonl', '.ndjson'))
+    with open(path, newline='') as f:
+        if jsonl:
+            rows = ((n, line) for n, line in enumerate(f, 1) if line.strip())
+        else:
+            reader = csv.DictReader(f)
+            missing = {'axis'} - set(reader.fieldnames or [])
+            if missing:
+                raise JobError(f"{path}: header must contain an 'axis' column")
+            rows = ((reader.line_num, row) for row in reader)
+        for line, row in rows:
+            where = f"{path}:{line}"
+            if jsonl:
+                try:
+                    row = json.loads(row)
+                except ValueError as e:
+                    raise JobError(f"{where}: {e}")
+            axis = _number(row, 'axis', 'ids', where)
+            if axis is None:
+                raise JobError(f"{where}: axis is required")
+            yield (line, axis, _number(row, 'speed', 'speeds', where), _number(row, 'step', 'steps', where),
+                   _flag(row.get('wait')))
+
+
+class Step:
+    """待ち合わせまでの1ステップ分の書き込み（送信順）"""
+
+    __slots__ = ('number', 'line', 'rows', 'writes', 'moves', 'wait')
+
+    def __init__(self, number, line):
+        self.number = number
+        self.line = line          # 最初の行の行番号
+        self.rows = 0
+        self.writes = []          # (デバイスID, アドレス, レジスタ値)
+        self.moves = {}           # デバイスID -> (ステップ, 速度)
+        self.wait = False
+
+
+def prepare_steps(rows, initialize=False):
+    """
+    行をステップにまとめ、書き込むレジスタ値に変換する
+
+    Args:
+        rows: read_rows() の結果
+        initialize (bool): 各軸の最初のコマンドの前に初期化を書き込む
+    """
+    speeds = {}            # 軸ごとの最後の速度（予測運転時間に使う）
+    initialized = set()
+    number = 0
+    step = None
+    for line, axis, speed, steps, wait in rows:
+        if step is None:
+            number += 1
+            step = Step(number, line)
+        step.rows += 1
+        if initialize and axis not in initialized:
+            initialized.add(axis)
+            step.writes.append((axis,) + INITIALIZE)
+        if speed is not None:
+            speeds[axis] = speed
+            step.writes.append((axis, SPEED.address, SPEED.encode(speed)))
+        if steps is not None:
+            step.writes.append((axis, STEP.address, STEP.encode(steps)))
+            step.moves[axis] = (steps, speeds.get(axis, 0))
+        if wait:
+            step.wait = True
+            yield step
+            step = None
+    if step is not None:
+        yield step
+
+
+class StepTimes:
+    """ステップの所要時間の集計（件数・平均・最大）"""
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def __str__(self):
+        mean = self.total / self.count if self.count else 0.0
+        return f"mean {mean * 1000:.1f} ms, max {self.max * 1000:.1f} ms"
+
+
+class JobRunner:
+    """
+    ジョブファイルを先読みしながらバスに送る
+
+    Args:
+        client: Modbus クライアント（接続済み）
+        lock (BusLock): 送信・完了待ち・停止で共有するロック
+        timeout (float): 1ステップの運転完了待ちのタイムアウト [s]
+    """
+
+    def __init__(self, client, lock=None, timeout=MOVE_TIMEOUT, prefetch=PREFETCH_STEPS,
+                 progress=PROGRESS_INTERVAL):
+        self.client = client
+        self.lock = lock or BusLock()
+        self.timeout = timeout
+        self.prefetch = prefetch
+        self.progress = progress
+        self.estimator = MotionEstimator()
+        self.alarms = AlarmMonitor(client, lock=self.lock)
+        self.alarms.subscribe(lambda event: print(f"  {event}", file=sys.stderr))
+        self.rows = 0
+        self.steps = 0
+        self.send_times = StepTimes()
+        self.motion_times = StepTimes()
+
+    def _produce(self, path, initialize, out):
+        # 準備スレッド: 行の解析と変換をバスの送信と並行して進める
+        try:
+            for step in prepare_steps(read_rows(path), initialize):
+                out.put(step)
+            out.put(_END)
+        except BaseException as e:
+            out.put(e)
+
+    def _predicted(self, moves):
+        predicted = {}
+        for device_id, (steps, speed) in moves.items():
+            if not self.estimator.has_profile(device_id):
+                try:
+                    with self.lock:
+                        self.estimator.load_profile(self.client, device_id)
+                except Exception:
+                    self.estimator.set_profile(device_id, self.estimator.accel, self.estimator.decel)
+            predicted[device_id] = self.estimator.predict(device_id, steps, speed)
+        return predicted
+
+    def _send(self, step):
+        for device_id, address, values in step.writes:
+            with self.lock:
+                res = self.client.write_registers(address=address, values=values, device_id=device_id)
+            check(res, f"step {step.number} (line {step.line}), ID {device_id}: write 0x{address:04X}")
+
+    def _wait(self, watcher, moving):
+        futures = watcher.wait_idle(list(moving), self.timeout, predicted=self._predicted(moving))
+        for future in futures.values():
+            future.result()
+
+    def run(self, path, initialize=False, timing=None, dry_run=False):
+        """
+        ジョブを最後まで実行する
+
+        Args:
+            timing (file): ステップごとの所要時間を CSV で書き込む先（None の場合は書かない）
+            dry_run (bool): 解析と変換だけを行い、バスには送らない
+        """
+        steps = queue.Queue(maxsize=self.prefetch)
+        threading.Thread(target=self._produce, args=(path, initialize, steps), daemon=True).start()
+        watcher = None if dry_run else CompletionWatcher(self.client, lock=self.lock, estimator=self.estimator,
+                                                         alarms=self.alarms)
+        writer = csv.writer(timing) if timing else None
+        if writer:
+            writer.writerow(['step', 'line', 'rows', 'axes', 'send_ms', 'motion_ms'])
+        moving = {}            # 前回の待ち合わせ以降に起動した軸
+        started = time.perf_counter()
+        next_report = started + self.progress
+        try:
+            while True:
+                step = steps.get()
+                if step is _END:
+                    break
+                if isinstance(step, BaseException):
+                    raise step
+                sent_at = time.perf_counter()
+                if not dry_run:
+                    self._send(step)
+                    moving.update(step.moves)
+                done_at = time.perf_counter()
+                self.send_times.add(done_at - sent_at)
+                motion = 0.0
+                if step.wait and moving:
+                    self._wait(watcher, moving)
+                    motion = time.perf_counter() - done_at
+                    self.motion_times.add(motion)
+                    moving = {}
+                self.rows += step.rows
+                self.steps += 1
+                if writer:
+                    writer.writerow([step.number, step.line, step.rows, len(step.moves),
+                                     f"{(done_at - sent_at) * 1000:.2f}", f"{motion * 1000:.2f}"])
+                now = time.perf_counter()
+                if self.progress and now >= next_report:
+                    next_report = now + self.progress
+                    print(f"  {self.rows} rows, {self.steps} steps, {self.rows / (now - started):.0f} rows/s",
+                          file=sys.stderr)
+            # 最後のステップに待ち合わせがなくても、運転の完了までを実行時間に含める
+            if moving:
+                self._wait(watcher, moving)
+        finally:
+            if watcher:
+                watcher.close()
+        return time.perf_counter() - started
+
+    def summary(self, elapsed):
+        lines = [f"{self.rows} rows in {self.steps} steps, {elapsed:.2f} s ({self.rows / elapsed:.0f} rows/s)"
+                 if elapsed > 0 else f"{self.rows} rows in {self.steps} steps"]
+        lines.append(f"  send per step:   {self.send_times}")
+        if self.motion_times.count:
+            lines.append(f"  motion per wait: {self.motion_times} ({self.motion_times.count} waits)")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a CSV / JSON Lines motion program without the GUI")
+    parser.add_argument("job", help="job file (.csv, or .jsonl for JSON Lines)")
+    parser.add_argument("--initialize", action="store_true", help="initialize each axis before its first command")
+    parser.add_argument("--timing", metavar="FILE", help="write send/motion time per step as CSV")
+    parser.add_argument("--timeout", type=float, default=MOVE_TIMEOUT, help="completion timeout per step [s]")
+    parser.add_argument("--fast", action="store_true", help="use the fast RTU transport")
+    parser.add_argument("--dry-run", action="store_true", help="parse and encode only; do not touch the bus")
+    args = parser.parse_args()
+
+    client = None
+    if not args.dry_run:
+        client = create_client(fast=args.fast)
+        if not client.connect():
+            print(f"ERROR: Cannot open port {MODBUS_PORT}")
+            raise SystemExit(1)
+    runner = JobRunner(client, timeout=args.timeout)
+    timing = open(args.timing, "w", newline='') if args.timing else None
+    started = time.perf_counter()
+    try:
+        elapsed = runner.run(args.job, args.initialize, timing, args.dry_run)
+        print(runner.summary(elapsed))
+    except KeyboardInterrupt:
+        if client:
+            print(emergency_stop(client, runner.lock))
+        print(f"Interrupted: {runner.summary(time.perf_counter() - started)}")
+        raise SystemExit(130)
+    except Exception as e:
+        if client and not isinstance(e, JobError):
+            print(emergency_stop(client, runner.lock))
+        print(f"ERROR: {e}")
+        print(runner.summary(time.perf_counter() - started))
+        raise SystemExit(1)
+    finally:
+        if timing:
+            timing.close()
+        if client:
+            client.close()
@@ -1,69 +1,88 @@
+import argparse
+import sys
 import tkinter as tk
 import time
 from pymodbus.client import ModbusSerialClient as ModbusClient
 import serial
 from setting import *
 from util import *
+from bus import command_status, READY_BIT, MOVE_BIT, ALM_BIT
+from register_map import AZ
+from estop import emergency_stop
+from direct_data import DirectDrive
+from profiler import Profiler, add_profile_arguments
+from event_log import EventLog, add_log_arguments, LEVELS
+
+POLL_INTERVAL_MS = 100  # 運転中の状態ポーリング周期
+
+parser = argparse.ArgumentParser(description="LRD single motor controller")
+add_profile_arguments(parser)
+add_log_arguments(parser)
+args = parser.parse_args()
+profiler = Profiler.from_args(args)
+# 応答・状態はキューに積むだけで、書き出しはバックグラウンドで行う（event_log.py）
+log = EventLog.from_args(args)
 
 # pymodbus のバージョンを確認
 import pymodbus
 import inspect
-print(f"pymodbus version: {pymodbus.__version__}")
+log.info("pymodbus_version", version=pymodbus.__version__)
 
 # write_registers メソッドのシグネチャを確認
 try:
     sig = inspect.signature(ModbusClient.write_registers)
-    print(f"write_registers signature: {sig}")
+    log.debug("write_registers_signature", signature=sig)
 except Exception as e:
-    print(f"Could not get signature: {e}")
+    log.debug("write_registers_signature_failed", error=e)
 
 def test_connection():
     """接続テスト用関数"""
     try:
         slave_id = int(entry_slave_id.get())
-        print(f"Testing connection with device ID: {slave_id}")
+        log.info("connection_test", id=slave_id)
         
         # 複数のレジスタアドレスでテスト
-        test_addresses = [0x001e, 0x0000, 0x0001, 0x0601]
+        test_addresses = [AZ.command1.address, 0x0000, 0x0001, AZ.drive_method_no1.address]
         
         for addr in test_addresses:
             try:
                 response = client.read_holding_registers(addr, count=1, device_id=slave_id)
                 if not response.isError():
-                    print(f"Success reading address 0x{addr:04x}: {response.registers}")
+                    log.info("connection_test_ok", id=slave_id, address=addr, registers=response.registers)
                     status_label.config(text=f"Connection test OK - Address 0x{addr:04x}", fg="green")
                     return
                 else:
-                    print(f"Error reading address 0x{addr:04x}: {response}")
+                    log.warning("connection_test_error", id=slave_id, address=addr, response=response)
             except Exception as e:
-                print(f"Exception reading address 0x{addr:04x}: {e}")
+                log.warning("connection_test_error", id=slave_id, address=addr, error=e)
         
         status_label.config(text="Connection test failed - No response from any address", fg="red")
         
     except Exception as e:
-        print(f"Connection test error: {e}")
+        log.error("connection_test_failed", error=e)
         status_label.config(text=f"Connection test error: {e}", fg="red")
-    upper, lower = decimal_to_hex(value)
+
+def modbus_write(register, value, slave):
     # pymodbus 3.11.0では device_id パラメータを使用
-    response = client.write_registers(address, [upper, lower], device_id=slave)
+    response = client.write_registers(register.address, register.encode(value), device_id=slave)
     return response
 
 def initialize_motor():
     try:
         slave_id = int(entry_slave_id.get())
         
-        # pymodbus 3.11.0では device_id パラメータを使用
-        response1 = client.write_registers(0x001e, [0x2000], device_id=slave_id)
-        print(f"Initialize response 1: {response1}")
+        # C-ON を書き込み、FC 0x17 で状態も同時に読み取る
+        status1, status2 = command_status(client, slave_id, 0x2000)
+        log.debug("initialize", id=slave_id, status1=status1, status2=status2)
         time.sleep(0.1)
         
-        response2 = client.write_registers(0x0601, [0], device_id=slave_id)
-        print(f"Initialize response 2: {response2}")
+        response2 = modbus_write(AZ.drive_method_no1, 0, slave_id)
+        log.debug("initialize_drive_method", id=slave_id, response=response2)
         time.sleep(0.1)
             
         status_label.config(text="Motor initialized successfully", fg="green")
     except Exception as e:
-        print(f"Initialize error: {e}")
+        log.error("initialize_failed", error=e)
         status_label.config(text=f"Error: {e}", fg="red")
 
 def send_speed():
@@ -71,48 +90,110 @@ def send_speed():
         speed = int(entry_speed.get())
         slave_id = int(entry_slave_id.get())
         
-        response = client.write_registers(0x0502, [0, speed], device_id=slave_id)
-        print(f"Send speed response: {response}")
+        response = modbus_write(AZ.velocity_no1, speed, slave_id)
+        log.debug("send_speed", id=slave_id, speed=speed, response=response)
         time.sleep(0.1)
             
         status_label.config(text="Speed sent successfully", fg="green")
     except Exception as e:
-        print(f"Send speed error: {e}")
+        log.error("send_speed_failed", error=e)
         status_label.config(text=f"Error: {e}", fg="red")
 
 def send_step():
     try:
         step = int(entry_step.get())
         slave_id = int(entry_slave_id.get())
-        response = modbus_write(0x0402, step, slave_id)
-        print(f"Send step response: {response}")
+        response = modbus_write(AZ.position_no1, step, slave_id)
+        log.debug("send_step", id=slave_id, step=step, response=response)
         status_label.config(text="Step sent successfully", fg="green")
     except Exception as e:
-        print(f"Send step error: {e}")
+        log.error("send_step_failed", error=e)
+        status_label.config(text=f"Error: {e}", fg="red")
+
+def describe_status(status1):
+    """状態1から表示用の (テキスト, 色) を返す"""
+    if status1 & ALM_BIT:
+        return "Alarm", "red"
+    if status1 & MOVE_BIT:
+        return "Moving", "blue"
+    if status1 & READY_BIT:
+        return "Ready", "green"
+    return "Not ready", "orange"
+
+def poll_motor(slave_id, maintain_command):
+    """維持コマンドの書き込みと状態の読み取りを1往復で行い、運転終了まで繰り返す"""
+    try:
+        status1, _ = command_status(client, slave_id, maintain_command)
+    except Exception as e:
+        log.error("poll_failed", id=slave_id, error=e)
         status_label.config(text=f"Error: {e}", fg="red")
+        return
+    log.debug("poll", id=slave_id, status1=status1)
+    text, color = describe_status(status1)
+    status_label.config(text=f"Motor {slave_id}: {text}", fg=color)
+    if status1 & MOVE_BIT and not status1 & ALM_BIT:
+        root.after(POLL_INTERVAL_MS, poll_motor, slave_id, maintain_command)
 
 def start_motor():
     try:
         slave_id = int(entry_slave_id.get())
-        response = client.write_registers(0x001e, [0x2101], device_id=slave_id)
-        print(f"Start motor response: {response}")
+        status1, _ = command_status(client, slave_id, 0x2101)
+        log.debug("start_motor", id=slave_id, status1=status1)
             
         status_label.config(text="Motor started", fg="green")
+        # STARTをOFFに戻しながら運転終了を監視する
+        root.after(POLL_INTERVAL_MS, poll_motor, slave_id, 0x2001)
     except Exception as e:
-        print(f"Start motor error: {e}")
+        log.error("start_motor_failed", error=e)
         status_label.config(text=f"Error: {e}", fg="red")
 
 def stop_motor():
     try:
         slave_id = int(entry_slave_id.get())
-        response = client.write_registers(0x001e, [0x2001], device_id=slave_id)
-        print(f"Stop motor response: {response}")
+        status1, _ = command_status(client, slave_id, 0x2001)
+        log.debug("stop_motor", id=slave_id, status1=status1)
             
-        status_label.config(text="Motor stopped", fg="green")
+        text, color = describe_status(status1)
+        status_label.config(text=f"Motor stopped ({text})", fg=color)
     except Exception as e:
-        print(f"Stop motor error: {e}")
+        log.error("stop_motor_failed", error=e)
         status_label.config(text=f"Error: {e}", fg="red")
 
+def direct_move():
+    """位置・速度とトリガを1フレームで書き込み、その場で運転を開始する（事前に Initialize で C-ON）"""
+    try:
+        slave_id = int(entry_slave_id.get())
+        speed = int(entry_speed.get())
+        step = int(entry_step.get())
+        direct_drive.move(slave_id, position=step, speed=speed)
+        status_label.config(text=f"Direct move started: {step} @ {speed}", fg="green")
+        # C-ON を維持しながら運転終了を監視する
+        root.after(POLL_INTERVAL_MS, poll_motor, slave_id, 0x2000)
+    except Exception as e:
+        log.error("direct_move_failed", error=e)
+        status_label.config(text=f"Error: {e}", fg="red")
+
+def update_target():
+    """運転中の目標位置を Step の値に変更する（1フレーム）"""
+    try:
+        slave_id = int(entry_slave_id.get())
+        step = int(entry_step.get())
+        direct_drive.update_target(slave_id, step)
+        status_label.config(text=f"Target updated: {step}", fg="green")
+    except Exception as e:
+        log.error("update_target_failed", error=e)
+        status_label.config(text=f"Error: {e}", fg="red")
+
+def emergency_stop_all():
+    """全軸にブロードキャストで STOP を送る（Escキー）"""
+    try:
+        report = emergency_stop(client)
+        log.warning("emergency_stop", report=report)
+        status_label.config(text=str(report), fg="red")
+    except Exception as e:
+        log.error("emergency_stop_failed", error=e)
+        status_label.config(text=f"STOP error: {e}", fg="red")
+
 # Modbus接続の設定
 try:
     client = ModbusClient(
@@ -125,34 +206,42 @@ try:
     
     # 接続を開く
     if client.connect():
-        print("Connected to Modbus device successfully")
-        print(f"Connection details: port={MODBUS_PORT}, baudrate={MODBUS_BAUDRATE}")
+        log.info("connected", port=MODBUS_PORT, baudrate=MODBUS_BAUDRATE)
         
         # 接続テスト（デバイスIDが1のデバイスから何かを読み取ってみる）
         try:
-            test_response = client.read_holding_registers(0x001e, count=1, device_id=1)
-            print(f"Connection test response: {test_response}")
+            test_response = client.read_holding_registers(AZ.command1.address, count=1, device_id=1)
             if test_response.isError():
-                print("Connection test failed - device not responding")
+                log.warning("startup_test_failed", id=1, response=test_response)
             else:
-                print("Connection test successful - device is responding")
+                log.info("startup_test_ok", id=1, response=test_response)
         except Exception as test_e:
-            print(f"Connection test failed: {test_e}")
+            log.warning("startup_test_failed", id=1, error=test_e)
             # より詳細な接続テスト
             try:
                 # シンプルなテスト - レジスタ1つだけ読む
                 simple_test = client.read_input_registers(0, count=1, device_id=1)
-                print(f"Simple test response: {simple_test}")
+                log.info("startup_simple_test", id=1, response=simple_test)
             except Exception as simple_e:
-                print(f"Simple test also failed: {simple_e}")
-                print("Device may not be connected or settings may be incorrect")
+                log.error("startup_simple_test_failed", id=1, error=simple_e,
+                          hint="device may not be connected or settings may be incorrect")
     else:
-        print("Failed to connect to Modbus device")
+        log.error("connect_failed", port=MODBUS_PORT, baudrate=MODBUS_BAUDRATE)
         
 except Exception as e:
-    print(f"Connection setup error: {e}")
+    log.error("connection_setup_failed", error=e)
     client = None
 
+direct_drive = DirectDrive(client)
+
+# プロファイリング（Tk のフックはウィジェットの生成前に入れる）
+if profiler:
+    profiler.install_tk()
+    if client:
+        profiler.instrument_client(client)
+    profiler.instrument_module(sys.modules[__name__])
+    profiler.start()
+
 # Tkinter GUIの設定
 root = tk.Tk()
 root.title("Motor Controller 2")
@@ -184,6 +273,15 @@ tk.Button(root, text="Send Speed", command=send_speed, width=button_width).grid(
 tk.Button(root, text="Send Step", command=send_step, width=button_width).grid(row=6, column=0, columnspan=2, pady=2)
 tk.Button(root, text="Start Motor", command=start_motor, width=button_width).grid(row=7, column=0, columnspan=2, pady=2)
 tk.Button(root, text="Stop Motor", command=stop_motor, width=button_width).grid(row=8, column=0, columnspan=2, pady=2)
+tk.Button(root, text="Direct Move", command=direct_move, width=button_width).grid(row=7, column=2, padx=5, pady=2)
+tk.Button(root, text="Update Target", command=update_target, width=button_width).grid(row=8, column=2, padx=5, pady=2)
+tk.Button(root, text="STOP ALL (Esc)", command=emergency_stop_all, width=button_width, bg="#F44336", fg="white").grid(row=11, column=0, columnspan=2, pady=2)
+root.bind("<Escape>", lambda e: emergency_stop_all())
+
+# ログレベル（実行中に切り替える。DEBUG で応答・状態をすべて記録する）
+tk.Label(root, text="Log level:").grid(row=12, column=0, sticky="e", padx=5, pady=2)
+log_level_var = tk.StringVar(value=log.level_name)
+tk.OptionMenu(root, log_level_var, *LEVELS, command=log.set_level).grid(row=12, column=1, sticky="w", padx=5, pady=2)
 
 # ステータスラベル
 status_label = tk.Label(root, text="Ready", fg="blue", wraplength=300)
@@ -203,14 +301,17 @@ def on_closing():
     try:
         if client and hasattr(client, 'close'):
             client.close()
-            print("Modbus connection closed")
+            log.info("connection_closed")
     except Exception as e:
-        print(f"Error closing connection: {e}")
+        log.error("close_failed", error=e)
     finally:
         root.destroy()
 
 root.protocol("WM_DELETE_WINDOW", on_closing)
 
 # メインループ開始
-print("Starting GUI...")
-root.mainloop()
\ No newline at end of file
+log.info("gui_started")
+root.mainloop()
+if profiler:
+    profiler.finish()
+log.close()
\ No newline at end of file
@@ -2,44 +2,29 @@ import serial
 import time
 import pymodbus
 from pymodbus.client import ModbusSerialClient as ModbusClient
-
-# アドレス定数定義
+from bus import command_status, read_status, read_fields, write_fields
+from completion import wait_idle
+from alarm_sweep import AlarmMonitor
+from register_map import AZ
+from motor_model import StatusStore
+from event_log import EventLog
+from setting import EVENT_LOG_PATH, EVENT_LOG_LEVEL
+
+# アドレスは register_map.py の AZ/LRD の表から取る
 # 指令1：001Eh - 上位Bit5：C-ON、Bit4：STOP、Bit0：START、下位Bit0～Bit5の6ビットで運転データNoの指定
-COMMAND_1_ADDR = 0x001E
+COMMAND_1_ADDR = AZ.command1.address
 
 # 状態1：0020h - 上位Bit5：READY（運転可能かどうか）、Bit2：MOVE（運転中かどうか）、Bit0：STARTの状態、下位Bit7：ALM（アラーム）
-STATUS_1_ADDR = 0x0020
+STATUS_1_ADDR = AZ.status1.address
 
 # 状態2：0021h - 下位Bit1：ENABLE（モーターが励磁中かどうか）
-STATUS_2_ADDR = 0x0021
-
-# 0015h：運転方式
-DRIVE_METHOD_ADDR = 0x0015
-
-# 001Ah、001Bh：速度
-VELOCITY_H_ADDR = 0x001A
-VELOCITY_L_ADDR = 0x001B
-
-# 001Ch、001Dh：位置
-POSITION_H_ADDR = 0x001C
-POSITION_L_ADDR = 0x001D
-
-# 運転データ領域アドレス
-# 位置データ
-POSITION_NO1_H_ADDR = 0x0402  # 位置No1上位
-POSITION_NO1_L_ADDR = 0x0403  # 位置No1下位
-POSITION_NO2_H_ADDR = 0x0404  # 位置No2上位
-POSITION_NO2_L_ADDR = 0x0405  # 位置No2下位
-
-# 速度データ
-VELOCITY_NO1_H_ADDR = 0x0502  # 速度No1上位
-VELOCITY_NO1_L_ADDR = 0x0503  # 速度No1下位
-VELOCITY_NO2_H_ADDR = 0x0504  # 速度No2上位
-VELOCITY_NO2_L_ADDR = 0x0505  # 速度No2下位
+STATUS_2_ADDR = AZ.status2.address
 
-# 運転方式データ
-DRIVE_METHOD_NO1_ADDR = 0x0601  # 運転方式No1
-DRIVE_METHOD_NO2_ADDR = 0x0602  # 運転方式No2
+# 運転データNoごとの運転データ（位置・速度・運転方式）のパラメータ名
+DRIVE_DATA_FIELDS = {
+    1: ('position_no1', 'velocity_no1', 'drive_method_no1'),
+    2: ('position_no2', 'velocity_no2', 'drive_method_no2'),
+}
 
 # ビットマスク定義
 C_ON_BIT = 0x20      # Bit5
@@ -86,45 +71,18 @@ def preset(id, data_no, drive_method, velocity, position):
     """
     try:
         if data_no not in [1, 2]:
-            print(f"エラー: 運転データNoは1または2である必要があります。指定値: {data_no}")
+            log.error("drive_data_no_invalid", id=id, data_no=data_no)
             return False
         
-        # 運転データNoに応じてアドレスを選択
-        if data_no == 1:
-            # 運転データNo1の設定
-            drive_method_addr = DRIVE_METHOD_NO1_ADDR
-            velocity_h_addr = VELOCITY_NO1_H_ADDR
-            velocity_l_addr = VELOCITY_NO1_L_ADDR
-            position_h_addr = POSITION_NO1_H_ADDR
-            position_l_addr = POSITION_NO1_L_ADDR
-        else:  # data_no == 2
-            # 運転データNo2の設定
-            drive_method_addr = DRIVE_METHOD_NO2_ADDR
-            velocity_h_addr = VELOCITY_NO2_H_ADDR
-            velocity_l_addr = VELOCITY_NO2_L_ADDR
-            position_h_addr = POSITION_NO2_H_ADDR
-            position_l_addr = POSITION_NO2_L_ADDR
-        
-        # 運転方式を設定
-        client.write_registers(address=drive_method_addr, values=[drive_method], device_id=id)
-        
-        # 速度を設定（上位・下位に分割）
-        velocity_high = (velocity >> 16) & 0xFFFF
-        velocity_low = velocity & 0xFFFF
-        client.write_registers(address=velocity_h_addr, values=[velocity_high], device_id=id)
-        client.write_registers(address=velocity_l_addr, values=[velocity_low], device_id=id)
+        # 位置・速度・運転方式を書き込む（32bit の値は上位・下位を1回の書き込みで送る）
+        position_field, velocity_field, method_field = DRIVE_DATA_FIELDS[data_no]
+        write_fields(client, id, AZ, {method_field: drive_method, velocity_field: velocity, position_field: position})
         
-        # 位置を設定（上位・下位に分割）
-        position_high = (position >> 16) & 0xFFFF
-        position_low = position & 0xFFFF
-        client.write_registers(address=position_h_addr, values=[position_high], device_id=id)
-        client.write_registers(address=position_l_addr, values=[position_low], device_id=id)
-        
-        print(f"運転データNo{data_no}を設定しました: 速度={velocity}, 位置={position}, 運転方式={drive_method}")
+        log.info("preset", id=id, data_no=data_no, velocity=velocity, position=position, drive_method=drive_method)
         
         return True
     except Exception as e:
-        print(f"プリセットエラー: {e}")
+        log.error("preset_failed", id=id, data_no=data_no, error=e)
         return False
 
 
@@ -142,24 +100,43 @@ def start(id, data_no):
     try:
         # 運転データNoを上位ビット（Bit8-13）に設定し、C-ONとSTARTをON
         command_value = ((data_no & DATA_NO_MASK) << 8) | C_ON_BIT | START_BIT
-        print(f"起動コマンド: 0x{command_value:04X}")
+        log.debug("start_command", id=id, command=command_value)
         
-        # 指令1に設定
-        client.write_registers(address=COMMAND_1_ADDR, values=[command_value], device_id=id)
+        # 指令1に設定（FC 0x17 で状態も同時に読み取る）
+        status1, _ = command_status(client, id, command_value)
         
         # 少し待機
         time.sleep(0.1)
         
         # STARTをOFFにしてC-ONのみONの状態にする
         command_value = ((data_no & DATA_NO_MASK) << 8) | C_ON_BIT
-        print(f"維持コマンド: 0x{command_value:04X}")
-        client.write_registers(address=COMMAND_1_ADDR, values=[command_value], device_id=id)
+        log.debug("maintain_command", id=id, command=command_value)
+        status1, _ = command_status(client, id, command_value)
         
-        return True
+        return not (status1 & ALM_BIT)
     except Exception as e:
-        print(f"起動エラー: {e}")
+        log.error("start_failed", id=id, error=e)
         return False
 
+def stop(id, data_no=0):
+    """
+    モーターを停止する関数（C-ONは維持する）
+    
+    Args:
+        id (int): デバイスID
+        data_no (int): 運転データNo（0-63）
+    
+    Returns:
+        AxisStatus: 停止コマンド送信後の状態（軸ごとに同じオブジェクトを上書きする）、失敗時None
+    """
+    try:
+        command_value = ((data_no & DATA_NO_MASK) << 8) | C_ON_BIT | STOP_BIT
+        log.debug("stop_command", id=id, command=command_value)
+        return statuses.update(id, *command_status(client, id, command_value))
+    except Exception as e:
+        log.error("stop_failed", id=id, error=e)
+        return None
+
 def excite(id):
     """
     モーターを励磁する関数
@@ -169,12 +146,12 @@ def excite(id):
         command_result = client.read_holding_registers(address=COMMAND_1_ADDR, count=1, device_id=id)
         current_command = command_result.registers[0] if not command_result.isError() else 0
         
-        # C-ONビットを追加（運転データNoは保持）
+        # C-ONビットを追加（運転データNoは保持）し、状態も同時に読み取る
         command_value = (current_command & 0xFF00) | C_ON_BIT
-        client.write_registers(address=COMMAND_1_ADDR, values=[command_value], device_id=id)
+        command_status(client, id, command_value)
         return True
     except Exception as e:
-        print(f"励磁エラー: {e}")
+        log.error("excite_failed", id=id, error=e)
         return False
 
 def status(id):
@@ -185,34 +162,43 @@ def status(id):
         id (int): デバイスID
     
     Returns:
-        dict: 状態情報の辞書
+        AxisStatus: 状態（軸ごとに同じオブジェクトを上書きする。info['alarm'] のようにも参照できる）
     """
     try:
-        # 状態1を読み取り
-        status1_result = client.read_holding_registers(address=STATUS_1_ADDR, count=1, device_id=id)
-        status1 = status1_result.registers[0] if status1_result.isError() == False else 0
-        
-        # 状態2を読み取り
-        status2_result = client.read_holding_registers(address=STATUS_2_ADDR, count=1, device_id=id)
-        status2 = status2_result.registers[0] if status2_result.isError() == False else 0
-        
-        # 状態を解析
-        status_info = {
-            'ready': bool(status1 & READY_BIT),      # 運転可能かどうか
-            'move': bool(status1 & MOVE_BIT),        # 運転中かどうか
-            'start_status': bool(status1 & START_STATUS_BIT),  # STARTの状態
-            'alarm': bool(status1 & ALM_BIT),        # アラーム
-            'enable': bool(status2 & ENABLE_BIT),    # モーター励磁中かどうか
-            'status1_raw': status1,
-            'status2_raw': status2
-        }
-        
-        return status_info
+        # 状態1・状態2を1回で読み取り
+        info = statuses.update(id, *read_status(client, id))
+        alarms.observe(id, info.status1)
+        return info
     except Exception as e:
-        print(f"状態取得エラー: {e}")
+        log.error("status_failed", id=id, error=e)
         return None
 
 
+def poll(id, command_value, interval=0.1, timeout=10.0):
+    """
+    維持コマンドを書き込みながら状態をポーリングし、運転終了を待つ関数
+    
+    1周期ごとに FC 0x17 で指令1の書き込みと状態の読み取りを1往復で行う。
+    
+    Args:
+        id (int): デバイスID
+        command_value (int): 周期ごとに書き込む指令1の値
+        interval (float): ポーリング周期 [s]
+        timeout (float): タイムアウト [s]
+    
+    Returns:
+        AxisStatus: 最後に読み取った状態、タイムアウト時None
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = statuses.update(id, *command_status(client, id, command_value))
+        alarms.observe(id, info.status1)
+        if info.alarm or not info.move:
+            return info
+        time.sleep(interval)
+    return None
+
+
 def get_drive_data(id, data_no):
     """
     運転データ領域を確認する関数
@@ -226,69 +212,28 @@ def get_drive_data(id, data_no):
     """
     try:
         if data_no not in [1, 2]:
-            print(f"エラー: 運転データNoは1または2である必要があります。指定値: {data_no}")
+            log.error("drive_data_no_invalid", id=id, data_no=data_no)
             return None
         
-        # アドレスを選択
-        if data_no == 1:
-            position_h_addr = POSITION_NO1_H_ADDR
-            position_l_addr = POSITION_NO1_L_ADDR
-            velocity_h_addr = VELOCITY_NO1_H_ADDR
-            velocity_l_addr = VELOCITY_NO1_L_ADDR
-            drive_method_addr = DRIVE_METHOD_NO1_ADDR
-        else:  # data_no == 2
-            position_h_addr = POSITION_NO2_H_ADDR
-            position_l_addr = POSITION_NO2_L_ADDR
-            velocity_h_addr = VELOCITY_NO2_H_ADDR
-            velocity_l_addr = VELOCITY_NO2_L_ADDR
-            drive_method_addr = DRIVE_METHOD_NO2_ADDR
-        
-        # 位置データを読み取り
-        position_h_result = client.read_holding_registers(address=position_h_addr, count=1, device_id=id)
-        position_h = position_h_result.registers[0] if not position_h_result.isError() else 0
-        
-        position_l_result = client.read_holding_registers(address=position_l_addr, count=1, device_id=id)
-        position_l = position_l_result.registers[0] if not position_l_result.isError() else 0
-        
-        # 32ビット位置値を構築
-        position = (position_h << 16) | position_l
-        # 負の値の処理（2の補数）
-        if position > 0x7FFFFFFF:
-            position = position - 0x100000000
-        
-        # 速度データを読み取り
-        velocity_h_result = client.read_holding_registers(address=velocity_h_addr, count=1, device_id=id)
-        velocity_h = velocity_h_result.registers[0] if not velocity_h_result.isError() else 0
-        
-        velocity_l_result = client.read_holding_registers(address=velocity_l_addr, count=1, device_id=id)
-        velocity_l = velocity_l_result.registers[0] if not velocity_l_result.isError() else 0
-        
-        # 32ビット速度値を構築
-        velocity = (velocity_h << 16) | velocity_l
-        # 負の値の処理（2の補数）
-        if velocity > 0x7FFFFFFF:
-            velocity = velocity - 0x100000000
-        
-        # 運転方式を読み取り
-        drive_method_result = client.read_holding_registers(address=drive_method_addr, count=1, device_id=id)
-        drive_method = drive_method_result.registers[0] if not drive_method_result.isError() else 0
+        # 位置・速度・運転方式を読み取り（32bit の値は上位・下位を1回の読み出しで取得する）
+        position_field, velocity_field, method_field = DRIVE_DATA_FIELDS[data_no]
+        values = read_fields(client, id, AZ, DRIVE_DATA_FIELDS[data_no])
+        position = values[position_field]
+        velocity = values[velocity_field]
+        drive_method = values[method_field]
         
         # 運転データ情報を構築
         drive_data = {
             'data_no': data_no,
             'position': position,
-            #'position_high': position_h,
-            #'position_low': position_l,
             'velocity': velocity,
-            #'velocity_high': velocity_h,
-            #'velocity_low': velocity_l,
             #'drive_method': drive_method,
             'drive_method_name': 'INCREMENT' if drive_method == INCREMENT_DRIVE_METHOD else 'ABSOLUTE' if drive_method == ABSOLUTE_DRIVE_METHOD else f'UNKNOWN({drive_method})'
         }
         
         return drive_data
     except Exception as e:
-        print(f"運転データ取得エラー: {e}")
+        log.error("drive_data_failed", id=id, data_no=data_no, error=e)
         return None
 
 
@@ -314,7 +259,7 @@ def get_all_drive_data(id):
         
         return all_data
     except Exception as e:
-        print(f"全運転データ取得エラー: {e}")
+        log.error("all_drive_data_failed", id=id, error=e)
         return None
 
 
@@ -342,27 +287,31 @@ def start_manual(id, data_no):
             # 0x2002: C-ON + 運転データNo2
             maintain_command = 0x2002
         else:
-            print(f"エラー: 運転データNoは1または2である必要があります。指定値: {data_no}")
+            log.error("drive_data_no_invalid", id=id, data_no=data_no)
             return False
         
-        client.write_registers(address=COMMAND_1_ADDR, values=[0x2000], device_id=id)
+        command_status(client, id, 0x2000)
         time.sleep(0.1)
         
-        print(f"手動起動コマンド: 0x{start_command:04X}")
-        client.write_registers(address=COMMAND_1_ADDR, values=[start_command], device_id=id)
+        log.debug("start_command", id=id, command=start_command)
+        command_status(client, id, start_command)
         
         # 少し待機
         time.sleep(0.1)
         
-        print(f"手動維持コマンド: 0x{maintain_command:04X}")
-        client.write_registers(address=COMMAND_1_ADDR, values=[maintain_command], device_id=id)
+        log.debug("maintain_command", id=id, command=maintain_command)
+        command_status(client, id, maintain_command)
         
         return True
     except Exception as e:
-        print(f"手動起動エラー: {e}")
+        log.error("start_manual_failed", id=id, error=e)
         return False
 
 
+# 指令・応答の記録はキューに積むだけで、書き出しはバックグラウンドで行う（event_log.py）
+# 実行中に log.set_level('DEBUG') で指令値もすべて記録する
+log = EventLog(EVENT_LOG_PATH, level=EVENT_LOG_LEVEL)
+
 client = ModbusClient(
     port=MODBUS_PORT,
     baudrate=MODBUS_BAUDRATE,
@@ -373,6 +322,11 @@ client = ModbusClient(
 
 client.connect()
 
+# status() / poll() で読んだ状態から、ALM が立ち上がった軸のアラームを表示する
+alarms = AlarmMonitor(client)
+statuses = StatusStore()     # 軸ごとの状態（読み出しのたびに上書きする）
+alarms.subscribe(print)
+
 preset(2, DRIVE_NO_UP, ABSOLUTE_DRIVE_METHOD, 1000, 0)
 time.sleep(0.5)
 preset(2, DRIVE_NO_DOWN, ABSOLUTE_DRIVE_METHOD, 1000, 15000)
@@ -405,6 +359,9 @@ start(5, DRIVE_NO_UP)
 start(6, DRIVE_NO_UP)
 start(7, DRIVE_NO_UP)
 
+# 全軸の運転完了を待つ（固定の待ち時間ではなく実際の完了で次へ進む）
+print(wait_idle(client, [2, 3, 4, 5, 6, 7], timeout=30))
+
 excite(2)
 time.sleep(0.1)
 excite(3)
@@ -3,6 +3,7 @@ import time
 import pymodbus
 from pymodbus.client import ModbusSerialClient as ModbusClient
 from util import decimal_to_hex
+from register_map import CVD
 
 
 MODBUS_METHOD = 'rtu'
@@ -13,23 +14,23 @@ MODBUS_PARITY = serial.PARITY_EVEN
 MODBUS_STOPBITS = serial.STOPBITS_ONE
 ID = 16
 
-ROTATION_DIRECTION_ADDRESS = 0x0384
+ROTATION_DIRECTION_ADDRESS = CVD.rotation_direction.address
 ROTATION_DIRECTION = {
     'CW': 1,
     'CCW': 0
 }
-MODBUS_ID_ADDRESS = 0x1380
-NV_MEMORY_WRITE_ADDRESS = 0x0192
-CONFIGURATION_EXECUTE_ADDRESS = 0x018c
+MODBUS_ID_ADDRESS = CVD.slave_id.address
+NV_MEMORY_WRITE_ADDRESS = CVD.nv_write.address
+CONFIGURATION_EXECUTE_ADDRESS = CVD.configuration.address
 
-DIRECT_DRIVE_METHOD_ADDRESS = 0x005a
+DIRECT_DRIVE_METHOD_ADDRESS = CVD.direct_method.address
 DIRECT_DRIVE_METHOD = {
     'ABSOLUTE': 1,
     'INCREMENT': 2,
 }
-DIRECT_DRIVE_STEP_ADDRESS = 0x005c
-DIRECT_DRIVE_SPEED_ADDRESS = 0x005e
-DIRECT_DRIVE_TRIGGER_ADDRESS = 0x0066
+DIRECT_DRIVE_STEP_ADDRESS = CVD.direct_position.address
+DIRECT_DRIVE_SPEED_ADDRESS = CVD.direct_speed.address
+DIRECT_DRIVE_TRIGGER_ADDRESS = CVD.direct_trigger.address
 DIRECT_DRIVE_TRIGGER = {
     'STEP': -5,
     'VELOCITY': -4,
@@ -54,7 +55,7 @@ res.registers
 
 client.write_registers(CONFIGURATION_EXECUTE_ADDRESS, [0, 1], 18)
 
-client.write_registers(0x0192, [0, 1], 16)
+client.write_registers(NV_MEMORY_WRITE_ADDRESS, [0, 1], 16)
 
 # chaange id
 def search_modbus_id():
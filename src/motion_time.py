@@ -0,0 +1,105 @@
+"""
+運転時間の予測
+
+送信したステップ数と速度、ドライバの加速・減速レートから台形（距離が短い場合は
+三角形）の速度プロファイルで運転時間を見積もる。実際の完了時刻との比を軸ごとに
+指数移動平均で学習し、予測を補正する。完了待ちのポーリングは予測完了時刻の
+少し前まで止めておき、その間のバス帯域を指令の送信に回す。
+"""
+
+import math
+import threading
+
+from register_map import AZ
+
+# ダイレクトデータ運転の加速・減速レート（単位 0.001 kHz/s = 1 step/s^2、1回で読む）
+PROFILE_BLOCK, = AZ.group('profile')
+ACCEL_RATE_ADDRESS = AZ.direct_accel.address
+DECEL_RATE_ADDRESS = AZ.direct_decel.address
+
+DEFAULT_ACCEL = 1000000    # step/s^2（1000 kHz/s）
+DEFAULT_DECEL = 1000000
+
+
+def trapezoid_time(distance, speed, accel, decel):
+    """
+    台形速度プロファイルでの運転時間を返す
+
+    Args:
+        distance (float): 移動量 [step]
+        speed (float): 運転速度 [step/s]
+        accel (float): 加速レート [step/s^2]
+        decel (float): 減速レート [step/s^2]
+
+    Returns:
+        float: 運転時間 [s]
+    """
+    distance = abs(distance)
+    if distance == 0 or speed <= 0:
+        return 0.0
+    ramp = speed * speed / (2 * accel) + speed * speed / (2 * decel)
+    if ramp >= distance:
+        # 運転速度に届かない三角形プロファイル
+        peak = math.sqrt(2 * distance * accel * decel / (accel + decel))
+        return peak / accel + peak / decel
+    return speed / accel + speed / decel + (distance - ramp) / speed
+
+
+class MotionEstimator:
+    """
+    軸ごとの加減速レートと補正係数を持つ運転時間の予測器
+
+    Args:
+        accel (float): 既定の加速レート [step/s^2]
+        decel (float): 既定の減速レート [step/s^2]
+        alpha (float): 補正係数の指数移動平均の重み
+    """
+
+    def __init__(self, accel=DEFAULT_ACCEL, decel=DEFAULT_DECEL, alpha=0.3):
+        self.accel = accel
+        self.decel = decel
+        self.alpha = alpha
+        self.profiles = {}    # デバイスID -> (加速レート, 減速レート)
+        self.scales = {}      # デバイスID -> 実測/予測 の比
+        self._lock = threading.Lock()
+
+    def load_profile(self, client, device_id):
+        """ドライバの加速・減速レートを1回の読み出しで取得する"""
+        res = client.read_holding_registers(address=PROFILE_BLOCK.address, count=PROFILE_BLOCK.count,
+                                            device_id=device_id)
+        if res.isError():
+            raise Exception(f"ID {device_id}: accel/decel read failed: {res}")
+        accel, decel = PROFILE_BLOCK.decode(res.registers)
+        self.set_profile(device_id, accel or self.accel, decel or self.decel)
+
+    def set_profile(self, device_id, accel, decel):
+        with self._lock:
+            self.profiles[device_id] = (accel, decel)
+
+    def has_profile(self, device_id):
+        return device_id in self.profiles
+
+    def predict(self, device_id, distance, speed):
+        """
+        補正済みの運転時間を返す
+
+        Returns:
+            float: 予測運転時間 [s]
+        """
+        accel, decel = self.profiles.get(device_id, (self.accel, self.decel))
+        return trapezoid_time(distance, speed, accel, decel) * self.scales.get(device_id, 1.0)
+
+    def observe(self, device_id, predicted, actual):
+        """
+        実際の完了時間で補正係数を更新する
+
+        Args:
+            predicted (float): predict() が返した予測時間 [s]
+            actual (float): 送信から完了を確認するまでの実測時間 [s]
+        """
+        if predicted <= 0 or actual <= 0:
+            return
+        with self._lock:
+            scale = self.scales.get(device_id, 1.0)
+            raw = predicted / scale
+            self.scales[device_id] = (1 - self.alpha) * scale + self.alpha * (actual / raw)
@@ -0,0 +1,279 @@
+"""
+モーター状態モデル
+
+多軸GUI向けに、各モーターの状態（有効/ID/スピード/ステップ/直近の送信結果/
+ライブステータス）を array ベースの列指向配列で保持する。
+ウィジェットは表示専用とし、送信処理はこのモデルを直接参照する。
+単軸のツール（lrd_manual.py）の状態は、軸ごとに1つの AxisStatus を上書きして使う。
+"""
+
+import threading
+from array import array
+
+from bus import READY_BIT, MOVE_BIT, START_STATUS_BIT, ALM_BIT, ENABLE_BIT
+
+# 直近の送信結果
+RESULT_NONE = 0
+RESULT_OK = 1
+RESULT_ERROR = 2
+RESULT_DONE = 3       # 送信後、運転完了を確認済み
+
+STATUS_UNKNOWN = -1
+
+# 編集可能な数値フィールドと許容範囲（レジスタへの書き込み形式に合わせる）
+FIELD_RANGES = {
+    'ids': (1, 247),
+    'speeds': (0, 0xFFFF),
+    'steps': (-0x80000000, 0x7FFFFFFF),
+}
+
+
+class MotorModel:
+    """N軸分のモーター状態を保持するモデル"""
+
+    def __init__(self, count, default_speed=100, default_step=100, first_id=1):
+        self.count = count
+        self.enabled = array('B', bytes(count))
+        self.ids = array('H', range(first_id, first_id + count))
+        self.speeds = array('i', [default_speed] * count)
+        self.steps = array('i', [default_step] * count)
+        self.results = array('B', bytes(count))
+        self.status = array('i', [STATUS_UNKNOWN] * count)
+        # 入力途中などで値が不正なフィールドのビットマスク（bit0:ID, bit1:Speed, bit2:Step）
+        self.invalid = array('B', bytes(count))
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def set_field(self, field, index, text):
+        """
+        入力文字列を検証してフィールドを更新する
+
+        Args:
+            field (str): 'ids' / 'speeds' / 'steps'
+            index (int): モーター番号（0始まり）
+            text (str): 入力文字列
+
+        Returns:
+            bool: 値が有効でモデルに反映された場合True
+        """
+        bit = 1 << list(FIELD_RANGES).index(field)
+        low, high = FIELD_RANGES[field]
+        try:
+            value = int(text)
+        except ValueError:
+            value = None
+        if value is None or not (low <= value <= high):
+            self.invalid[index] |= bit
+            return False
+        getattr(self, field)[index] = value
+        self.invalid[index] &= ~bit
+        return True
+
+    def set_enabled(self, index, flag):
+        self.enabled[index] = 1 if flag else 0
+
+    def set_all_enabled(self, flag):
+        value = 1 if flag else 0
+        for i in range(self.count):
+            self.enabled[i] = value
+
+    def selected(self):
+        """有効なモーター番号の一覧を返す"""
+        return [i for i in range(self.count) if self.enabled[i]]
+
+    def set_result(self, index, result):
+        self.results[index] = result
+        self.mark_dirty(index)
+
+    def set_status(self, index, value):
+        """ライブステータスを更新する（ポーリングスレッドから呼ばれる）"""
+        if self.status[index] != value:
+            self.status[index] = value
+            self.mark_dirty(index)
+
+    def mark_dirty(self, index):
+        with self._lock:
+            self._dirty.add(index)
+
+    def take_dirty(self):
+        """更新が必要なモーター番号を取り出す"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def describe(self, index):
+        """タイルに表示する (テキスト, 色) を返す"""
+        status = self.status[index]
+        result = self.results[index]
+        if status == STATUS_UNKNOWN:
+            text, fg = "--", "gray"
+        elif status & ALM_BIT:
+            text, fg = "ALARM", "red"
+        elif status & MOVE_BIT:
+            text, fg = "MOVE", "blue"
+        elif status & READY_BIT:
+            text, fg = "READY", "green"
+        else:
+            text, fg = "BUSY", "orange"
+        if result == RESULT_OK:
+            text += " / OK"
+        elif result == RESULT_DONE:
+            text += " / DONE"
+        elif result == RESULT_ERROR:
+            text += " / ERR"
+            fg = "red"
+        return text, fg
+
+
+class AxisStatus:
+    """
+    1軸分の状態1・状態2
+
+    読み出しのたびに新しい辞書を作らず、同じオブジェクトを update() で上書きする。
+    従来の状態の辞書と同じキーでも参照できる（info['alarm'] など）。
+    次の読み出し後も値を残しておく場合は snapshot() で辞書にする。
+    """
+
+    __slots__ = ('device_id', 'status1', 'status2')
+
+    KEYS = ('ready', 'move', 'start_status', 'alarm', 'enable', 'status1_raw', 'status2_raw')
+
+    def __init__(self, device_id=0, status1=0, status2=0):
+        self.device_id = device_id
+        self.status1 = status1
+        self.status2 = status2
+
+    def update(self, status1, status2):
+        self.status1 = status1
+        self.status2 = status2
+        return self
+
+    @property
+    def ready(self):
+        return bool(self.status1 & READY_BIT)       # 運転可能かどうか
+
+    @property
+    def move(self):
+        return bool(self.status1 & MOVE_BIT)        # 運転中かどうか
+
+    @property
+    def start_status(self):
+        return bool(self.status1 & START_STATUS_BIT)  # STARTの状態
+
+    @property
+    def alarm(self):
+        return bool(self.status1 & ALM_BIT)         # アラーム
+
+    @property
+    def enable(self):
+        return bool(self.status2 & ENABLE_BIT)      # モーター励磁中かどうか
+
+    @property
+    def status1_raw(self):
+        return self.status1
+
+    @property
+    def status2_raw(self):
+        return self.status2
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self):
+        return self.KEYS
+
+    def snapshot(self):
+        return {key: getattr(self, key) for key in self.KEYS}
+
+    def __repr__(self):
+        return f"AxisStatus({self.snapshot()})"
+
+
+class StatusStore:
+    """デバイスIDごとの AxisStatus（初回の読み出しで作り、以降は上書きする）"""
+
+    def __init__(self):
+        self._axes = {}
+
+    def update(self, device_id, status1, status2):
+        axis = self._axes.get(device_id)
+        if axis is None:
+            axis = self._axes[device_id] = AxisStatus(device_id)
+        return axis.update(status1, status2)
+
+    def get(self, device_id):
+        return self._axes.get(device_id)
+
+
+class RefreshScheduler:
+    """
+    ウィジェット更新を1回の after にまとめるスケジューラ
+
+    モデルの変更はダーティ印だけを付け、Tkスレッド上の after コールバックで
+    変更のあったタイルのみをまとめて再描画する。
+    """
+
+    def __init__(self, widget, model, apply, delay_ms=30):
+        self.widget = widget
+        self.model = model
+        self.apply = apply
+        self.delay_ms = delay_ms
+        self._pending = None
+        self._interval = None
+
+    def request(self):
+        """Tkスレッドから更新を要求する（既に予約済みなら何もしない）"""
+        if self._pending is None:
+            self._pending = self.widget.after(self.delay_ms, self._flush)
+
+    def start_periodic(self, interval_ms):
+        """バックグラウンドスレッドからの更新を拾うため定期的にフラッシュする"""
+        self._interval = interval_ms
+        self.request()
+
+    def stop_periodic(self):
+        self._interval = None
+
+    def _flush(self):
+        self._pending = None
+        # 変更がなくても呼ぶ（ワーカースレッドからのメッセージ表示などに使う）
+        self.apply(self.model.take_dirty())
+        if self._interval is not None:
+            self._pending = self.widget.after(self._interval, self._flush)
+
+
+def bind_entry(entry, model, field, get_index, invalid_bg="#ffd0d0"):
+    """
+    Entry を編集時検証でモデルに結び付ける
+
+    数字と符号以外のキー入力は拒否し、入力途中の不完全な値は背景色で示す。
+    仮想スクロールでタイルを使い回せるよう、対象モーターは get_index() で都度引く。
+    """
+    normal_bg = entry.cget("bg")
+
+    def validate(text):
+        digits = text[1:] if text.startswith("-") else text
+        if digits and not digits.isdigit():
+            return False
+        ok = model.set_field(field, get_index(), text)
+        entry.config(bg=normal_bg if ok else invalid_bg)
+        return True
+
+    vcmd = (entry.register(validate), "%P")
+    entry.config(validate="key", validatecommand=vcmd)
+    entry.normal_bg = normal_bg
+
+
+def load_entry(entry, model, field, index):
+    """
+    検証を一時停止してモデルの値を Entry に表示する
+
+    入力途中の不正な値は破棄し、モデルが保持する最後の有効値に戻す。
+    """
+    entry.config(validate="none")
+    entry.delete(0, "end")
+    entry.insert(0, str(getattr(model, field)[index]))
+    model.invalid[index] &= ~(1 << list(FIELD_RANGES).index(field))
+    entry.config(bg=entry.normal_bg, validate="key")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Parameter snapshot, diff and minimal restore for a whole driver fleet
+
+  snapshot  Read a declared parameter set from every driver on the bus
+            (contiguous parameters are merged into maximal block reads)
+            and store it in a versioned JSON file.
+  diff      Compare two snapshots, or a snapshot against live hardware.
+  restore   Write only the registers that differ from the snapshot, followed
+            by a single NV write per changed driver.
+
+Usage:
+  python3 src/param_snapshot.py snapshot fleet.json [--ids 1-28]
+  python3 src/param_snapshot.py diff fleet.json [other.json | live]
+  python3 src/param_snapshot.py restore fleet.json [--ids 5]
+"""
+
+import argparse
+import datetime
+import json
+import sys
+
+from bus import *
+from config_txn import ConfigTransaction
+from register_map import AZ
+from util import *
+
+SNAPSHOT_FORMAT = "oriental-motor-parameter-snapshot"
+SNAPSHOT_VERSION = 1
+SCAN_TIMEOUT = 0.05
+
+# 既定のパラメータセット: (名前, アドレス, レジスタ数)（register_map.py の AZ の表から）
+# 2レジスタのパラメータは符号付き32ビット、1レジスタは符号なし16ビットとして扱う
+DEFAULT_PARAMETERS = [(name, AZ[name].address, AZ[name].count) for name in (
+    "rotation_direction", "slave_id", "position_no1", "position_no2",
+    "velocity_no1", "velocity_no2", "drive_method_no1", "drive_method_no2")]
+
+# 復元時に書き込まないパラメータ（IDは provision_ids.py で設定する）
+READ_ONLY_PARAMETERS = {"slave_id"}
+
+
+def load_parameters(path):
+    """
+    パラメータセットをJSONファイルから読み込む
+
+    形式: [{"name": "rotation_direction", "address": 900, "count": 2}, ...]
+    """
+    with open(path) as f:
+        return [(p["name"], int(p["address"]), int(p.get("count", 2))) for p in json.load(f)]
+
+
+def decode(words):
+    return hex_to_decimal(*words) if len(words) == 2 else words[0]
+
+
+def read_parameters(client, device_id, parameters, max_gap=0):
+    """
+    1台分のパラメータをブロック読み出しでまとめて読む
+
+    Returns:
+        dict: パラメータ名 -> 値
+    """
+    names = {(address, count): name for name, address, count in parameters}
+    values = {}
+    for start, length, members in plan_blocks(names, MAX_READ_COUNT, max_gap):
+        res = client.read_holding_registers(address=start, count=length, device_id=device_id)
+        if res.isError():
+            raise Exception(f"ID {device_id}: read of 0x{start:04X}+{length} failed: {res}")
+        for address, count in members:
+            offset = address - start
+            values[names[(address, count)]] = decode(res.registers[offset:offset + count])
+    return values
+
+
+def discover(ids):
+    """短いタイムアウトで応答するドライバを探す"""
+    client = create_client(timeout=SCAN_TIMEOUT, retries=0)
+    if not client.connect():
+        raise Exception(f"Cannot open port {MODBUS_PORT}")
+    try:
+        return sorted(scan_ids(client, ids))
+    finally:
+        client.close()
+
+
+def take_snapshot(client, ids, parameters, max_gap=0):
+    """
+    指定したドライバのパラメータを読み出してスナップショットを作る
+
+    Returns:
+        dict: スナップショット（JSONにそのまま保存できる形式）
+    """
+    drivers = {}
+    for device_id in ids:
+        drivers[str(device_id)] = read_parameters(client, device_id, parameters, max_gap)
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "port": MODBUS_PORT,
+        "baudrate": MODBUS_BAUDRATE,
+        "parameters": [{"name": n, "address": a, "count": c} for n, a, c in parameters],
+        "drivers": drivers,
+    }
+
+
+def load_snapshot(path):
+    with open(path) as f:
+        snapshot = json.load(f)
+    if snapshot.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not a parameter snapshot")
+    if snapshot.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"{path} has unsupported snapshot version {snapshot['version']}")
+    return snapshot
+
+
+def snapshot_parameters(snapshot):
+    return [(p["name"], p["address"], p["count"]) for p in snapshot["parameters"]]
+
+
+def diff_snapshots(old, new):
+    """
+    2つのスナップショットを比較する
+
+    Returns:
+        list: (ID, パラメータ名, 旧値, 新値) の一覧（片方にしかない場合は None）
+    """
+    changes = []
+    ids = sorted(set(old["drivers"]) | set(new["drivers"]), key=int)
+    for device_id in ids:
+        a = old["drivers"].get(device_id, {})
+        b = new["drivers"].get(device_id, {})
+        for name in sorted(set(a) | set(b)):
+            if a.get(name) != b.get(name):
+                changes.append((int(device_id), name, a.get(name), b.get(name)))
+    return changes
+
+
+def restore(client, snapshot, ids=None, max_gap=0):
+    """
+    スナップショットと異なるレジスタだけを書き込み、変更のあったドライバに
+    不揮発メモリ書き込みを1回だけ送る
+
+    Returns:
+        list: 書き込んだ (ID, パラメータ名, 旧値, 新値) の一覧
+    """
+    parameters = snapshot_parameters(snapshot)
+    targets = [int(i) for i in snapshot["drivers"]] if ids is None else ids
+    live = take_snapshot(client, targets, parameters, max_gap)
+    wanted = {"drivers": {str(i): snapshot["drivers"][str(i)] for i in targets}}
+    changes = [c for c in diff_snapshots(live, wanted)
+               if c[1] not in READ_ONLY_PARAMETERS and c[3] is not None]
+
+    # 差分だけをステージし、ドライバごとに不揮発メモリ書き込み1回でコミットする
+    layout = {name: (address, count) for name, address, count in parameters}
+    txn = ConfigTransaction(configure=False)
+    for device_id, name, _, value in changes:
+        address, count = layout[name]
+        txn.stage(device_id, address, value, count)
+    for (_, device_id), error in txn.commit({txn.port: client}).items():
+        if error is not None:
+            raise Exception(f"ID {device_id}: restore failed: {error}")
+    return changes
+
+
+def print_changes(changes):
+    if not changes:
+        print("No differences")
+    for device_id, name, old, new in changes:
+        print(f"ID {device_id:>3}  {name:<24} {old} -> {new}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot, diff and restore driver parameters")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("snapshot", help="dump parameters of every driver on the bus")
+    p.add_argument("output")
+    p.add_argument("--ids", default="1-31", help="IDs to scan, e.g. 1-28 or 2,5,7")
+    p.add_argument("--params", help="JSON parameter set (default: built-in set)")
+
+    p = sub.add_parser("diff", help="compare two snapshots, or a snapshot against live hardware")
+    p.add_argument("old")
+    p.add_argument("new", nargs="?", default="live")
+
+    p = sub.add_parser("restore", help="write back only the differing registers")
+    p.add_argument("snapshot")
+    p.add_argument("--ids", help="restore only these IDs")
+
+    for p in sub.choices.values():
+        p.add_argument("--max-gap", type=int, default=0, help="unused registers a block read may span")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        parameters = load_parameters(args.params) if args.params else DEFAULT_PARAMETERS
+        ids = discover(parse_ids(args.ids))
+        print(f"Found drivers: {ids}")
+    else:
+        old = load_snapshot(args.old if args.command == "diff" else args.snapshot)
+        parameters = snapshot_parameters(old)
+        ids = [int(i) for i in old["drivers"]]
+
+    if args.command == "diff" and args.new != "live":
+        print_changes(diff_snapshots(old, load_snapshot(args.new)))
+        return
+
+    client = create_client()
+    if not client.connect():
+        raise Exception(f"Cannot open port {MODBUS_PORT}")
+    try:
+        if args.command == "snapshot":
+            snapshot = take_snapshot(client, ids, parameters, args.max_gap)
+            with open(args.output, "w") as f:
+                json.dump(snapshot, f, indent=2)
+            print(f"Saved {len(ids)} driver(s) to {args.output}")
+        elif args.command == "diff":
+            print_changes(diff_snapshots(old, take_snapshot(client, ids, parameters, args.max_gap)))
+        else:
+            changes = restore(client, old, parse_ids(args.ids) if args.ids else None, args.max_gap)
+            print_changes(changes)
+            print(f"Restored {len({c[0] for c in changes})} driver(s)")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
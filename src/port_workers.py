@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Process-per-port workers with a shared-memory status table
+
+Each RS-485 port is polled by its own process, so the GIL and Tk cannot delay
+its I/O. Workers publish the latest STATUS_1/2, position, error count and
+timestamp of every axis into a multiprocessing.shared_memory table. Each
+record is guarded by a sequence number (seqlock): the writer makes it odd
+while updating and even when done, and a reader retries if the number changed
+or was odd. Readers (GUIs, other programs) map the table by name and read it
+without any IPC round trip.
+
+Run the workers (one process per --port):
+    python3 src/port_workers.py --port /dev/ttyUSB0=1-14 --port /dev/ttyUSB1=1-14
+Read the table from another process:
+    python3 src/port_workers.py --attach axis_status
+    python3 src/axis_controller.py --status-table axis_status     # Live Status reads the table
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from bus import *
+from register_map import AZ
+from util import parse_ids
+
+DEFAULT_TABLE_NAME = "axis_status"
+POSITION = AZ.detected_position   # 検出位置（AZシリーズ）
+
+TABLE_MAGIC = b"AXST"
+TABLE_VERSION = 2
+_HEADER = struct.Struct('<4sHHH6x')         # マジック, バージョン, スロット数, ポート数
+_PORT_NAME = struct.Struct('<64s')          # ポートごとのデバイス名（ワーカーが開いているポート）
+_PORT_COUNTER = struct.Struct('<Q')         # ポートごとの完了した巡回数
+_SEQ = struct.Struct('<I')
+_BODY = struct.Struct('<HHHHH2xiId')        # ID, ポート, 状態1, 状態2, フラグ, 位置, エラー数, 時刻
+RECORD_SIZE = _SEQ.size + _BODY.size        # 32 バイト
+FLAG_VALID = 0x01       # 一度でも読めた
+FLAG_OK = 0x02          # 最後の読み出しが成功した
+SEQLOCK_RETRIES = 10000
+
+
+class StatusRecord:
+    """
+    状態テーブルの1レコードの写し
+
+    motor_model.AxisStatus（ポーリングした状態1・2）とは別に、ポート番号・位置・エラー数・時刻を持つ。
+    StatusTable.read(slot, record) で同じオブジェクトを上書きして使い回せる。
+    """
+
+    __slots__ = ('device_id', 'port', 'status1', 'status2', 'flags', 'position', 'errors', 'timestamp')
+
+    def __init__(self, device_id=0, port=0, status1=0, status2=0, flags=0, position=0, errors=0, timestamp=0.0):
+        self.update(device_id, port, status1, status2, flags, position, errors, timestamp)
+
+    def update(self, device_id, port, status1, status2, flags, position, errors, timestamp):
+        """レコードの値をその場で書き換える"""
+        self.device_id = device_id
+        self.port = port              # ポート番号（PortWorkers に渡した順）
+        self.status1 = status1
+        self.status2 = status2
+        self.flags = flags
+        self.position = position
+        self.errors = errors          # 累計の通信エラー数
+        self.timestamp = timestamp    # 最後に成功した読み出しの time.monotonic()（全プロセス共通）
+        return self
+
+    @property
+    def ok(self):
+        return bool(self.flags & FLAG_OK)
+
+    @property
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+
+def _attach(name, track):
+    """
+    既存の共有メモリに接続する
+
+    track=False の場合、接続しただけのプロセスが終了時に共有メモリを削除しないよう
+    resource_tracker の管理から外す（Python 3.13 以降の track=False と同じ）。
+    PortWorkers が起動したワーカーは作成したプロセスと resource_tracker を共有するため track=True で接続する。
+    """
+    if track:
+        return shared_memory.SharedMemory(name=name)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class StatusTable:
+    """
+    共有メモリ上の軸状態テーブル
+
+    Args:
+        name (str): 共有メモリの名前
+        slots (list): 作成する場合のスロットの並び [(ポート番号, デバイスID), ...]。None の場合は既存のものに接続する
+        ports (list): 作成する場合のポートのデバイス名（ポート番号の順）
+        track (bool): 既存のものに接続する場合に resource_tracker の管理下に置くか（通常は False）
+    """
+
+    def __init__(self, name=DEFAULT_TABLE_NAME, slots=None, ports=(MODBUS_PORT,), track=False):
+        self.name = name
+        if slots is None:
+            self.shm = _attach(name, track)
+            magic, version, count, port_count = _HEADER.unpack_from(self.shm.buf, 0)
+            if magic != TABLE_MAGIC or version != TABLE_VERSION:
+                self.shm.close()
+                raise ValueError(f"{name}: not an axis status table (version {TABLE_VERSION})")
+            self.port_names = [
+                _PORT_NAME.unpack_from(self.shm.buf, _HEADER.size + i * _PORT_NAME.size)[0].rstrip(b'\0').decode()
+                for i in range(port_count)]
+        else:
+            count = len(slots)
+            self.port_names = list(ports)
+            port_count = len(self.port_names)
+            size = _HEADER.size + port_count * (_PORT_NAME.size + _PORT_COUNTER.size) + count * RECORD_SIZE
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _HEADER.pack_into(self.shm.buf, 0, TABLE_MAGIC, TABLE_VERSION, count, port_count)
+            for i, port in enumerate(self.port_names):
+                _PORT_NAME.pack_into(self.shm.buf, _HEADER.size + i * _PORT_NAME.size, port.encode())
+        self.count = count
+        self.ports = port_count
+        self._counters = _HEADER.size + port_count * _PORT_NAME.size
+        self._records = self._counters + port_count * _PORT_COUNTER.size
+        if slots is not None:
+            for slot, (port, device_id) in enumerate(slots):
+                self._init_record(slot, port, device_id)
+        # スロットの並び [(ポート, デバイスID), ...] と (ポート, デバイスID) -> スロット
+        self.layout = []
+        self.slots = {}
+        for slot in range(count):
+            record = self.read(slot)
+            self.layout.append((record.port, record.device_id))
+            self.slots[(record.port, record.device_id)] = slot
+
+    def _init_record(self, slot, port, device_id):
+        offset = self._records + slot * RECORD_SIZE
+        _SEQ.pack_into(self.shm.buf, offset, 0)
+        _BODY.pack_into(self.shm.buf, offset + _SEQ.size, device_id, port, 0, 0, 0, 0, 0, 0.0)
+
+    def lookup(self, port, device_id):
+        """ポート番号とデバイスIDのスロット（ポートごとに同じIDを使ってよい）"""
+        return self.slots.get((port, device_id))
+
+    # ---- 書き込み（スロットごとに書き込むプロセスは1つ） ----
+
+    def write(self, slot, status1, status2, position, ok=True):
+        """スロットを更新する。ok=False の場合は状態を保持したままエラー数を増やす"""
+        buf = self.shm.buf
+        offset = self._records + slot * RECORD_SIZE
+        seq = _SEQ.unpack_from(buf, offset)[0]
+        device_id, port, old1, old2, flags, old_position, errors, timestamp = \
+            _BODY.unpack_from(buf, offset + _SEQ.size)
+        _SEQ.pack_into(buf, offset, seq + 1)      # 奇数: 更新中
+        if ok:
+            _BODY.pack_into(buf, offset + _SEQ.size, device_id, port, status1, status2,
+                            FLAG_VALID | FLAG_OK, position, errors, time.monotonic())
+        else:
+            _BODY.pack_into(buf, offset + _SEQ.size, device_id, port, old1, old2,
+                            flags & ~FLAG_OK, old_position, errors + 1, timestamp)
+        _SEQ.pack_into(buf, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def count_cycle(self, port):
+        offset = self._counters + port * _PORT_COUNTER.size
+        _PORT_COUNTER.pack_into(self.shm.buf, offset, _PORT_COUNTER.unpack_from(self.shm.buf, offset)[0] + 1)
+
+    # ---- 読み出し ----
+
+    def read(self, slot, record=None):
+        """
+        スロットの一貫したスナップショットを返す
+
+        Args:
+            record (StatusRecord): 上書きするレコード（None の場合は新しく作る）。
+                ポーリングのループでは同じレコードを渡して読み出しごとの生成を避ける
+
+        Returns:
+            StatusRecord: 書き込み側が更新し続けて読めなかった場合は None
+        """
+        buf = self.shm.buf
+        offset = self._records + slot * RECORD_SIZE
+        for _ in range(SEQLOCK_RETRIES):
+            before = _SEQ.unpack_from(buf, offset)[0]
+            if before & 1:
+                continue
+            body = _BODY.unpack_from(buf, offset + _SEQ.size)
+            if _SEQ.unpack_from(buf, offset)[0] == before:
+                return StatusRecord(*body) if record is None else record.update(*body)
+        return None
+
+    def snapshot(self):
+        return [self.read(slot) for slot in range(self.count)]
+
+    def cycles(self, port):
+        return _PORT_COUNTER.unpack_from(self.shm.buf, self._counters + port * _PORT_COUNTER.size)[0]
+
+    def owns_port(self, port):
+        """port（デバイス名）がワーカーのポーリングしているポートか（シンボリックリンクは解決して比べる）"""
+        path = os.path.realpath(port)
+        return any(os.path.realpath(name) == path for name in self.port_names)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _port_worker(port_index, port, axes, table_name, commands, failures, stop, interval, read_position):
+    """1ポート分の I/O を担当するプロセス"""
+    table = StatusTable(table_name, track=True)
+    slots = [table.slots[(port_index, device_id)] for device_id in axes]
+    client = create_client(port=port)
+    if not client.connect():
+        print(f"ERROR: Cannot open port {port}")
+        table.close()
+        return
+    try:
+        while not stop.is_set():
+            for device_id, slot in zip(axes, slots):
+                # 指令は状態読み出しより優先する（1軸読むごとに確認する）
+                _send_commands(client, port_index, commands, failures)
+                try:
+                    status1, status2 = read_status(client, device_id)
+                    position = 0
+                    if read_position:
+                        res = check(client.read_holding_registers(address=POSITION.address, count=POSITION.count,
+                                                                  device_id=device_id),
+                                    f"ID {device_id}: position read")
+                        position = POSITION.decode(res.registers)
+                    table.write(slot, status1, status2, position)
+                except Exception:
+                    table.write(slot, 0, 0, 0, ok=False)
+            table.count_cycle(port_index)
+            if interval:
+                stop.wait(interval)
+    finally:
+        client.close()
+        table.close()
+
+
+def _send_commands(client, port_index, commands, failures):
+    """依頼された書き込みをすべて送る。失敗は failures で依頼した側に返す"""
+    while True:
+        try:
+            device_id, address, values = commands.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            check(client.write_registers(address=address, values=values, device_id=device_id),
+                  f"ID {device_id}: write 0x{address:04X}")
+        except Exception as e:
+            failures.put((port_index, device_id, address, str(e)))
+
+
+class PortWorkers:
+    """
+    ポートごとのワーカープロセスと状態テーブル
+
+    Args:
+        port_axes (list): [(ポート, [デバイスID, ...]), ...]
+        name (str): 状態テーブルの名前
+        interval (float): 1巡ごとの待ち時間 [s]（0 で連続ポーリング）
+        read_position (bool): 状態に加えて位置も読む
+    """
+
+    def __init__(self, port_axes, name=DEFAULT_TABLE_NAME, interval=0.0, read_position=True):
+        self.port_axes = list(port_axes)
+        self.name = name
+        self.interval = interval
+        self.read_position = read_position
+        # Tk を持つプロセスを fork しないよう spawn で起動する
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = self._context.Event()
+        self._commands = [self._context.Queue() for _ in self.port_axes]
+        self._failures = self._context.Queue()      # 失敗した書き込み（全ポート共通）
+        self._processes = []
+        self.table = None
+
+    def start(self):
+        slots = [(port_index, device_id)
+                 for port_index, (_, axes) in enumerate(self.port_axes) for device_id in axes]
+        self.table = StatusTable(self.name, slots=slots, ports=[port for port, _ in self.port_axes])
+        for port_index, (port, axes) in enumerate(self.port_axes):
+            process = self._context.Process(
+                target=_port_worker, name=f"port-{port}", daemon=True,
+                args=(port_index, port, axes, self.name, self._commands[port_index], self._failures,
+                      self._stop, self.interval, self.read_position))
+            process.start()
+            self._processes.append(process)
+        return self
+
+    def send(self, port_index, device_id, address, values):
+        """ポートのワーカーに書き込みを依頼する（次の軸の読み出しの前に送られる）"""
+        self._commands[port_index].put((device_id, address, list(values)))
+
+    def failures(self):
+        """
+        send() で依頼して失敗した書き込みを取り出す（待たずに、届いている分だけ）
+
+        Returns:
+            list: [(ポート番号, デバイスID, アドレス, エラーの内容), ...]
+        """
+        failed = []
+        while True:
+            try:
+                failed.append(self._failures.get_nowait())
+            except queue.Empty:
+                return failed
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        if self.table:
+            self.table.close()
+            self.table.unlink()
+            self.table = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def parse_port_axes(text):
+    """'/dev/ttyUSB0=1-14' を (ポート, [1, ..., 14]) にする"""
+    port, sep, ids = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected PORT=IDS, got {text!r}")
+    return port, parse_ids(ids)
+
+
+def print_table(table):
+    for port, name in enumerate(table.port_names):
+        print(f"port {port} ({name}): {table.cycles(port)} cycle(s)")
+    for record in table.snapshot():
+        if record is None:
+            continue
+        state = "ok" if record.ok else ("stale" if record.flags else "no data")
+        print(f"  port {record.port} ID {record.device_id:>3}: status 0x{record.status1:04X} 0x{record.status2:04X} "
+              f"position {record.position:>10} errors {record.errors:>4} {state}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll each RS-485 port in its own process")
+    parser.add_argument("--port", action="append", type=parse_port_axes, default=[], metavar="PORT=IDS",
+                        help="port and its axes, e.g. /dev/ttyUSB0=1-14 (repeat per port)")
+    parser.add_argument("--name", default=DEFAULT_TABLE_NAME, help="shared-memory table name")
+    parser.add_argument("--interval", type=float, default=0.0, help="pause after each polling cycle [s]")
+    parser.add_argument("--no-position", action="store_true", help="read status only")
+    parser.add_argument("--attach", metavar="NAME", help="print an existing table and exit")
+    args = parser.parse_args()
+
+    if args.attach:
+        table = StatusTable(args.attach)
+        try:
+            print_table(table)
+        finally:
+            table.close()
+        raise SystemExit(0)
+
+    port_axes = args.port or [(MODBUS_PORT, list(range(1, AXIS_COUNT + 1)))]
+    with PortWorkers(port_axes, args.name, args.interval, not args.no_position) as workers:
+        print(f"Publishing {sum(len(axes) for _, axes in port_axes)} axes to '{args.name}' "
+              f"from {len(port_axes)} process(es); Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(1.0)
+                for port_index, device_id, address, error in workers.failures():
+                    print(f"{port_axes[port_index][0]}: write 0x{address:04X} to ID {device_id} failed: {error}")
+                print(", ".join(f"{port}: {workers.table.cycles(i)} cycles"
+                                for i, (port, _) in enumerate(port_axes)))
+        except KeyboardInterrupt:
+            pass
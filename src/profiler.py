@@ -0,0 +1,221 @@
+"""
+プロファイリングモード
+
+--profile を付けて起動すると、Tk のコールバック、レジスタ値の変換、pymodbus の呼び出し、
+シリアルの送受信に計測用のフックを入れ、終了時に経過時間を GUI / ホストCPU / 通信待ちに
+分けたレポートを出力する。バッチが遅いときに、ホスト側とバス側のどちらが律速かを
+外部ツールなしで切り分けるために使う。
+
+各区間は入れ子を差し引いた正味の時間で集計する（Tk コールバックの中の Modbus 呼び出しは
+GUI ではなく Modbus 側に数える）。集計はスレッドごとに行い、レポート時に合算する。
+
+使用例:
+    profiler = Profiler.from_args(args)     # --profile がなければ None
+    if profiler:
+        profiler.install_tk()
+        profiler.instrument_client(client)
+        profiler.instrument_module(sys.modules[__name__])
+        profiler.start()
+"""
+
+import atexit
+import cProfile
+import sys
+import threading
+import time
+import tkinter as tk
+
+# カテゴリ
+GUI = 'gui'            # Tk のコールバック（イベント・after）
+ENCODE = 'encode'      # レジスタ値の変換
+MODBUS = 'modbus'      # pymodbus 内の処理（フレーム生成・CRC・応答の解析）
+WIRE = 'wire'          # シリアルの送信と応答待ち・受信
+
+CATEGORY_LABELS = [
+    (GUI, "GUI (Tk callbacks)"),
+    (ENCODE, "register encoding"),
+    (MODBUS, "pymodbus host CPU"),
+    (WIRE, "waiting on the wire"),
+]
+
+# 計測する pymodbus クライアントのメソッド
+CLIENT_METHODS = ('read_holding_registers', 'read_input_registers', 'write_register', 'write_registers',
+                  'readwrite_registers')
+
+# 計測するレジスタ値の変換関数（util.py）
+ENCODE_FUNCTIONS = ('decimal_to_hex', 'hex_to_decimal')
+
+
+def add_profile_arguments(parser):
+    """エントリポイントの argparse に --profile / --profile-cprofile を追加する"""
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="REPORT",
+                        help="time GUI, host CPU and wire; write the report on exit (default: stdout)")
+    parser.add_argument("--profile-cprofile", default=None, metavar="FILE",
+                        help="with --profile, also capture cProfile stats of the main thread to FILE")
+
+
+class _Frame:
+    __slots__ = ('category', 'start', 'child')
+
+    def __init__(self, category, start):
+        self.category = category
+        self.start = start
+        self.child = 0.0
+
+
+class Profiler:
+    """
+    区間ごとの正味時間を集計する
+
+    Args:
+        report_path (str): レポートの出力先。'-' は標準出力
+        cprofile_path (str): cProfile の統計の出力先（None の場合は取得しない）
+    """
+
+    def __init__(self, report_path="-", cprofile_path=None):
+        self.report_path = report_path
+        self.cprofile_path = cprofile_path
+        self._local = threading.local()
+        self._threads = []          # スレッドごとの {カテゴリ: [回数, 時間]}
+        self._threads_lock = threading.Lock()
+        self._restore = []
+        self._cprofile = None
+        self._started = None
+        self._cpu_started = None
+        self._finished = False
+
+    @classmethod
+    def from_args(cls, args):
+        """add_profile_arguments() で追加した引数から生成する。--profile がなければ None"""
+        if args.profile is None:
+            return None
+        return cls(args.profile, args.profile_cprofile)
+
+    # ---- 計測 ----
+
+    def _state(self):
+        local = self._local
+        if not hasattr(local, 'stack'):
+            local.stack = []
+            local.totals = {}
+            with self._threads_lock:
+                self._threads.append((threading.current_thread().name, local.totals))
+        return local
+
+    def wrap(self, func, category):
+        """func の呼び出しを category の区間として計測する関数を返す"""
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            local = self._state()
+            stack = local.stack
+            frame = _Frame(category, perf_counter())
+            stack.append(frame)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - frame.start
+                stack.pop()
+                if stack:
+                    stack[-1].child += elapsed
+                entry = local.totals.get(category)
+                if entry is None:
+                    entry = local.totals[category] = [0, 0.0]
+                entry[0] += 1
+                entry[1] += elapsed - frame.child
+
+        timed.__wrapped__ = func
+        return timed
+
+    def install_tk(self):
+        """Tk のコールバックを計測する（ウィジェットの生成前に呼ぶ）"""
+        original = tk.CallWrapper.__call__
+        tk.CallWrapper.__call__ = self.wrap(original, GUI)
+        self._restore.append(lambda: setattr(tk.CallWrapper, '__call__', original))
+
+    def instrument_client(self, client):
+        """pymodbus クライアントの API 呼び出しとシリアルの送受信を計測する"""
+        for name in CLIENT_METHODS:
+            if hasattr(client, name):
+                setattr(client, name, self.wrap(getattr(client, name), MODBUS))
+        for name in ('send', 'recv', '_wait_silent'):
+            if hasattr(client, name):
+                setattr(client, name, self.wrap(getattr(client, name), WIRE))
+        # 同期クライアントのトランザクション管理は生成時に send を保持している
+        transaction = getattr(client, 'transaction', None)
+        if transaction is not None and hasattr(transaction, 'low_level_send'):
+            transaction.low_level_send = client.send
+
+    def instrument_module(self, module):
+        """モジュールに import されたレジスタ値の変換関数を計測する"""
+        for name in ENCODE_FUNCTIONS:
+            func = getattr(module, name, None)
+            if func is not None and not hasattr(func, '__wrapped__'):
+                setattr(module, name, self.wrap(func, ENCODE))
+
+    # ---- 開始・終了 ----
+
+    def start(self):
+        """計測を開始し、終了時にレポートを出力するよう登録する"""
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        if self.cprofile_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        atexit.register(self.finish)
+
+    def finish(self):
+        """計測を終了してレポートを出力する（複数回呼ばれても1回だけ出力する）"""
+        if self._finished or self._started is None:
+            return
+        self._finished = True
+        if self._cprofile:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+        for restore in self._restore:
+            restore()
+        text = self.report()
+        if self.report_path == "-":
+            print(text)
+        else:
+            with open(self.report_path, "w") as f:
+                f.write(text + "\n")
+            print(f"Profile report written to {self.report_path}", file=sys.stderr)
+
+    # ---- レポート ----
+
+    def totals(self):
+        """全スレッドを合算した {カテゴリ: (回数, 正味時間)}"""
+        merged = {}
+        with self._threads_lock:
+            threads = list(self._threads)
+        for _, totals in threads:
+            for category, (count, seconds) in list(totals.items()):
+                c, s = merged.get(category, (0, 0.0))
+                merged[category] = (c + count, s + seconds)
+        return merged
+
+    def report(self):
+        wall = time.perf_counter() - self._started
+        cpu = time.process_time() - self._cpu_started
+        totals = self.totals()
+        lines = [f"Profile: wall {wall:.3f} s, process CPU {cpu:.3f} s, {len(self._threads)} thread(s)",
+                 f"  {'':<22}{'calls':>8}{'total s':>10}{'mean ms':>10}{'% wall':>8}"]
+        busy = 0.0
+        for category, label in CATEGORY_LABELS:
+            count, seconds = totals.get(category, (0, 0.0))
+            busy += seconds
+            mean = seconds / count * 1000 if count else 0.0
+            lines.append(f"  {label:<22}{count:>8}{seconds:>10.3f}{mean:>10.3f}{seconds / wall:>8.1%}")
+        lines.append(f"  {'idle / untracked':<22}{'':>8}{max(0.0, wall - busy):>10.3f}")
+        host = sum(totals.get(c, (0, 0.0))[1] for c in (GUI, ENCODE, MODBUS))
+        wire = totals.get(WIRE, (0, 0.0))[1]
+        if host + wire > 0:
+            bound = "bus-bound" if wire >= host else "host-bound"
+            lines.append(f"  -> {bound}: wire {wire:.3f} s vs host {host:.3f} s "
+                         f"({wire / (host + wire):.0%} of tracked time on the wire)")
+        if busy > wall:
+            lines.append("  (worker threads overlap the GUI thread, so totals can exceed wall time)")
+        if self.cprofile_path:
+            lines.append(f"  cProfile stats (main thread): {self.cprofile_path}")
+        return "\n".join(lines)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Bulk chain ID provisioning
+
+Assigns new slave IDs to every driver of a chain from a wiring-order plan.
+Each driver receives exactly one ID write (1380h) and one NV write (0192h),
+the whole chain is restarted once, and the result is verified with a single
+fast scan instead of a separate check_id.py run per driver.
+
+The new ID only becomes active after the restart, so drivers can be renamed
+in any order (even swapping IDs) as long as the final IDs are unique.
+
+Plan file: one driver per line in wiring order, "<current id> <new id>".
+Blank lines and text after '#' are ignored.
+
+Usage: python3 src/provision_ids.py plan.txt [--restart configure|power] [--profile [REPORT]]
+"""
+
+import argparse
+import sys
+import time
+
+from bus import *
+from profiler import Profiler, add_profile_arguments
+
+ID_MIN = 1
+ID_MAX = 31
+SCAN_TIMEOUT = 0.05
+
+
+def load_plan(path):
+    """
+    プランファイルを読み込んで検証する
+
+    Returns:
+        list: 配線順の (現在のID, 新しいID)
+    """
+    plan = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                current_id, new_id = (int(v) for v in line.replace(',', ' ').split())
+            except ValueError:
+                raise ValueError(f"line {line_no}: expected '<current id> <new id>'")
+            for value in (current_id, new_id):
+                if not ID_MIN <= value <= ID_MAX:
+                    raise ValueError(f"line {line_no}: ID {value} is outside {ID_MIN}-{ID_MAX}")
+            plan.append((current_id, new_id))
+
+    currents = [c for c, _ in plan]
+    news = [n for _, n in plan]
+    for label, values in (("current", currents), ("new", news)):
+        duplicates = sorted({v for v in values if values.count(v) > 1})
+        if duplicates:
+            raise ValueError(f"duplicate {label} IDs in plan: {duplicates}")
+    return plan
+
+
+def write_ids(client, plan):
+    """
+    ID書き込みと不揮発メモリ書き込みを各ドライバに1回ずつ送る
+
+    Returns:
+        list: 失敗した (現在のID, 新しいID, エラー)
+    """
+    failures = []
+    for current_id, new_id in plan:
+        if current_id == new_id:
+            print(f"ID {current_id}: unchanged, skipped")
+            continue
+        try:
+            res = client.write_registers(address=SLAVE_ID_ADDRESS, values=[0, new_id], device_id=current_id)
+            if res.isError():
+                raise Exception(res)
+            res = client.write_registers(address=NV_MEMORY_WRITE_ADDRESS, values=[0, 1], device_id=current_id)
+            if res.isError():
+                raise Exception(res)
+            print(f"ID {current_id} -> {new_id}: written")
+        except Exception as e:
+            print(f"ID {current_id} -> {new_id}: FAILED ({e})")
+            failures.append((current_id, new_id, e))
+    return failures
+
+
+def verify(client, plan):
+    """
+    高速スキャン1回でチェーン全体を検証する
+
+    Returns:
+        bool: すべてのドライバが新しいIDで応答した場合True
+    """
+    expected = {new_id for _, new_id in plan}
+    stale = {current_id for current_id, _ in plan} - expected
+    found = scan_ids(client, sorted(expected | stale))
+
+    ok = True
+    for current_id, new_id in plan:
+        if new_id not in found:
+            print(f"ID {new_id} (was {current_id}): NOT FOUND")
+            ok = False
+        elif found[new_id][0] != [0, new_id]:
+            print(f"ID {new_id} (was {current_id}): unexpected ID register {found[new_id][0]}")
+            ok = False
+        else:
+            print(f"ID {new_id} (was {current_id}): OK ({found[new_id][1] * 1000:.1f} ms)")
+    for device_id in sorted(stale & found.keys()):
+        print(f"ID {device_id}: still responding with its old ID")
+        ok = False
+    return ok
+
+
+def provision(plan, restart="configure", boot_wait=2.0, profiler=None):
+    client = create_client(timeout=MODBUS_TIMEOUT)
+    if profiler:
+        profiler.instrument_client(client)
+    if not client.connect():
+        print(f"ERROR: Cannot open port {MODBUS_PORT}")
+        return False
+
+    try:
+        started = time.perf_counter()
+        failures = write_ids(client, plan)
+        if failures:
+            print(f"{len(failures)} driver(s) failed; not restarting the chain")
+            return False
+
+        if restart == "configure":
+            print("Sending one broadcast configuration command...")
+            configure_all(client)
+        else:
+            input("Power-cycle the whole chain, then press Enter...")
+        time.sleep(boot_wait)
+
+        client.close()
+        scan_client = create_client(timeout=SCAN_TIMEOUT, retries=0)
+        if profiler:
+            profiler.instrument_client(scan_client)
+        if not scan_client.connect():
+            print(f"ERROR: Cannot reopen port {MODBUS_PORT}")
+            return False
+        try:
+            ok = verify(scan_client, plan)
+        finally:
+            scan_client.close()
+        print(f"{'SUCCESS' if ok else 'FAILED'}: {len(plan)} driver(s) in {time.perf_counter() - started:.1f} s")
+        return ok
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign slave IDs to a whole driver chain")
+    parser.add_argument("plan", help="wiring-order plan file (<current id> <new id> per line)")
+    parser.add_argument("--restart", choices=("configure", "power"), default="configure",
+                        help="apply new IDs with one broadcast configuration command or a manual power cycle")
+    parser.add_argument("--boot-wait", type=float, default=2.0, help="seconds to wait for drivers to restart")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = Profiler.from_args(args)
+    if profiler:
+        profiler.start()
+
+    try:
+        plan = load_plan(args.plan)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if provision(plan, args.restart, args.boot_wait, profiler) else 1)
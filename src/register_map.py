@@ -0,0 +1,297 @@
+"""
+レジスタマップ
+
+ドライバのシリーズ（CVD、AZ / LRD）ごとに、パラメータのアドレス・レジスタ数・符号・
+スケールを表で宣言する。import 時に各パラメータを struct.Struct のコーデックに変換し、
+よく使う組み合わせ（状態1・2、ダイレクトデータなど）は連続したブロックの読み書きの
+計画まで作っておく。各スクリプトのアドレスの直書きはこの表の名前で置き換える。
+
+使用例:
+    CVD.direct_speed.address             # 0x005E
+    CVD.direct_speed.encode(1000)        # [0, 1000]（2レジスタは上位ワードが先）
+    AZ.plan(('position_no1', 'position_no2'))   # 隣接するパラメータを1ブロックにまとめる
+    read_fields(client, 2, AZ, ('velocity_no1', 'position_no1'))     # bus.py
+
+2レジスタのパラメータは上位ワードが先（オリエンタルモーターの既定の並び）。
+"""
+
+import struct
+
+# 1回のFC03/FC10で扱える最大レジスタ数（Modbus仕様）
+MAX_READ_COUNT = 125
+MAX_WRITE_COUNT = 123
+
+# (レジスタ数, 符号付き) -> struct の書式
+_FORMATS = {(1, False): 'H', (1, True): 'h', (2, False): 'I', (2, True): 'i'}
+
+_WORDS = {}
+
+
+def _words(count):
+    """count 個の16bitレジスタ用の struct.Struct（キャッシュする）"""
+    codec = _WORDS.get(count)
+    if codec is None:
+        codec = _WORDS[count] = struct.Struct(f'>{count}H')
+    return codec
+
+
+def plan_blocks(spans, max_count=MAX_READ_COUNT, max_gap=0):
+    """
+    (アドレス, レジスタ数) の一覧を、まとめて読み書きできるブロックに分ける
+
+    隣接する範囲（max_gap 以下の隙間を含む）を、1回の転送の上限 max_count を
+    超えない範囲で1つのブロックにまとめる。
+
+    Args:
+        spans (iterable): (アドレス, レジスタ数) の一覧
+        max_count (int): 1ブロックの最大レジスタ数
+        max_gap (int): 読み飛ばしてもよい未使用レジスタ数
+
+    Returns:
+        list: (先頭アドレス, レジスタ数, [含まれる (アドレス, レジスタ数)]) の一覧
+    """
+    blocks = []
+    for address, count in sorted(spans):
+        if blocks:
+            start, length, members = blocks[-1]
+            end = start + length
+            if address - end <= max_gap and address + count - start <= max_count:
+                blocks[-1] = (start, max(end, address + count) - start, members + [(address, count)])
+                continue
+        blocks.append((address, count, [(address, count)]))
+    return blocks
+
+
+class Register:
+    """
+    1つのパラメータ
+
+    Args:
+        name (str): 名前（RegisterMap の属性名になる）
+        address (int): 先頭アドレス
+        count (int): レジスタ数（1: 16bit、2: 32bit）
+        signed (bool): 符号付きか
+        scale (float): 1カウントあたりの値（値 = 生の値 * scale）
+        unit (str): 値の単位（表示用）
+    """
+
+    __slots__ = ('name', 'address', 'count', 'signed', 'scale', 'unit', 'codec', 'words')
+
+    def __init__(self, name, address, count=2, signed=False, scale=1, unit=''):
+        if (count, signed) not in _FORMATS:
+            raise ValueError(f"{name}: unsupported register count {count}")
+        self.name = name
+        self.address = address
+        self.count = count
+        self.signed = signed
+        self.scale = scale
+        self.unit = unit
+        self.codec = struct.Struct('>' + _FORMATS[count, signed])
+        self.words = _words(count)
+
+    @property
+    def end(self):
+        return self.address + self.count
+
+    @property
+    def format(self):
+        return _FORMATS[self.count, self.signed]
+
+    def raw(self, value):
+        """値 -> 生の値（scale で割って整数にする）"""
+        return int(value) if self.scale == 1 else round(value / self.scale)
+
+    def encode(self, value):
+        """値 -> 書き込むレジスタ値のリスト"""
+        return list(self.words.unpack(self.codec.pack(self.raw(value))))
+
+    def decode(self, registers, offset=0):
+        """読み出したレジスタ値（offset から count 個）-> 値"""
+        raw = self.codec.unpack(self.words.pack(*registers[offset:offset + self.count]))[0]
+        return raw if self.scale == 1 else raw * self.scale
+
+    def __repr__(self):
+        return f"Register({self.name!r}, 0x{self.address:04X}, count={self.count}, signed={self.signed})"
+
+
+class Block:
+    """
+    1回の転送で読み書きする連続したレジスタ範囲と、範囲全体のコーデック
+
+    パラメータの間の隙間（読み飛ばすレジスタ）はパディングとして扱う。
+    """
+
+    __slots__ = ('address', 'count', 'registers', 'codec', 'words', 'scaled')
+
+    def __init__(self, address, count, registers):
+        self.address = address
+        self.count = count
+        self.registers = tuple(sorted(registers, key=lambda r: r.address))
+        fmt = ['>']
+        position = address
+        for register in self.registers:
+            if register.address < position:
+                raise ValueError(f"{register.name} overlaps another register at 0x{register.address:04X}")
+            if register.address > position:
+                fmt.append(f'{2 * (register.address - position)}x')
+            fmt.append(register.format)
+            position = register.end
+        if position < address + count:
+            fmt.append(f'{2 * (address + count - position)}x')
+        self.codec = struct.Struct(''.join(fmt))
+        self.words = _words(count)
+        self.scaled = any(r.scale != 1 for r in self.registers)
+
+    @property
+    def contiguous(self):
+        """隙間がない（書き込みに使える）か"""
+        return sum(r.count for r in self.registers) == self.count
+
+    def decode(self, registers):
+        """ブロック全体のレジスタ値 -> パラメータの値のタプル（registers の順）"""
+        values = self.codec.unpack(self.words.pack(*registers))
+        if self.scaled:
+            values = tuple(v if r.scale == 1 else v * r.scale for r, v in zip(self.registers, values))
+        return values
+
+    def encode(self, values):
+        """パラメータの値（registers の順）-> ブロック全体に書き込むレジスタ値のリスト"""
+        if not self.contiguous:
+            raise ValueError(f"block 0x{self.address:04X}+{self.count} has gaps and cannot be written")
+        raw = [r.raw(v) for r, v in zip(self.registers, values)]
+        return list(self.words.unpack(self.codec.pack(*raw)))
+
+    def __repr__(self):
+        names = ", ".join(r.name for r in self.registers)
+        return f"Block(0x{self.address:04X}+{self.count}: {names})"
+
+
+class RegisterMap:
+    """
+    1シリーズ分のレジスタの表
+
+    Args:
+        family (str): シリーズ名
+        registers (iterable): Register の一覧
+        groups (dict): グループ名 -> パラメータ名の一覧（import 時に計画を作っておく）
+    """
+
+    def __init__(self, family, registers, groups=None):
+        self.family = family
+        self.registers = {}
+        for register in registers:
+            if register.name in self.registers:
+                raise ValueError(f"{family}: duplicate register {register.name}")
+            self.registers[register.name] = register
+        self._plans = {}
+        self.groups = {}
+        for name, names in (groups or {}).items():
+            self.groups[name] = self.plan(names)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['registers'][name]
+        except KeyError:
+            raise AttributeError(f"{self.__dict__.get('family')} has no register {name!r}") from None
+
+    def __getitem__(self, name):
+        return self.registers[name]
+
+    def __contains__(self, name):
+        return name in self.registers
+
+    def __iter__(self):
+        return iter(self.registers.values())
+
+    def plan(self, names, max_count=MAX_READ_COUNT, max_gap=0):
+        """
+        パラメータを、まとめて読み書きできるブロックに分ける（同じ組み合わせは計画を再利用する）
+
+        Args:
+            names (iterable): パラメータ名
+            max_count (int): 1ブロックの最大レジスタ数（書き込みは MAX_WRITE_COUNT）
+            max_gap (int): 読み飛ばしてもよい未使用レジスタ数（書き込みでは 0）
+
+        Returns:
+            tuple: Block の一覧（アドレス順）
+        """
+        key = (tuple(names), max_count, max_gap)
+        plan = self._plans.get(key)
+        if plan is None:
+            by_span = {}
+            for name in key[0]:
+                register = self.registers[name]
+                by_span[(register.address, register.count)] = register
+            plan = self._plans[key] = tuple(
+                Block(start, length, [by_span[span] for span in members])
+                for start, length, members in plan_blocks(by_span, max_count, max_gap))
+        return plan
+
+    def group(self, name):
+        """import 時に計画したグループのブロックの一覧"""
+        return self.groups[name]
+
+
+# ---- レジスタの表 ----
+
+# 状態（AZ / LRD / CVD 共通）
+_STATUS = [
+    Register('status1', 0x0020, 1),                 # 状態1（READY / MOVE / START / ALM）
+    Register('status2', 0x0021, 1),                 # 状態2（ENABLE）
+]
+
+# ダイレクトデータ運転（0058h〜0067h。トリガの書き込みで運転を開始する）
+_DIRECT_DATA = [
+    Register('direct_data_no', 0x0058),
+    Register('direct_method', 0x005A),              # 1: 絶対位置決め、2: 相対位置決め
+    Register('direct_position', 0x005C, signed=True, unit='step'),
+    Register('direct_speed', 0x005E, signed=True, unit='Hz'),
+    Register('direct_accel', 0x0060, unit='step/s^2'),   # 0.001 kHz/s
+    Register('direct_decel', 0x0062, unit='step/s^2'),
+    Register('direct_current', 0x0064, unit='0.1%'),
+    Register('direct_trigger', 0x0066, signed=True),  # 1: 全データ、-4: 速度のみ、-5: 位置のみ
+]
+
+# パラメータ・保守コマンド（共通）
+_COMMON = [
+    Register('configuration', 0x018C),              # 構成設定（Configuration）
+    Register('nv_write', 0x0192),                   # 不揮発メモリ一括書き込み
+    Register('rotation_direction', 0x0384),         # 1: CW、0: CCW
+    Register('slave_id', 0x1380),                   # スレーブID
+]
+
+# 現在のアラームとアラーム履歴1〜10（新しい順）
+_ALARMS = [Register('alarm', 0x0080)] + [Register(f'alarm_history{n}', 0x0080 + 2 * n) for n in range(1, 11)]
+
+_DIRECT_DATA_NAMES = tuple(r.name for r in _DIRECT_DATA)
+
+CVD = RegisterMap('CVD', _STATUS + _DIRECT_DATA + _COMMON, groups={
+    'status': ('status1', 'status2'),
+    'direct_data': _DIRECT_DATA_NAMES,
+    'profile': ('direct_accel', 'direct_decel'),
+})
+
+AZ = RegisterMap('AZ/LRD', _STATUS + _DIRECT_DATA + _COMMON + _ALARMS + [
+    Register('drive_method', 0x0015, 1),            # 運転方式
+    Register('velocity', 0x001A, signed=True),      # 速度
+    Register('position', 0x001C, signed=True),      # 位置
+    Register('command1', 0x001E, 1),                # 指令1（C-ON / STOP / START / 運転データNo）
+    Register('detected_position', 0x00CC, signed=True, unit='step'),
+    Register('position_no1', 0x0402, signed=True),  # 運転データ No.1 の位置
+    Register('position_no2', 0x0404, signed=True),
+    Register('velocity_no1', 0x0502, signed=True),  # 運転データ No.1 の速度
+    Register('velocity_no2', 0x0504, signed=True),
+    Register('drive_method_no1', 0x0601, 1),        # 運転データ No.1 の運転方式
+    Register('drive_method_no2', 0x0602, 1),
+], groups={
+    'status': ('status1', 'status2'),
+    'direct_data': _DIRECT_DATA_NAMES,
+    'profile': ('direct_accel', 'direct_decel'),
+    'alarms': tuple(r.name for r in _ALARMS),
+    'drive_data': ('position_no1', 'position_no2', 'velocity_no1', 'velocity_no2',
+                   'drive_method_no1', 'drive_method_no2'),
+})
+
+LRD = AZ
+
+FAMILIES = {'CVD': CVD, 'AZ': AZ, 'LRD': LRD}
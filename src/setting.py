@@ -1,3 +1,4 @@
+import os
 import serial
 
 MODBUS_METHOD = 'rtu'
@@ -6,3 +7,19 @@ MODBUS_BAUDRATE = 115200
 MODBUS_TIMEOUT = 1
 MODBUS_PARITY = serial.PARITY_EVEN
 MODBUS_STOPBITS = serial.STOPBITS_ONE
+MODBUS_FAST_TRANSPORT = False   # True で fast_rtu.py の軽量トランスポートを使う
+MODBUS_SERVER = None            # 'host:port' を設定すると bus_server.py 経由でバスを共有する
+
+# 前回のIDスキャン結果の保存先（discovery_cache.py）
+DISCOVERY_CACHE_PATH = os.path.expanduser('~/.cache/oriental_motor_controller/discovery.json')
+
+# 多軸コントローラ（axis_controller.py）の既定レイアウト
+AXIS_COUNT = 28
+AXIS_COLUMNS = 7
+AXIS_VISIBLE_ROWS = 4
+
+# イベントログ（event_log.py）。レベルは実行中にも切り替えられる
+EVENT_LOG_PATH = os.path.expanduser('~/.cache/oriental_motor_controller/events.jsonl')
+EVENT_LOG_LEVEL = 'INFO'
+EVENT_LOG_MAX_BYTES = 5 * 1024 * 1024
+EVENT_LOG_BACKUPS = 3
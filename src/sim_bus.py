@@ -0,0 +1,181 @@
+"""
+Modbus RTU バスのシミュレーション
+
+実機なしで Modbus クライアント（pymodbus / fast_rtu.py）を動かすための、
+レジスタメモリを持つスレーブ群と、それにつながるシリアルポートの代わり。
+
+    bus = SimulatedBus({1: {}, 2: {}})
+    client = create_client()
+    client.socket = SimSerial(bus)      # pymodbus は socket があれば connect() で開き直さない
+    client.connect()
+
+対応するファンクション: FC03 / FC06 / FC10 / FC17。ID 0 はブロードキャスト（書き込みのみ、応答なし）。
+"""
+
+import struct
+import time
+from collections import deque
+
+from fast_rtu import crc16
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+
+_CRC = struct.Struct('<H')
+
+
+class SimulatedBus:
+    """
+    デバイスIDごとのレジスタメモリを持つスレーブ群
+
+    Args:
+        devices (dict): デバイスID -> {アドレス: 値}
+    """
+
+    def __init__(self, devices=None):
+        self.devices = {}
+        for device_id, registers in (devices or {}).items():
+            self.add_device(device_id, registers)
+        self.requests = 0
+
+    def add_device(self, device_id, registers=None):
+        self.devices[device_id] = dict(registers or {})
+
+    def read(self, device_id, address, count):
+        memory = self.devices[device_id]
+        return [memory.get(address + i, 0) for i in range(count)]
+
+    def write(self, device_id, address, values):
+        targets = self.devices.values() if device_id == 0 else [self.devices[device_id]]
+        for memory in targets:
+            for i, value in enumerate(values):
+                memory[address + i] = value
+
+    def response_delay(self, frame, response):
+        """応答を読めるようになるまでの時間 [s]（ターンアラウンド + 応答の送信時間。既定は0）"""
+        return 0.0
+
+    def handle(self, frame):
+        """
+        要求フレームを処理して応答フレームを返す
+
+        Returns:
+            bytes: 応答フレーム。応答しない場合（CRC 不一致・存在しないID・ブロードキャスト）は None
+        """
+        frame = bytes(frame)
+        if len(frame) < 4 or crc16(frame, 0, len(frame) - 2) != _CRC.unpack_from(frame, len(frame) - 2)[0]:
+            return None
+        device_id, function_code = frame[0], frame[1]
+        if device_id != 0 and device_id not in self.devices:
+            return None
+        self.requests += 1
+        try:
+            pdu = self.execute(device_id, function_code, frame[2:-2])
+        except KeyError:
+            pdu = bytes([function_code | 0x80, ILLEGAL_DATA_ADDRESS])
+        if device_id == 0:
+            return None
+        body = bytes([device_id]) + pdu
+        return body + _CRC.pack(crc16(body, 0, len(body)))
+
+    def execute(self, device_id, function_code, data):
+        """PDU のデータ部を実行して応答の PDU（ファンクションコードから）を返す"""
+        if function_code == 0x03:
+            address, count = struct.unpack_from('>HH', data)
+            registers = self.read(device_id, address, count)
+            return bytes([0x03, 2 * count]) + struct.pack(f'>{count}H', *registers)
+        if function_code == 0x06:
+            address, value = struct.unpack_from('>HH', data)
+            self.write(device_id, address, [value])
+            return bytes([0x06]) + data[:4]
+        if function_code == 0x10:
+            address, count = struct.unpack_from('>HH', data)
+            self.write(device_id, address, list(struct.unpack_from(f'>{count}H', data, 5)))
+            return bytes([0x10]) + data[:4]
+        if function_code == 0x17:
+            read_address, read_count, write_address, write_count = struct.unpack_from('>HHHH', data)
+            self.write(device_id, write_address, list(struct.unpack_from(f'>{write_count}H', data, 9)))
+            registers = self.read(device_id, read_address, read_count)
+            return bytes([0x17, 2 * read_count]) + struct.pack(f'>{read_count}H', *registers)
+        return bytes([function_code | 0x80, ILLEGAL_FUNCTION])
+
+
+class SimSerial:
+    """
+    SimulatedBus につながる pyserial.Serial の代わり
+
+    応答は bus.response_delay() の後に読めるようになる（既定ではすぐ）。
+    読み出しは pyserial と同じく、要求したバイト数がそろうかタイムアウトまで待つ。
+    届く予定の応答がない場合、既定ではすぐに戻る。strict=True の場合は実機と同じく
+    タイムアウトまで待つ（応答の欠落を再現する場合に使う）。
+    """
+
+    def __init__(self, bus, timeout=0.05, strict=False):
+        self.bus = bus
+        self.timeout = timeout
+        self.strict = strict
+        self.inter_byte_timeout = 0
+        self.is_open = True
+        self._rx = bytearray()
+        self._pending = deque()     # (読めるようになる時刻, 応答)
+
+    def _deliver(self):
+        pending = self._pending
+        now = time.perf_counter()
+        while pending and pending[0][0] <= now:
+            self._rx += pending.popleft()[1]
+
+    def _wait_for(self, size):
+        """size バイトそろうかタイムアウトまで待つ"""
+        if self._pending:
+            self._deliver()
+        if len(self._rx) >= size:
+            return
+        deadline = time.perf_counter() + (self.timeout or 0)
+        if not self._pending:
+            if self.strict:
+                time.sleep(self.timeout or 0)
+            return
+        while len(self._rx) < size and self._pending:
+            ready = self._pending[0][0]
+            if ready > deadline:
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+                return
+            time.sleep(max(0.0, ready - time.perf_counter()))
+            self._deliver()
+
+    @property
+    def in_waiting(self):
+        if self._pending:
+            self._deliver()
+        return len(self._rx)
+
+    def reset_input_buffer(self):
+        self._rx.clear()
+        self._pending.clear()
+
+    def write(self, data):
+        response = self.bus.handle(data)
+        if response:
+            delay = self.bus.response_delay(data, response)
+            if delay > 0:
+                self._pending.append((time.perf_counter() + delay, response))
+            else:
+                self._rx += response
+        return len(data)
+
+    def read(self, size=1):
+        self._wait_for(size)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def readinto(self, b):
+        self._wait_for(len(b))
+        n = min(len(b), len(self._rx))
+        b[:n] = self._rx[:n]
+        del self._rx[:n]
+        return n
+
+    def close(self):
+        self.is_open = False
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Bus stress test under injected faults
+
+Runs the controller's batch commands (AxisController.run_batch: Initialize,
+Send Speed, Send Step, each followed by a STATUS_1 sweep like Live Status)
+back to back, as fast as the transport allows, against a simulated bus that
+injects faults (fault_bus.py): dropped responses, CRC corruption, extra
+latency, a slave dropping off mid-run and exception responses. Frame timing
+follows the real line (bus_timing.py), so a clean run is close to the
+hardware's ceiling.
+
+For each fault profile it reports:
+    tx/s        transactions completed successfully per second
+    failed      transactions that ended in an error after the client's retries
+    retries     extra frames the client put on the wire (re-sends after a timeout or a bad frame)
+    p50/p99/max latency of one transaction as the controller sees it, retries included
+
+Usage:
+    python3 src/stress_bus.py [--profiles clean,noisy,dropout] [--batches 10] [--axes 28] [--fast]
+                              [--timeout-ms 50] [--retries 3] [--seed 0]
+"""
+
+import argparse
+import queue
+import time
+from array import array
+
+from axis_controller import AxisController
+from bus import create_client, STATUS_1_ADDR
+from bus_capture import percentile
+from bus_lock import BusLock
+from fault_bus import FaultyBus, PROFILES
+from motor_model import MotorModel, STATUS_UNKNOWN
+from setting import *
+from sim_bus import SimSerial
+
+DEFAULT_TIMEOUT = 0.05      # 応答待ちのタイムアウト [s]（実機の MODBUS_TIMEOUT より短くして試験を速くする）
+
+
+class HeadlessController(AxisController):
+    """画面を作らずに AxisController のバッチ送信を使う"""
+
+    def __init__(self, client, count):
+        self.client = client
+        self.count = count
+        self.model = MotorModel(count, default_speed=1000, default_step=500)
+        self.model.set_all_enabled(True)
+        self.bus_lock = BusLock()
+        self.messages = queue.Queue()
+        self.planned_speeds = set()
+
+
+class TransactionTimer:
+    """クライアントの要求ごとの所要時間（再送を含む）と失敗を記録する"""
+
+    def __init__(self, client):
+        self.latencies = array('d')
+        self.failed = 0
+        for name in ('read_holding_registers', 'write_registers'):
+            setattr(client, name, self._timed(getattr(client, name)))
+
+    def _timed(self, request):
+        latencies = self.latencies
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                response = request(*args, **kwargs)
+            except Exception:
+                latencies.append(time.perf_counter() - started)
+                self.failed += 1
+                raise
+            latencies.append(time.perf_counter() - started)
+            if response.isError():
+                self.failed += 1
+            return response
+
+        return timed
+
+
+class StressResult:
+    def __init__(self, profile, timer, bus, elapsed):
+        self.profile = profile
+        self.transactions = len(timer.latencies)
+        self.failed = timer.failed
+        self.retries = max(0, bus.frames - self.transactions)
+        self.injected = dict(bus.injected)
+        self.elapsed = elapsed
+        latencies = list(timer.latencies)
+        self.p50 = percentile(latencies, 0.5)
+        self.p99 = percentile(latencies, 0.99)
+        self.max = max(latencies, default=0.0)
+
+    @property
+    def rate(self):
+        return (self.transactions - self.failed) / self.elapsed if self.elapsed else 0.0
+
+
+def sweep_status(controller):
+    """ライブステータスと同じ読み出しを全軸に1回ずつ行う"""
+    model = controller.model
+    client = controller.client
+    for i in range(controller.count):
+        try:
+            with controller.bus_lock:
+                response = client.read_holding_registers(address=STATUS_1_ADDR, count=1, device_id=model.ids[i])
+            model.set_status(i, STATUS_UNKNOWN if response.isError() else response.registers[0])
+        except Exception:
+            model.set_status(i, STATUS_UNKNOWN)
+
+
+def run_profile(profile, args):
+    """1つの障害プロファイルでバッチを args.batches 回繰り返す"""
+    bus = FaultyBus(profile, {device_id: {} for device_id in range(1, args.axes + 1)}, seed=args.seed,
+                    baudrate=args.baudrate)
+    client = create_client(port=f"sim:{profile.name}", baudrate=args.baudrate, timeout=args.timeout_ms / 1000,
+                           retries=args.retries, fast=args.fast, server=None)
+    client.socket = SimSerial(bus, timeout=args.timeout_ms / 1000, strict=True)
+    client.connect()
+    controller = HeadlessController(client, args.axes)
+    timer = TransactionTimer(client)
+    commands = (controller.initialize_motors, controller.send_speed, controller.send_step)
+    started = time.perf_counter()
+    for batch in range(args.batches):
+        for command in commands:
+            command(controller.bus_lock.token())
+            sweep_status(controller)
+    elapsed = time.perf_counter() - started
+    client.close()
+    return StressResult(profile, timer, bus, elapsed)
+
+
+def print_results(results):
+    print(f"{'profile':<10}{'tx':>7}{'tx/s':>8}{'failed':>8}{'retries':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          "  injected")
+    for r in results:
+        injected = ", ".join(f"{kind} {n}" for kind, n in r.injected.items() if n) or "-"
+        print(f"{r.profile.name:<10}{r.transactions:>7}{r.rate:>8.0f}{r.failed:>8}{r.retries:>9}"
+              f"{r.p50 * 1000:>9.2f}{r.p99 * 1000:>9.2f}{r.max * 1000:>9.1f}  {injected}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress the controller batch logic on a faulty simulated bus")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="fault profiles to run: " + ", ".join(PROFILES))
+    parser.add_argument("--batches", type=int, default=10, help="Initialize/Speed/Step rounds per profile")
+    parser.add_argument("--axes", type=int, default=AXIS_COUNT, help="simulated axes (IDs 1..N)")
+    parser.add_argument("--baudrate", type=int, default=MODBUS_BAUDRATE, help="line speed for frame timing")
+    parser.add_argument("--timeout-ms", type=float, default=DEFAULT_TIMEOUT * 1000, help="client response timeout")
+    parser.add_argument("--retries", type=int, default=3, help="client retries")
+    parser.add_argument("--fast", action="store_true", help="use the fast RTU transport")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the injected faults")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    unknown = [name for name in names if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profile(s): {', '.join(unknown)}")
+    transport = "fast" if args.fast else "pymodbus"
+    print(f"{args.axes} axes at {args.baudrate} bps, {transport} transport, timeout {args.timeout_ms:.0f} ms, "
+          f"{args.retries} retries, {args.batches} batches per profile")
+    for name in names:
+        print(f"  {PROFILES[name]}")
+    results = []
+    for name in names:
+        results.append(run_profile(PROFILES[name], args))
+    print_results(results)
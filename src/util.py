@@ -2,4 +2,21 @@ def decimal_to_hex(value):
     # 32ビット値を上位16ビットと下位16ビットに分割
     upper = (value >> 16) & 0xFFFF
     lower = value & 0xFFFF
-    return upper, lower
\ No newline at end of file
+    return upper, lower
+
+def hex_to_decimal(upper, lower):
+    # 上位16ビットと下位16ビットから符号付き32ビット値を復元
+    value = ((upper & 0xFFFF) << 16) | (lower & 0xFFFF)
+    return value - 0x100000000 if value > 0x7FFFFFFF else value
+
+
+def parse_ids(text):
+    # '1-5,8' 形式のID指定を展開
+    ids = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            ids.extend(range(int(first), int(last) + 1))
+        elif part:
+            ids.append(int(part))
+    return ids